@@ -0,0 +1,285 @@
+"""
+Almacén columnar de las evoluciones para los reportes.
+
+Los reportes de analisis recorrían todos los pacientes y evoluciones y
+armaban listas de dicts en cada llamada. Este almacén guarda los mismos
+datos en arreglos de NumPy, una columna por campo (cédula, fecha como
+ordinal, segundo del día, minutos de retraso y si se subió tarde), con
+los contenidos aparte en una lista. Los reportes se calculan con
+operaciones vectorizadas sobre esas columnas, y como_dataframe() las
+expone como un DataFrame sin copiarlas.
+
+Igual que los índices de similitud, se crea en el primer uso
+(obtener_almacen) y se mantiene al día con los eventos de reg.cambios.
+"""
+
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from modelos import _minutos_retraso
+from indice_evoluciones import indice_evoluciones
+
+_lock_creacion = threading.Lock()
+
+# Columnas numéricas y su tipo
+COLUMNAS = {
+    "cedula": np.int64,
+    "dia": np.int32,
+    "segundo": np.int32,
+    "retraso_minutos": np.int64,
+    "tarde": np.bool_,
+}
+
+
+class almacen_columnar(indice_evoluciones):
+    """
+    Evoluciones de un registro guardadas por columnas.
+
+    Las filas se identifican por (cedula, ordinal de la fecha) en lugar de
+    la fecha ISO de los otros índices, para no formatear fechas al cargar.
+    Cada evolución ocupa una fila. Al quitar una evolución su fila se marca
+    como borrada y se reutiliza el espacio al compactar (cuando las borradas
+    son más de la mitad o antes de exponer las columnas).
+
+    Attributes:
+        capacidad (int): Filas reservadas en los arreglos
+    """
+    def __init__(self, capacidad=1024):
+        """
+        Inicializa un almacén vacío.
+
+        Args:
+            capacidad (int): Filas a reservar al inicio (crece al doble al llenarse)
+        """
+        super().__init__()
+        self._vaciar(capacidad)
+
+    def _vaciar(self, capacidad):
+        """Descarta todas las filas y reserva capacidad filas."""
+        self.capacidad = capacidad
+        self._columnas = {nombre: np.zeros(capacidad, dtype=tipo) for nombre, tipo in COLUMNAS.items()}
+        self._vivas = np.zeros(capacidad, dtype=np.bool_)
+        self._contenidos = []
+        self._filas = 0
+        self._borradas = 0
+        self._fila_por_clave = {}
+        self._claves_por_cedula = {}
+
+    def __len__(self):
+        return len(self._fila_por_clave)
+
+    def vincular(self, reg):
+        """
+        Carga todas las evoluciones de reg de una vez y lo sigue con sus eventos.
+
+        Args:
+            reg (registro): Registro a cargar
+        """
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            reg.cambios.suscribir(self.aplicar_evento)
+            filas = [(cedula, ev) for cedula, evoluciones in reg.recorrer_por_paciente() for ev in evoluciones]
+            n = len(filas)
+            self._vaciar(max(self.capacidad, n))
+            columnas = self._columnas
+            columnas["cedula"][:n] = np.fromiter((cedula for cedula, _ in filas), dtype=np.int64, count=n)
+            momentos = np.fromiter((ev.momento for _, ev in filas), dtype=np.int64, count=n)
+            columnas["dia"][:n] = momentos // (86400 * 10**6)
+            columnas["segundo"][:n] = momentos // 10**6 % 86400
+            columnas["retraso_minutos"][:n] = np.fromiter((ev.retraso_minutos for _, ev in filas),
+                                                          dtype=np.int64, count=n)
+            columnas["tarde"][:n] = columnas["retraso_minutos"][:n] > 0
+            self._vivas[:n] = True
+            self._contenidos = [ev.contenido for _, ev in filas]
+            self._filas = n
+            for fila, (cedula, dia) in enumerate(zip(columnas["cedula"][:n].tolist(), columnas["dia"][:n].tolist())):
+                clave = (cedula, dia)
+                self._fila_por_clave[clave] = fila
+                self._claves_por_cedula.setdefault(cedula, set()).add(clave)
+
+    def agregar_evolucion(self, cedula, ev):
+        """Agrega una evolución del registro (al vincular)."""
+        self._agregar_fila(cedula, ev.dia, ev.momento // 10**6 % 86400, ev.retraso_minutos, ev.contenido)
+
+    def agregar_exportada(self, cedula, datos):
+        """Agrega una evolución recibida en un evento (dict de exportar_clase)."""
+        horas, minutos, segundos = (int(parte) for parte in datos["hora"].split(":"))
+        self._agregar_fila(cedula, date.fromisoformat(datos["fecha"]).toordinal(),
+                           (horas * 60 + minutos) * 60 + segundos,
+                           _minutos_retraso(datos.get("retraso")), datos["contenido"])
+
+    def _agregar_fila(self, cedula, dia, segundo, retraso_minutos, contenido):
+        """Escribe la fila de la evolución (reemplaza la que haya en esa fecha)."""
+        clave = (cedula, dia)
+        with self._lock:
+            fila = self._fila_por_clave.get(clave)
+            if fila is None:
+                if self._filas == self.capacidad:
+                    self._crecer()
+                fila = self._filas
+                self._filas += 1
+                self._contenidos.append(contenido)
+                self._vivas[fila] = True
+                self._fila_por_clave[clave] = fila
+                self._claves_por_cedula.setdefault(cedula, set()).add(clave)
+            else:
+                self._contenidos[fila] = contenido
+            columnas = self._columnas
+            columnas["cedula"][fila] = cedula
+            columnas["dia"][fila] = dia
+            columnas["segundo"][fila] = segundo
+            columnas["retraso_minutos"][fila] = retraso_minutos
+            columnas["tarde"][fila] = retraso_minutos > 0
+
+    def _crecer(self):
+        """Duplica la capacidad de los arreglos."""
+        self.capacidad *= 2
+        for nombre, arreglo in self._columnas.items():
+            nuevo = np.zeros(self.capacidad, dtype=arreglo.dtype)
+            nuevo[:self._filas] = arreglo[:self._filas]
+            self._columnas[nombre] = nuevo
+        vivas = np.zeros(self.capacidad, dtype=np.bool_)
+        vivas[:self._filas] = self._vivas[:self._filas]
+        self._vivas = vivas
+
+    def quitar(self, cedula, fecha):
+        """Quita la evolución del paciente en esa fecha (si está)."""
+        with self._lock:
+            if isinstance(fecha, str):
+                fecha = date.fromisoformat(fecha)
+            self._quitar_clave((cedula, fecha.toordinal()))
+            self._compactar_si_conviene()
+
+    def quitar_paciente(self, cedula):
+        """Quita todas las evoluciones de un paciente."""
+        with self._lock:
+            for clave in list(self._claves_por_cedula.get(cedula, ())):
+                self._quitar_clave(clave)
+            self._compactar_si_conviene()
+
+    def _quitar_clave(self, clave):
+        fila = self._fila_por_clave.pop(clave, None)
+        if fila is None:
+            return
+        self._vivas[fila] = False
+        self._contenidos[fila] = None
+        self._borradas += 1
+        claves = self._claves_por_cedula.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._claves_por_cedula[clave[0]]
+
+    def _compactar_si_conviene(self):
+        if self._borradas > 64 and self._borradas * 2 > self._filas:
+            self._compactar()
+
+    def _compactar(self):
+        """Mueve las filas vivas al principio, en el mismo orden."""
+        if not self._borradas:
+            return
+        vivas = np.flatnonzero(self._vivas[:self._filas])
+        for arreglo in self._columnas.values():
+            arreglo[:len(vivas)] = arreglo[vivas]
+        self._contenidos = [self._contenidos[fila] for fila in vivas]
+        nueva_fila = np.empty(self._filas, dtype=np.int64)
+        nueva_fila[vivas] = np.arange(len(vivas))
+        self._fila_por_clave = {clave: int(nueva_fila[fila]) for clave, fila in self._fila_por_clave.items()}
+        self._filas = len(vivas)
+        self._vivas[:self._filas] = True
+        self._vivas[self._filas:] = False
+        self._borradas = 0
+
+    def columnas(self):
+        """
+        Columnas de las evoluciones actuales.
+
+        Son vistas sobre los arreglos del almacén (no copias): reflejan los
+        cambios posteriores hasta que los arreglos se compactan o crecen.
+
+        Returns:
+            dict: {nombre: np.ndarray} con una fila por evolución
+        """
+        with self._lock:
+            self._compactar()
+            return {nombre: arreglo[:self._filas] for nombre, arreglo in self._columnas.items()}
+
+    def contenidos(self):
+        """Contenidos de las evoluciones, en el orden de las filas de columnas()."""
+        with self._lock:
+            self._compactar()
+            return list(self._contenidos)
+
+    def como_dataframe(self, con_contenido=False):
+        """
+        Las columnas como DataFrame, sin copiarlas.
+
+        Args:
+            con_contenido (bool): Agregar la columna contenido (esta sí se copia)
+
+        Returns:
+            pd.DataFrame: Columnas cedula, dia (ordinal), segundo,
+                          retraso_minutos y tarde
+        """
+        with self._lock:
+            df = pd.DataFrame(self.columnas(), copy=False)
+            if con_contenido:
+                df["contenido"] = self._contenidos
+            return df
+
+    def resumen_retrasos(self):
+        """
+        Cantidad de evoluciones y sumas de los días, horas y minutos de retraso.
+
+        Returns:
+            tuple: (evoluciones, total_dias, total_horas, total_minutos)
+        """
+        with self._lock:
+            minutos = self.columnas()["retraso_minutos"]
+            return (len(minutos), int((minutos // 1440).sum()),
+                    int((minutos % 1440 // 60).sum()), int((minutos % 60).sum()))
+
+    def retraso_por_dia(self):
+        """
+        Horas de retraso sumadas por fecha.
+
+        Returns:
+            tuple: (ordinales de las fechas en orden, horas de retraso de cada una)
+        """
+        with self._lock:
+            columnas = self.columnas()
+            dias, posiciones = np.unique(columnas["dia"], return_inverse=True)
+            horas = np.bincount(posiciones, weights=columnas["retraso_minutos"] // 60, minlength=len(dias))
+            return dias, horas.astype(np.int64)
+
+    def conteo_por_cedula(self):
+        """
+        Evoluciones de cada paciente.
+
+        Returns:
+            dict: {cedula: cantidad} de los pacientes con evoluciones
+        """
+        with self._lock:
+            cedulas, conteos = np.unique(self.columnas()["cedula"], return_counts=True)
+            return dict(zip(cedulas.tolist(), conteos.tolist()))
+
+
+def obtener_almacen(reg):
+    """
+    Retorna el almacén columnar del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        almacen_columnar: Almacén vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.almacen_columnar is None:
+            almacen = almacen_columnar(max(1024, reg.total_evoluciones()))
+            almacen.vincular(reg)
+            reg.almacen_columnar = almacen
+        return reg.almacen_columnar
@@ -1,7 +1,12 @@
 import pandas as pd
+import os
+import threading
 from difflib import SequenceMatcher
-from modelos import registro
-from datetime import datetime
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modelos import registro, normalizar_texto, hash_texto
+from datetime import datetime, date
 from archivos import exportar_a_excel
     
 
@@ -22,37 +27,61 @@ def obtener_evoluciones_en_tabla(registro_obj: registro, cedula: int):
     
     datos = []
     for ev in paciente.evoluciones:
+        retraso = ev.retraso
         datos.append({
             "Fecha": ev.fecha,
             "Hora": ev.hora,
             "Contenido": ev.contenido[:50] + "..." if len(ev.contenido) > 50 else ev.contenido,
-            "Retraso (días)": ev.retraso["dias"],
-            "Retraso (horas)": ev.retraso["horas"],
-            "Retraso (minutos)": ev.retraso["minutos"]
+            "Retraso (días)": retraso["dias"],
+            "Retraso (horas)": retraso["horas"],
+            "Retraso (minutos)": retraso["minutos"]
         })
     
     df = pd.DataFrame(datos)
     return df
-def obtener_estadisticas_generales(registro_obj: registro):
+def obtener_estadisticas_generales(registro_obj: registro, usar_columnas=True, usar_agregados=True):
     """
     Retorna estadísticas generales del sistema.
     
+    Args:
+        registro_obj: Objeto registro del sistema
+        usar_columnas: Calcular sobre el almacén columnar del registro
+            (almacen_columnar) en lugar de recorrer las evoluciones
+        usar_agregados: Leer los totales que el registro mantiene con cada
+            cambio (registro.obtener_agregados; con la base de datos se
+            inicializan con consultas agregadas, ver estadisticas_db); si es
+            False se recalculan según usar_columnas
+    
     Returns:
         dict con: total_pacientes, total_evoluciones, total_strikes, promedio_retraso
     """
     total_pacientes = len(registro_obj.pacientes)
-    total_strikes = len(registro_obj.strikes)
-    total_evoluciones = registro_obj.total_evoluciones()
-    
-    total_dias = 0
-    total_horas = 0
-    total_minutos = 0
     
-    for paciente in registro_obj.pacientes.values():
-        for evolucion in paciente.evoluciones:
-            total_dias += evolucion.retraso["dias"]
-            total_horas += evolucion.retraso["horas"]
-            total_minutos += evolucion.retraso["minutos"]
+    if usar_agregados:
+        agregados = registro_obj.obtener_agregados()
+        total_strikes = agregados.strikes
+        total_evoluciones = agregados.evoluciones
+        total_dias = agregados.retraso_dias
+        total_horas = agregados.retraso_horas
+        total_minutos = agregados.retraso_minutos
+    elif usar_columnas:
+        total_strikes = len(registro_obj.strikes)
+        from almacen_columnar import obtener_almacen
+        total_evoluciones, total_dias, total_horas, total_minutos = obtener_almacen(registro_obj).resumen_retrasos()
+    else:
+        total_strikes = len(registro_obj.strikes)
+        total_evoluciones = 0
+        total_dias = 0
+        total_horas = 0
+        total_minutos = 0
+        
+        for paciente in registro_obj.pacientes.values():
+            for evolucion in paciente.evoluciones:
+                retraso = evolucion.retraso
+                total_evoluciones += 1
+                total_dias += retraso["dias"]
+                total_horas += retraso["horas"]
+                total_minutos += retraso["minutos"]
     
     if total_evoluciones > 0:
         promedio_dias = round(total_dias / total_evoluciones, 2)
@@ -69,17 +98,31 @@ def obtener_estadisticas_generales(registro_obj: registro):
         "Promedio Retraso (horas)": promedio_horas,
         "Promedio Retraso (minutos)": promedio_minutos
     }
-def obtener_retrasos_por_fecha(registro_obj: registro):
+def obtener_retrasos_por_fecha(registro_obj: registro, usar_columnas=True):
     """
     Retorna un DataFrame con retrasos agrupados por fecha.
     
+    Args:
+        registro_obj: Objeto registro del sistema
+        usar_columnas: Agrupar con el almacén columnar del registro
+    
     Returns:
         pd.DataFrame con columnas: Fecha, Total Retraso (horas)
     """
+    if usar_columnas:
+        from almacen_columnar import obtener_almacen
+        dias, horas = obtener_almacen(registro_obj).retraso_por_dia()
+        if not len(dias):
+            return pd.DataFrame()
+        return pd.DataFrame({
+            "Fecha": [date.fromordinal(dia) for dia in dias.tolist()],
+            "Retraso Total (horas)": horas
+        })
+    
     datos = []
     for paciente in registro_obj.pacientes.values():
         for ev in paciente.evoluciones:
-            retraso_total_horas = ev.retraso["dias"] * 24 + ev.retraso["horas"]
+            retraso_total_horas = ev.retraso_minutos // 60
             datos.append({
                 "Fecha": ev.fecha,
                 "Retraso Total (horas)": retraso_total_horas
@@ -90,13 +133,31 @@ def obtener_retrasos_por_fecha(registro_obj: registro):
     
     df = pd.DataFrame(datos)
     return df.groupby("Fecha")["Retraso Total (horas)"].sum().reset_index()
-def obtener_pacientes_con_mas_strikes(registro_obj: registro):
+def obtener_pacientes_con_mas_strikes(registro_obj: registro, usar_columnas=True):
     """
     Retorna un DataFrame con pacientes ordenados por cantidad de strikes.
     
+    Args:
+        registro_obj: Objeto registro del sistema
+        usar_columnas: Contar las evoluciones con el almacén columnar
+    
     Returns:
         pd.DataFrame con columnas: Cédula, Nombre, Apellido, Total Strikes
     """
+    if usar_columnas:
+        from almacen_columnar import obtener_almacen
+        if not registro_obj.pacientes:
+            return pd.DataFrame()
+        conteos = obtener_almacen(registro_obj).conteo_por_cedula()
+        pacientes = list(registro_obj.pacientes.values())
+        df = pd.DataFrame({
+            "Cédula": [p.cedula for p in pacientes],
+            "Nombre": [p.nombre for p in pacientes],
+            "Apellido": [p.apellido for p in pacientes],
+            "Total Evoluciones": [conteos.get(p.cedula, 0) for p in pacientes]
+        })
+        return df.sort_values("Total Evoluciones", ascending=False)
+    
     datos = []
     
     # Contar strikes por paciente (asumir que en strikes hay referencia al paciente)
@@ -163,14 +224,14 @@ def exportar_todos_reportes(registro_obj: registro):
         elif op == 5:
             from utils import pedir_cedula
             cedula = pedir_cedula()
-            similitudes_df = pd.DataFrame(encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.85))
+            similitudes_df = pd.DataFrame(encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.85, usar_grafo=True))
             if not similitudes_df.empty:
                 print("\n" + similitudes_df.to_string(index=False))
             else:
                 print("No se encontraron similitudes en evoluciones de este paciente")
         
         elif op == 6:
-            similitudes_df = obtener_todas_similitudes(registro_obj)
+            similitudes_df = obtener_todas_similitudes(registro_obj, progreso=mostrar_progreso, usar_grafo=True)
             if not similitudes_df.empty:
                 print("\n" + similitudes_df.to_string(index=False))
             else:
@@ -206,7 +267,7 @@ def exportar_todos_reportes(registro_obj: registro):
                 print(df_pacientes.to_string(index=False))
             
             print("\n=== SIMILITUDES DEL SISTEMA ===")
-            similitudes_df = obtener_todas_similitudes(registro_obj)
+            similitudes_df = obtener_todas_similitudes(registro_obj, progreso=mostrar_progreso, usar_grafo=True)
             if not similitudes_df.empty:
                 print(similitudes_df.to_string(index=False))
         
@@ -275,7 +336,306 @@ def calcular_similitud(texto1,texto2):
     """
     similitud=SequenceMatcher(None, texto1.lower(),texto2.lower()).ratio()
     return similitud
-def encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.80):
+
+class cache_similitudes:
+    """
+    Caché LRU de similitudes por par de contenidos.
+    
+    La clave es el par de hashes de los contenidos normalizados, así que
+    editar una evolución cambia su hash y sus similitudes anteriores dejan
+    de usarse sin tener que invalidarlas.
+    
+    Attributes:
+        capacidad (int): Máximo de pares guardados
+        aciertos (int): Consultas encontradas en la caché
+        fallos (int): Consultas no encontradas
+    """
+    def __init__(self, capacidad=100000):
+        """
+        Inicializa una caché vacía.
+        
+        Args:
+            capacidad (int): Máximo de pares guardados
+        """
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._pares = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, hash1, hash2):
+        """Retorna la similitud guardada del par, o None."""
+        with self._lock:
+            similitud = self._pares.get((hash1, hash2))
+            if similitud is None:
+                self.fallos += 1
+                return None
+            self._pares.move_to_end((hash1, hash2))
+            self.aciertos += 1
+            return similitud
+    
+    def guardar(self, hash1, hash2, similitud):
+        """Guarda la similitud de un par, descartando el menos usado si está llena."""
+        with self._lock:
+            self._pares[(hash1, hash2)] = similitud
+            self._pares.move_to_end((hash1, hash2))
+            if len(self._pares) > self.capacidad:
+                self._pares.popitem(last=False)
+    
+    def limpiar(self):
+        """Vacía la caché y sus contadores."""
+        with self._lock:
+            self._pares.clear()
+            self.aciertos = 0
+            self.fallos = 0
+    
+    def __len__(self):
+        return len(self._pares)
+
+CACHE_SIMILITUDES = cache_similitudes(int(os.getenv("SIMILITUD_CACHE_PARES", "100000")))
+
+# Cálculo de similitud: "difflib" (SequenceMatcher) o "coseno" (n-gramas,
+# ver similitud_coseno; sus umbrales se traducen con la calibración)
+BACKENDS_SIMILITUD = ("difflib", "coseno")
+BACKEND_SIMILITUD = os.getenv("SIMILITUD_BACKEND", "difflib")
+
+def _elegir_backend(backend):
+    """Backend indicado o el configurado; ValueError si no existe."""
+    backend = backend or BACKEND_SIMILITUD
+    if backend not in BACKENDS_SIMILITUD:
+        raise ValueError(f"Backend de similitud desconocido: {backend}")
+    return backend
+
+# Comparaciones hechas y descartadas por cada filtro; solo se cuentan
+# dentro de contar_filtros() (benchmarks)
+_contador_filtros = None
+
+@contextmanager
+def contar_filtros():
+    """
+    Cuenta las comparaciones de similitud y las descartadas por cada filtro.
+    
+    Es para benchmarks: el contador es global y no es seguro con varios
+    hilos comparando a la vez. Fuera del bloque no se cuenta nada.
+    
+    Yields:
+        Counter: Claves comparaciones, en_cache, descartadas_longitud,
+            descartadas_quick_ratio y ratio
+    """
+    global _contador_filtros
+    anterior = _contador_filtros
+    _contador_filtros = Counter()
+    try:
+        yield _contador_filtros
+    finally:
+        _contador_filtros = anterior
+
+def _contar(clave, cantidad=1):
+    """Suma cantidad al contador de contar_filtros() si está activo."""
+    if _contador_filtros is not None:
+        _contador_filtros[clave] += cantidad
+
+def _cota(coincidencias, total):
+    """Misma fórmula que SequenceMatcher para que las cotas comparen exacto."""
+    return 2.0 * coincidencias / total if total else 1.0
+
+def _similitud_si_supera(texto1, conteo1, hash1, texto2, hash2, minimo, estricto=False):
+    """
+    Similitud de dos textos normalizados, o None si no puede superar minimo.
+    
+    Si el par está en CACHE_SIMILITUDES se retorna la similitud guardada.
+    Si no, antes de ratio() prueba dos cotas superiores de la similitud: la
+    de las longitudes (el valor de real_quick_ratio) y la de los caracteres
+    en común (el valor de quick_ratio), calculadas sin construir el
+    SequenceMatcher. Si una cota ya no alcanza minimo el texto se descarta,
+    así que el resultado es el mismo que comparando siempre.
+    
+    Args:
+        texto1 (str): Primer texto (normalizado)
+        conteo1 (Counter): Caracteres de texto1
+        hash1 (str): Hash de texto1
+        texto2 (str): Segundo texto (normalizado)
+        hash2 (str): Hash de texto2
+        minimo (float): Similitud a superar
+        estricto (bool): Exigir similitud > minimo (en lugar de >=)
+        
+    Returns:
+        float o None
+    """
+    _contar("comparaciones")
+    similitud = CACHE_SIMILITUDES.obtener(hash1, hash2)
+    if similitud is not None:
+        _contar("en_cache")
+        return similitud
+    total = len(texto1) + len(texto2)
+    cota = _cota(min(len(texto1), len(texto2)), total)
+    if cota < minimo or (estricto and cota == minimo):
+        _contar("descartadas_longitud")
+        return None
+    cota = _cota(sum((conteo1 & Counter(texto2)).values()), total)
+    if cota < minimo or (estricto and cota == minimo):
+        _contar("descartadas_quick_ratio")
+        return None
+    _contar("ratio")
+    similitud = SequenceMatcher(None, texto1, texto2).ratio()
+    CACHE_SIMILITUDES.guardar(hash1, hash2, similitud)
+    return similitud
+
+def _mas_similar(contenido_nuevo, candidatas, umbral, primera):
+    """
+    Busca entre candidatas la evolución más parecida a contenido_nuevo.
+    
+    Calcula primero la cota quick_ratio de cada candidata (o toma su
+    similitud de la caché) y las compara de mayor a menor: en cuanto la
+    cota no alcanza la mejor similitud encontrada, ninguna de las restantes
+    puede superarla. Ante empates se conserva la que aparece primero, como
+    al recorrerlas en orden. Con primera=True se recorren en orden y se
+    detiene en la primera que alcanza umbral.
+    
+    Args:
+        contenido_nuevo (str): Texto a comparar
+        candidatas (iterable): Tuplas (dato, evolucion); dato se retorna tal cual
+        umbral (float): Similitud mínima (0-1)
+        primera (bool): Retornar la primera candidata que alcance umbral
+        
+    Returns:
+        tuple: (similitud_max, dato, evolucion)
+    """
+    texto = normalizar_texto(contenido_nuevo)
+    hash_nuevo = hash_texto(texto)
+    conteo = Counter(texto)
+    similitud_max = 0
+    mejor = (None, None)
+    
+    if primera:
+        for dato, ev in candidatas:
+            similitud = _similitud_si_supera(texto, conteo, hash_nuevo,
+                                             ev.contenido_normalizado, ev.hash_contenido, umbral)
+            if similitud is None:
+                # Descartada por las cotas: no cuenta para el máximo retornado
+                continue
+            if similitud >= umbral:
+                return similitud, dato, ev
+            similitud_max = max(similitud_max, similitud)
+        return similitud_max, None, None
+    
+    acotadas = []
+    for posicion, (dato, ev) in enumerate(candidatas):
+        otro = ev.contenido_normalizado
+        similitud = CACHE_SIMILITUDES.obtener(hash_nuevo, ev.hash_contenido)
+        if similitud is not None:
+            # La similitud exacta hace de cota
+            acotadas.append((similitud, posicion, None, dato, ev))
+        else:
+            total = len(texto) + len(otro)
+            acotadas.append((_cota(sum((conteo & Counter(otro)).values()), total), posicion, otro, dato, ev))
+    acotadas.sort(key=lambda c: (-c[0], c[1]))
+    
+    posicion_mejor = None
+    for i, (cota, posicion, otro, dato, ev) in enumerate(acotadas):
+        _contar("comparaciones")
+        if cota < similitud_max or (cota == similitud_max and (posicion_mejor is None or posicion > posicion_mejor)):
+            if cota < similitud_max:
+                # Ninguna de las siguientes (cota menor o igual) puede superarla
+                restantes = len(acotadas) - i
+                _contar("comparaciones", restantes - 1)
+                _contar("descartadas_quick_ratio", restantes)
+                break
+            _contar("descartadas_quick_ratio")
+            continue
+        if otro is None:
+            _contar("en_cache")
+            similitud = cota
+        else:
+            _contar("ratio")
+            similitud = SequenceMatcher(None, texto, otro).ratio()
+            CACHE_SIMILITUDES.guardar(hash_nuevo, ev.hash_contenido, similitud)
+        if similitud > similitud_max or (similitud == similitud_max and posicion_mejor is not None
+                                         and posicion < posicion_mejor):
+            similitud_max = similitud
+            posicion_mejor = posicion
+            mejor = (dato, ev)
+    return similitud_max, mejor[0], mejor[1]
+
+def _pares_similares(evoluciones_compactas, umbral, guardadas=None, nuevas=None):
+    """
+    Compara entre sí las evoluciones de un paciente.
+    
+    Args:
+        evoluciones_compactas (list): Tuplas (fecha, texto normalizado, hash)
+        umbral (float): Similitud mínima (0-1)
+        guardadas (dict): Similitudes ya calculadas, (fecha 1 ISO, fecha 2 ISO)
+            -> (hash del par, similitud), ver similitudes_guardadas; se usan
+            si el hash coincide con el contenido actual
+        nuevas (list): Si se indica, se le agregan las similitudes calculadas
+            que no estaban en guardadas, como (fecha 1 ISO, fecha 2 ISO,
+            hash del par, similitud)
+        
+    Returns:
+        list: Tuplas (fecha 1, fecha 2, similitud en %) de los pares similares
+    """
+    if guardadas is not None or nuevas is not None:
+        from similitudes_guardadas import hash_par
+    guardadas = guardadas or {}
+    fechas_iso = [fecha.isoformat() for fecha, _, _ in evoluciones_compactas] if nuevas is not None or guardadas else None
+    pares = []
+    for i in range(len(evoluciones_compactas)):
+        fecha1, texto1, hash1 = evoluciones_compactas[i]
+        conteo = Counter(texto1)
+        for j in range(i+1, len(evoluciones_compactas)):
+            fecha2, texto2, hash2 = evoluciones_compactas[j]
+            hash_contenido = None
+            if guardadas:
+                guardada = guardadas.get((fechas_iso[i], fechas_iso[j]))
+                if guardada is not None:
+                    hash_contenido = hash_par(hash1, hash2)
+                    if guardada[0] == hash_contenido:
+                        if guardada[1] >= umbral:
+                            pares.append((fecha1, fecha2, round(guardada[1] * 100, 2)))
+                        continue
+            similitud = _similitud_si_supera(texto1, conteo, hash1, texto2, hash2, umbral)
+            if similitud is None:
+                continue
+            if nuevas is not None:
+                nuevas.append((fechas_iso[i], fechas_iso[j], hash_contenido or hash_par(hash1, hash2), similitud))
+            if similitud >= umbral:
+                pares.append((fecha1, fecha2, round(similitud * 100, 2)))
+    return pares
+def _pares_paciente(almacen, paciente, umbral):
+    """_pares_similares de un paciente, leyendo y agregando en almacen (si hay)."""
+    if almacen is None:
+        return _pares_similares(_compactar_evoluciones(paciente), umbral)
+    nuevas = []
+    pares = _pares_similares(_compactar_evoluciones(paciente), umbral, almacen.guardadas(paciente.cedula), nuevas)
+    almacen.agregar(paciente.cedula, nuevas)
+    return pares
+def _pares_similares_coseno(evoluciones_compactas, umbral):
+    """Como _pares_similares, con similitud coseno (umbral en escala de SequenceMatcher)."""
+    from similitud_coseno import pares_similares, umbral_coseno
+    pares = pares_similares([texto for _, texto, _ in evoluciones_compactas], umbral_coseno(umbral))
+    return [(evoluciones_compactas[i][0], evoluciones_compactas[j][0], round(similitud * 100, 2))
+            for i, j, similitud in pares]
+def _compactar_evoluciones(paciente):
+    """Evoluciones de un paciente como tuplas (fecha, texto normalizado, hash)."""
+    return [(ev.fecha, ev.contenido_normalizado, ev.hash_contenido) for ev in paciente.evoluciones]
+def _similitudes_lote(lote, umbral):
+    """
+    Tarea de un proceso del pool: similitudes de un lote de pacientes.
+    
+    Args:
+        lote (list): Tuplas (cedula, evoluciones compactas, similitudes
+            guardadas o None)
+        umbral (float): Similitud mínima (0-1)
+        
+    Returns:
+        list: Tuplas (cedula, pares similares, similitudes nuevas o None)
+    """
+    resultado = []
+    for cedula, evoluciones, guardadas in lote:
+        nuevas = [] if guardadas is not None else None
+        resultado.append((cedula, _pares_similares(evoluciones, umbral, guardadas, nuevas), nuevas))
+    return resultado
+def encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.80, backend=None, usar_grafo=False):
     """
     Encuentra evoluciones similares de un paciente.
     
@@ -283,6 +643,9 @@ def encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.80):
         registro_obj: Objeto registro
         cedula: Cédula del paciente
         umbral: Porcentaje mínimo para considerar similares (0-1)
+        backend: "difflib" o "coseno" (por defecto BACKEND_SIMILITUD)
+        usar_grafo: Leer los pares del grafo de similitud (grafo_similitud)
+            cuando alcanza para responder; solo con el backend difflib
         
     Returns:
         list: Lista de dicts con fecha1, fecha2, similitud%
@@ -292,24 +655,22 @@ def encontrar_similitudes_paciente(registro_obj, cedula, umbral=0.80):
     if paciente is None:
         return[]
     
-    similitudes=[]
-    evoluciones= paciente.evoluciones
-    
-    for i in range(len(evoluciones)):
-        for j in range(i+1, len(evoluciones)):
-            ev1 = evoluciones[i]
-            ev2 = evoluciones[j]
-    
-            similitud= calcular_similitud(ev1.contenido, ev2.contenido)
-            
-            if similitud >= umbral:
-                similitudes.append({
-                    "fecha 1": ev1.fecha,
-                    "fecha 2": ev2.fecha,
-                    "similitud" : round(similitud * 100, 2)
-                })
-    return similitudes
-def verificar_similitud_al_subir(contenido_nuevo, evoluciones_existentes, umbral=0.80):
+    pares = None
+    if _elegir_backend(backend) == "difflib":
+        if usar_grafo:
+            from grafo_similitud import obtener_grafo
+            pares = obtener_grafo(registro_obj).pares_paciente(cedula, umbral)
+        if pares is None:
+            pares = _pares_paciente(registro_obj.similitudes_guardadas, paciente, umbral)
+            if registro_obj.similitudes_guardadas is not None:
+                registro_obj.similitudes_guardadas.guardar()
+    else:
+        pares = _pares_similares_coseno(_compactar_evoluciones(paciente), umbral)
+    return [
+        {"fecha 1": fecha1, "fecha 2": fecha2, "similitud": similitud}
+        for fecha1, fecha2, similitud in pares
+    ]
+def verificar_similitud_al_subir(contenido_nuevo, evoluciones_existentes, umbral=0.80, primera=False):
     """
     Verifica si una evolución nueva es similar a las existentes.
     
@@ -317,75 +678,173 @@ def verificar_similitud_al_subir(contenido_nuevo, evoluciones_existentes, umbral
         contenido_nuevo (str): Contenido de la nueva evolución
         evoluciones_existentes (list): Lista de evoluciones del paciente
         umbral: Porcentaje mínimo (0-1)
+        primera: Detenerse en la primera evolución que alcance umbral (para
+            decidir un strike basta saber si hay alguna). Si no hay
+            similitud el porcentaje retornado no es el máximo
         
     Returns:
         tuple: (hay_similitud, porcentaje_max, evolución_similar)
     """
     if not evoluciones_existentes:
         return False,0,None
-    similitud_max=0
-    ev_similar = None
-    for ev in evoluciones_existentes:
-        similitud=calcular_similitud(contenido_nuevo, ev.contenido)
-        
-        if similitud > similitud_max:
-            similitud_max = similitud
-            ev_similar = ev
+    similitud_max, _, ev_similar = _mas_similar(
+        contenido_nuevo, ((None, ev) for ev in evoluciones_existentes), umbral, primera
+    )
     if similitud_max >= umbral:
         return True, round(similitud_max*100,2), ev_similar
     return False, similitud_max*100, None
-def obtener_todas_similitudes(registro_obj, umbral=0.80):
+def obtener_todas_similitudes(registro_obj, umbral=0.80, procesos=None, tamano_lote=None, progreso=None,
+                              min_pares_paralelo=20000, backend=None, usar_grafo=False):
     """
     Encuentra TODAS las similitudes en TODOS los pacientes.
     
+    Los pacientes se reparten en lotes entre un ProcessPoolExecutor; a los
+    procesos solo se envían tuplas (fecha, texto normalizado, hash) y las
+    similitudes ya guardadas (registro.similitudes_guardadas). Con
+    pocos pares, o con procesos=1, se calcula en este proceso (usando la
+    caché de similitudes). El backend coseno siempre calcula en este
+    proceso, con un producto de matrices por paciente.
+    
+    Args:
+        registro_obj: Objeto registro
+        umbral: Porcentaje mínimo para considerar similares (0-1)
+        procesos: Procesos del pool (por defecto SIMILITUD_PROCESOS o la
+            cantidad de CPUs)
+        tamano_lote: Pacientes por tarea (por defecto se reparten en
+            unas 4 tareas por proceso)
+        progreso: Función (pacientes_hechos, total_pacientes) llamada al
+            terminar cada lote
+        min_pares_paralelo: Pares a comparar por debajo de los cuales no se
+            usa el pool
+        backend: "difflib" o "coseno" (por defecto BACKEND_SIMILITUD)
+        usar_grafo: Leer del grafo de similitud los pacientes que se puedan
+            (ver grafo_similitud.pares_paciente); solo se calculan los demás
+    
     Returns:
-        pd.DataFrame con similitudes globales del sistema
+        pd.DataFrame con columnas Cedula, Nombre, Apellido, Fecha 1,
+        Fecha 2 y Similitud % (vacío si no hay similitudes)
     """
-    todas_similitudes=[]
+    todos_pacientes = list(registro_obj.pacientes.values())
+    if procesos is None:
+        procesos = int(os.getenv("SIMILITUD_PROCESOS", os.cpu_count() or 1))
+    
+    backend = _elegir_backend(backend)
+    pares_similares = _pares_similares if backend == "difflib" else _pares_similares_coseno
+    
+    pares_por_cedula = {}
+    pacientes = todos_pacientes
+    if usar_grafo and backend == "difflib":
+        from grafo_similitud import obtener_grafo
+        grafo = obtener_grafo(registro_obj)
+        pacientes = []
+        for p in todos_pacientes:
+            pares = grafo.pares_paciente(p.cedula, umbral)
+            if pares is None:
+                pacientes.append(p)
+            else:
+                pares_por_cedula[p.cedula] = pares
+    almacen = registro_obj.similitudes_guardadas if backend == "difflib" else None
+    if almacen is not None:
+        almacen.cargar()
+    total_pares = sum(n * (n - 1) // 2 for n in (p.total_evoluciones() for p in pacientes))
+    if backend == "coseno" or procesos <= 1 or total_pares < min_pares_paralelo:
+        for hechos, p in enumerate(pacientes, 1):
+            if backend == "difflib":
+                pares_por_cedula[p.cedula] = _pares_paciente(almacen, p, umbral)
+            else:
+                pares_por_cedula[p.cedula] = pares_similares(_compactar_evoluciones(p), umbral)
+            if progreso is not None:
+                progreso(hechos, len(pacientes))
+    else:
+        # Los pacientes con más evoluciones primero, para que no queden al final
+        ordenados = sorted(pacientes, key=lambda p: p.total_evoluciones(), reverse=True)
+        if tamano_lote is None:
+            tamano_lote = max(1, len(ordenados) // (procesos * 4))
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            tareas = []
+            for inicio in range(0, len(ordenados), tamano_lote):
+                lote = [(p.cedula, _compactar_evoluciones(p), almacen.guardadas(p.cedula) if almacen else None)
+                        for p in ordenados[inicio:inicio + tamano_lote]]
+                tareas.append(pool.submit(_similitudes_lote, lote, umbral))
+            hechos = 0
+            for tarea in as_completed(tareas):
+                resultado = tarea.result()
+                for cedula, pares, nuevas in resultado:
+                    pares_por_cedula[cedula] = pares
+                    if almacen is not None:
+                        almacen.agregar(cedula, nuevas)
+                hechos += len(resultado)
+                if progreso is not None:
+                    progreso(hechos, len(pacientes))
+    
+    if almacen is not None:
+        almacen.guardar()
     
-    for p in registro_obj.pacientes.values():
-        similitudes=encontrar_similitudes_paciente(registro_obj,p.cedula,umbral)
-        for sim in similitudes:
+    todas_similitudes=[]
+    for p in todos_pacientes:
+        for fecha1, fecha2, similitud in pares_por_cedula.get(p.cedula, []):
             todas_similitudes.append({
                 "Cedula" : p.cedula,
                 "Nombre" : p.nombre,
                 "Apellido" : p.apellido,
-                "Fecha 1" : sim["Fecha 1"],
-                "Fecha 2" : sim["Fecha 2"],
-                "Similitud %" : sim["Similitud"]
+                "Fecha 1" : fecha1,
+                "Fecha 2" : fecha2,
+                "Similitud %" : similitud
             })
     if not todas_similitudes:
         return pd.DataFrame()
     return pd.DataFrame(todas_similitudes)
-def verificar_similitud_global(contenido_nuevo, registro_obj, cedula_paciente, umbral=0.87):
+def mostrar_progreso(hechos, total):
+    """Muestra en la consola el avance de un reporte largo."""
+    print(f"\r   Calculando similitudes: {hechos}/{total} pacientes", end="" if hechos < total else "\n", flush=True)
+def verificar_similitud_global(contenido_nuevo, registro_obj, cedula_paciente, umbral=0.87, usar_indice=True,
+                               primera=False, backend=None):
     """
     Verifica similitud con evoluciones de TODOS los pacientes.
     Usa umbral más alto para evitar falsos positivos.
     
+    Con usar_indice solo se comparan las candidatas del índice LSH
+    (similitud_lsh), así que si no hay similitud el porcentaje retornado
+    es el máximo entre esas candidatas y no entre todas las evoluciones.
+    
     Args:
         contenido_nuevo (str): Contenido de la evolución
         registro_obj: Objeto registro
         cedula_paciente: Cédula del paciente actual (para excluir sus propias evoluciones)
         umbral: Porcentaje muy alto (0.95 = 95%)
+        usar_indice: Buscar candidatas en el índice LSH en lugar de recorrer todo
+        primera: Detenerse en la primera evolución que alcance umbral (ver
+            verificar_similitud_al_subir)
+        backend: "difflib" o "coseno" (por defecto BACKEND_SIMILITUD); con
+            coseno se compara contra la matriz global de similitud_coseno y
+            el porcentaje retornado es la similitud coseno
         
     Returns:
         tuple: (hay_similitud_global, porcentaje, paciente_similar, evolución_similar)
     """
-    similitud_max = 0
-    ev_similar = None
-    paciente_similar = None
-    for paciente in registro_obj.pacientes.values():
-        # No comparar con el mismo paciente
-        if paciente.cedula == cedula_paciente:
-            continue
-        
-        for ev in paciente.evoluciones:
-            similitud = calcular_similitud(contenido_nuevo, ev.contenido)
-            
-            if similitud > similitud_max:
-                similitud_max = similitud
-                ev_similar = ev
-                paciente_similar = paciente
+    if _elegir_backend(backend) == "coseno":
+        from similitud_coseno import obtener_indice as obtener_indice_coseno, umbral_coseno
+        indice = obtener_indice_coseno(registro_obj)
+        similitud_max, clave = indice.mas_similar(contenido_nuevo, cedula_paciente)
+        encontradas = indice.resolver([clave]) if clave is not None else []
+        if encontradas and similitud_max >= umbral_coseno(umbral):
+            paciente_similar, ev_similar = encontradas[0]
+            return True, round(similitud_max * 100, 2), paciente_similar, ev_similar
+        return False, similitud_max * 100, None, None
+    
+    if usar_indice:
+        from similitud_lsh import obtener_indice
+        candidatas = obtener_indice(registro_obj).evoluciones_candidatas(contenido_nuevo, cedula_paciente)
+    else:
+        candidatas = (
+            (paciente, ev)
+            for paciente in registro_obj.pacientes.values()
+            # No comparar con el mismo paciente
+            if paciente.cedula != cedula_paciente
+            for ev in paciente.evoluciones
+        )
+    
+    similitud_max, paciente_similar, ev_similar = _mas_similar(contenido_nuevo, candidatas, umbral, primera)
     
     if similitud_max >= umbral:
         return True, round(similitud_max * 100, 2), paciente_similar, ev_similar
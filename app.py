@@ -1,10 +1,12 @@
 """
 Aplicación Flask para el Sistema de Evoluciones Médicas.
-Punto de entrada de la aplicación web con PostgreSQL.
+Punto de entrada de la aplicación web con PostgreSQL o SQLite.
 """
 
 from flask import Flask
 from modelos import registro
+from persistencia_diferida import escritor_diferido
+import atexit
 import os
 
 # Configurar la ruta de templates
@@ -14,18 +16,44 @@ static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'web', 'sta
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.config['SECRET_KEY'] = 'tu_clave_secreta_aqui_cambiar_en_produccion'
 
-# Cargar datos desde PostgreSQL
+# Cargar datos desde la base de datos: por defecto solo el directorio de
+# pacientes, las evoluciones se leen al consultar cada paciente
+# (REGISTRO_CARGA_COMPLETA=1 carga todo al iniciar). Sin DATABASE_URL se usa
+# un archivo SQLite local, que se crea y migra aquí mismo.
 try:
-    from persistencia_db import cargar_registro_db
-    reg = cargar_registro_db()
-    print("✅ Datos cargados desde PostgreSQL")
+    from modelos_db import obtener_engine
+    if obtener_engine().dialect.name == "sqlite":
+        from crear_db import migrar
+        migrar()
+    if os.environ.get('REGISTRO_CARGA_COMPLETA') == '1':
+        from persistencia_db import cargar_registro_db
+        reg = cargar_registro_db()
+    else:
+        from persistencia_db import cargar_directorio_db
+        reg = cargar_directorio_db(int(os.environ.get('REGISTRO_CAPACIDAD_EVOLUCIONES', 200000)))
+    # Similitudes de los reportes guardadas en la tabla similitudes
+    from similitudes_guardadas import usar_almacen, almacen_similitudes_db
+    usar_almacen(reg, almacen_similitudes_db())
+    print(f"✅ Datos cargados desde {obtener_engine().dialect.name}")
 except Exception as e:
-    print(f"⚠️ Error al cargar desde PostgreSQL, iniciando vacío: {e}")
+    print(f"⚠️ Error al cargar desde la base de datos, iniciando vacío: {e}")
     reg = registro()
 
 # Hacer reg disponible globalmente en la app
 app.reg = reg
 
+# Guardado en segundo plano: las rutas no esperan a la base de datos
+app.escritor = escritor_diferido(
+    reg,
+    intervalo=float(os.environ.get('PERSISTENCIA_INTERVALO', 1.0)),
+    max_eventos=int(os.environ.get('PERSISTENCIA_MAX_EVENTOS', 50)),
+    max_cola=int(os.environ.get('PERSISTENCIA_MAX_COLA', 1000)),
+    max_reintentos=int(os.environ.get('PERSISTENCIA_MAX_REINTENTOS', 5)),
+    archivo_descartados=os.environ.get('PERSISTENCIA_DESCARTADOS', 'logs/guardado_descartado.jsonl')
+)
+app.escritor.iniciar()
+atexit.register(app.escritor.detener)
+
 # Importar rutas DESPUÉS de crear la app
 from web.routes import routes_bp
 app.register_blueprint(routes_bp)
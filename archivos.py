@@ -5,14 +5,22 @@ from openpyxl import load_workbook
 from openpyxl.styles import Border, Side, Alignment, Font
 import openpyxl
 from modelos import registro
+from diario_json import escribir_snapshot
 
 # Crear carpeta reportes si no existe
 if not os.path.exists("reportes"):
     os.makedirs("reportes")
 
 def guardar_json(registro_obj: registro, archivo="datos.json"):
-    with open(archivo, "w", encoding="utf-8") as f:
-        json.dump(registro_obj.exportar_clase(), f, indent=4, ensure_ascii=False)
+    """
+    Guarda el registro completo en un archivo JSON.
+    La escritura es atómica: un corte a mitad no deja el archivo corrupto.
+    
+    Args:
+        registro_obj (registro): Registro a guardar
+        archivo (str): Nombre del archivo JSON
+    """
+    escribir_snapshot(registro_obj.exportar_clase(), archivo)
     print("Datos guardados correctamente ✔")
 
 def cargar_json(archivo="datos.json"):
@@ -38,6 +46,40 @@ def cargar_json(archivo="datos.json"):
     except Exception as e:
         print(f"Error al cargar datos: {e}")
         return None
+def guardar_similitudes_json(filas, version, archivo="similitudes.json"):
+    """
+    Guarda en JSON las similitudes ya calculadas (ver similitudes_guardadas).
+    
+    Args:
+        filas (list): Listas [cedula 1, fecha 1, cedula 2, fecha 2, hash, similitud]
+        version (int): Versión del algoritmo con que se calcularon
+        archivo (str): Nombre del archivo JSON
+    """
+    escribir_snapshot({"version": version, "similitudes": filas}, archivo)
+
+def cargar_similitudes_json(version, archivo="similitudes.json"):
+    """
+    Carga las similitudes guardadas con guardar_similitudes_json().
+    
+    Args:
+        version (int): Versión del algoritmo actual
+        archivo (str): Nombre del archivo JSON
+        
+    Returns:
+        list: Filas guardadas (vacía si el archivo no existe, no es válido
+              o es de otra versión del algoritmo)
+    """
+    try:
+        with open(archivo, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError:
+        print(f"Error: el archivo {archivo} no es un JSON válido, se ignora")
+        return []
+    if datos.get("version") != version:
+        return []
+    return datos.get("similitudes", [])
 def exportar_a_excel(dataframe, nombre_archivo):
     """
     Exporta un DataFrame a archivo Excel.
@@ -161,12 +203,11 @@ def cargar_desde_excel(archivo="datos.xlsx"):
             
             p = reg.obtener_paciente(cedula)
             if p is not None:
-                ev = evolucion(fecha, hora, contenido)
-                ev.retraso = {
+                ev = evolucion.guardada(fecha, hora, contenido, {
                     "dias": int(row["Retraso (días)"]),
                     "horas": int(row["Retraso (horas)"]),
                     "minutos": int(row["Retraso (minutos)"])
-                }
+                })
                 p.agregar_evolucion(ev)
         
         print("Información cargada correctamente desde Excel")
@@ -205,14 +246,15 @@ def exportar_sistema_completo_excel(registro_obj: registro, archivo="datos.xlsx"
     datos_evoluciones = []
     for paciente in registro_obj.pacientes.values():
         for ev in paciente.evoluciones:
+            retraso = ev.retraso
             datos_evoluciones.append({
                 "Cédula": paciente.cedula,
                 "Fecha": ev.fecha,
                 "Hora": ev.hora,
                 "Contenido": ev.contenido,
-                "Retraso (días)": ev.retraso["dias"],
-                "Retraso (horas)": ev.retraso["horas"],
-                "Retraso (minutos)": ev.retraso["minutos"]
+                "Retraso (días)": retraso["dias"],
+                "Retraso (horas)": retraso["horas"],
+                "Retraso (minutos)": retraso["minutos"]
             })
     
     # Crear DataFrames
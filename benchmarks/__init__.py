@@ -0,0 +1,5 @@
+"""
+Benchmarks de rendimiento del sistema.
+
+Cada módulo se ejecuta con `python -m benchmarks.<modulo>`.
+"""
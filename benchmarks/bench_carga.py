@@ -0,0 +1,70 @@
+"""
+Velocidad de carga del registro (evoluciones por segundo).
+
+Mide los caminos por los que se cargan datos guardados: evoluciones
+desde dicts (evolucion.importar_clase, como en datos.json), el registro
+completo desde un dict (registro.importar_clase) y desde la base de
+datos (cargar_registro_db). Solo usa esas funciones públicas, así el
+mismo script sirve para comparar con versiones anteriores del código.
+
+Uso:
+    python -m benchmarks.bench_carga
+    python -m benchmarks.bench_carga --pacientes 5000 --evoluciones 20 --url sqlite:///bench_carga.db
+"""
+
+import argparse
+import gc
+import os
+import time
+from benchmarks.bench_persistencia import generar_registro
+
+
+def _mejor(funcion, repeticiones):
+    """Segundos de la ejecución más rápida de funcion()."""
+    mejor = None
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion()
+        segundos = time.perf_counter() - inicio
+        if mejor is None or segundos < mejor:
+            mejor = segundos
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=2000)
+    parser.add_argument("--evoluciones", type=int, default=25, help="Evoluciones por paciente")
+    parser.add_argument("--url", help="Medir también cargar_registro_db sobre esta base de datos")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se reporta la más rápida")
+    args = parser.parse_args()
+
+    from modelos import evolucion, registro
+
+    reg = generar_registro(args.pacientes, args.evoluciones)
+    datos = reg.exportar_clase()
+    dicts_evoluciones = [ev_d for p_d in datos["pacientes"] for ev_d in p_d["evoluciones"]]
+    total = len(dicts_evoluciones)
+
+    casos = [
+        ("evolucion.importar_clase", lambda: [evolucion.importar_clase(d) for d in dicts_evoluciones]),
+        ("registro.importar_clase", lambda: registro.importar_clase(datos)),
+    ]
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+        from modelos_db import crear_tablas
+        from persistencia_db import guardar_registro_db, cargar_registro_db
+        crear_tablas()
+        guardar_registro_db(reg, modo="bulk")
+        casos.append(("cargar_registro_db", cargar_registro_db))
+
+    print(f"\nEvoluciones por carga: {total}")
+    print(f"{'Camino':<28}{'Segundos':>10}{'Evoluciones/s':>16}")
+    for nombre, funcion in casos:
+        segundos = _mejor(funcion, args.repeticiones)
+        print(f"{nombre:<28}{segundos:>10.3f}{total / segundos:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
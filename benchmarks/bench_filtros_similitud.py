@@ -0,0 +1,138 @@
+"""
+Micro-benchmark de los filtros previos a SequenceMatcher.ratio().
+
+Compara las funciones de analisis con su versión sin filtros (ratio()
+contra cada evolución) sobre el mismo registro sintético, verifica que los
+resultados sean idénticos (en modo primera, que la decisión lo sea) y
+muestra qué fracción de las comparaciones descartó cada cota. Al final
+repite un reporte para medir la caché de similitudes.
+
+Uso:
+    python -m benchmarks.bench_filtros_similitud
+    python -m benchmarks.bench_filtros_similitud --pacientes 100 --evoluciones 30
+"""
+
+import argparse
+import time
+from benchmarks.bench_similitud_global import generar_registro_similitud, generar_consultas
+
+
+def _referencia_al_subir(contenido_nuevo, evoluciones_existentes, umbral):
+    """verificar_similitud_al_subir sin filtros."""
+    from analisis import calcular_similitud
+    if not evoluciones_existentes:
+        return False, 0, None
+    similitud_max = 0
+    ev_similar = None
+    for ev in evoluciones_existentes:
+        similitud = calcular_similitud(contenido_nuevo, ev.contenido)
+        if similitud > similitud_max:
+            similitud_max = similitud
+            ev_similar = ev
+    if similitud_max >= umbral:
+        return True, round(similitud_max * 100, 2), ev_similar
+    return False, similitud_max * 100, None
+
+
+def _referencia_paciente(p, umbral):
+    """encontrar_similitudes_paciente sin filtros."""
+    from analisis import calcular_similitud
+    similitudes = []
+    evoluciones = p.evoluciones
+    for i in range(len(evoluciones)):
+        for j in range(i + 1, len(evoluciones)):
+            similitud = calcular_similitud(evoluciones[i].contenido, evoluciones[j].contenido)
+            if similitud >= umbral:
+                similitudes.append({"fecha 1": evoluciones[i].fecha, "fecha 2": evoluciones[j].fecha,
+                                    "similitud": round(similitud * 100, 2)})
+    return similitudes
+
+
+def _medir_escenario(nombre, referencia, filtrada):
+    """Ejecuta ambas versiones, compara resultados e imprime una fila."""
+    from analisis import contar_filtros, CACHE_SIMILITUDES
+
+    inicio = time.perf_counter()
+    esperado = referencia()
+    t_referencia = time.perf_counter() - inicio
+
+    # Sin similitudes en caché, para medir solo los filtros
+    CACHE_SIMILITUDES.limpiar()
+    with contar_filtros() as contador:
+        inicio = time.perf_counter()
+        obtenido = filtrada()
+        t_filtrada = time.perf_counter() - inicio
+
+    total = contador["comparaciones"] or 1
+    marca = "✅" if obtenido == esperado else "❌"
+    print(f"{nombre:<22}{t_referencia:>10.2f}s{t_filtrada:>10.2f}s"
+          f"{contador['descartadas_longitud'] / total:>11.1%}"
+          f"{contador['descartadas_quick_ratio'] / total:>13.1%}"
+          f"{contador['ratio'] / total:>9.1%}  {marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=60)
+    parser.add_argument("--evoluciones", type=int, default=25, help="Evoluciones por paciente")
+    parser.add_argument("--consultas", type=int, default=20)
+    args = parser.parse_args()
+
+    from analisis import verificar_similitud_al_subir, verificar_similitud_global, encontrar_similitudes_paciente
+
+    reg = generar_registro_similitud(args.pacientes, args.evoluciones)
+    consultas = generar_consultas(reg, args.consultas)
+    pacientes = list(reg.pacientes.values())
+    evoluciones = [(p, ev) for p in pacientes for ev in p.evoluciones]
+
+    def referencia_global(umbral):
+        resultados = []
+        for contenido, cedula in consultas:
+            otras = [ev for p, ev in evoluciones if p.cedula != cedula]
+            resultados.append(_referencia_al_subir(contenido, otras, umbral))
+        return resultados
+
+    def filtrada_global(umbral, primera=False):
+        resultados = []
+        for contenido, cedula in consultas:
+            hay, porcentaje, _, ev = verificar_similitud_global(contenido, reg, cedula, umbral,
+                                                                usar_indice=False, primera=primera)
+            resultados.append(hay if primera else (hay, porcentaje, ev))
+        return resultados
+
+    print(f"\n{'Escenario':<22}{'Sin filtro':>11}{'Filtrada':>11}{'Longitud':>11}{'quick_ratio':>13}{'ratio':>9}")
+    for umbral in (0.85, 0.95):
+        _medir_escenario(
+            f"al subir ({umbral})",
+            lambda: [_referencia_al_subir(c, reg.obtener_paciente(ced).evoluciones, umbral) for c, ced in consultas],
+            lambda: [verificar_similitud_al_subir(c, reg.obtener_paciente(ced).evoluciones, umbral) for c, ced in consultas],
+        )
+        _medir_escenario(f"global ({umbral})", lambda: referencia_global(umbral), lambda: filtrada_global(umbral))
+        # En modo primera solo se compara la decisión (hay o no similitud)
+        _medir_escenario(f"global primera ({umbral})",
+                         lambda: [r[0] for r in referencia_global(umbral)],
+                         lambda: filtrada_global(umbral, primera=True))
+    _medir_escenario(
+        "por paciente (0.80)",
+        lambda: [_referencia_paciente(p, 0.80) for p in pacientes],
+        lambda: [encontrar_similitudes_paciente(reg, p.cedula, 0.80) for p in pacientes],
+    )
+    _medir_cache(reg, pacientes)
+
+
+def _medir_cache(reg, pacientes):
+    """Repite el reporte por paciente para medir la caché de similitudes."""
+    from analisis import CACHE_SIMILITUDES, encontrar_similitudes_paciente
+
+    CACHE_SIMILITUDES.limpiar()
+    print(f"\n{'Reporte por paciente':<22}{'Segundos':>10}{'Aciertos caché':>16}")
+    for vuelta in ("primera vez", "repetido"):
+        aciertos = CACHE_SIMILITUDES.aciertos
+        inicio = time.perf_counter()
+        for p in pacientes:
+            encontrar_similitudes_paciente(reg, p.cedula, 0.80)
+        print(f"{vuelta:<22}{time.perf_counter() - inicio:>9.2f}s{CACHE_SIMILITUDES.aciertos - aciertos:>16}")
+
+
+if __name__ == "__main__":
+    main()
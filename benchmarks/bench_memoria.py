@@ -0,0 +1,121 @@
+"""
+Memoria por evolución y por paciente con tracemalloc.
+
+Compara la representación actual de modelos (con __slots__, fecha y hora
+empaquetadas en un entero y el retraso en minutos) con la anterior (un
+__dict__ por instancia, objetos date y time y un dict de retraso). El
+contenido de las notas se crea antes de medir y lo comparten ambas
+versiones, así se mide solo lo que agrega cada representación. También
+mide cuánto cuesta leer fecha, hora y retraso en cada una.
+
+Uso:
+    python -m benchmarks.bench_memoria
+    python -m benchmarks.bench_memoria --evoluciones 1000000
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import date, time as hora_dia, timedelta
+
+
+class evolucion_anterior:
+    """Evolución como era antes: atributos en __dict__ y retraso como dict."""
+    def __init__(self, fecha, hora, contenido, retraso):
+        self.fecha = fecha
+        self.hora = hora
+        self._contenido = contenido
+        self._normalizado = None
+        self._hash = None
+        self.retraso = retraso
+        self.id = None
+
+
+class paciente_anterior:
+    """Paciente como era antes (con __dict__)."""
+    def __init__(self, cedula, nombre, apellido):
+        self.cedula = cedula
+        self.nombre = nombre
+        self.apellido = apellido
+        self.evoluciones = []
+        self.cambios = None
+
+
+def _datos(n_evoluciones, evoluciones_por_paciente, semilla=3):
+    """Tuplas (fecha, hora, contenido, retraso) creadas antes de medir."""
+    aleatorio = random.Random(semilla)
+    inicio = date(2024, 1, 1)
+    contenidos = [f"Nota de sesión número {i} con el detalle de la intervención realizada." for i in range(1000)]
+    datos = []
+    for i in range(n_evoluciones):
+        minutos = aleatorio.choice([0, 0, 0, aleatorio.randrange(1440, 1440 * 30)])
+        datos.append((inicio + timedelta(days=i % evoluciones_por_paciente),
+                      hora_dia(aleatorio.randrange(7, 20), aleatorio.randrange(60)),
+                      contenidos[i % len(contenidos)], minutos))
+    return datos
+
+
+def _medir_memoria(crear):
+    """Bytes asignados (y retenidos) por crear()."""
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    objetos = crear()
+    despues = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in despues.compare_to(antes, "filename"))
+    return total, objetos
+
+
+def crear_actual(datos, evoluciones_por_paciente):
+    from modelos import paciente, evolucion
+    pacientes = []
+    for i, (fecha, hora, contenido, minutos) in enumerate(datos):
+        if i % evoluciones_por_paciente == 0:
+            pacientes.append(paciente(1000000000 + len(pacientes), "Nombre", "Apellido"))
+        pacientes[-1].evoluciones.append(evolucion.guardada(fecha, hora, contenido, minutos))
+    return pacientes
+
+
+def crear_anterior(datos, evoluciones_por_paciente):
+    from modelos import _retraso_como_dict
+    pacientes = []
+    for i, (fecha, hora, contenido, minutos) in enumerate(datos):
+        if i % evoluciones_por_paciente == 0:
+            pacientes.append(paciente_anterior(1000000000 + len(pacientes), "Nombre", "Apellido"))
+        pacientes[-1].evoluciones.append(evolucion_anterior(fecha, hora, contenido, _retraso_como_dict(minutos)))
+    return pacientes
+
+
+def _medir_lectura(pacientes):
+    """Segundos en leer fecha, hora y retraso de todas las evoluciones."""
+    inicio = time.perf_counter()
+    for p in pacientes:
+        for ev in p.evoluciones:
+            ev.fecha, ev.hora, ev.retraso["dias"]
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evoluciones", type=int, default=200000)
+    parser.add_argument("--por-paciente", type=int, default=20, help="Evoluciones por paciente")
+    args = parser.parse_args()
+
+    datos = _datos(args.evoluciones, args.por_paciente)
+    print(f"\n{'Representación':<16}{'MB':>10}{'Bytes/evolución':>18}{'Lectura s':>12}")
+    for nombre, crear in (("anterior", crear_anterior), ("actual", crear_actual)):
+        # Fechas y horas nuevas por evolución, como al leerlas de JSON o de
+        # la BD: la versión anterior las retiene y la actual no
+        total, pacientes = _medir_memoria(
+            lambda: crear([(date.fromordinal(f.toordinal()), hora_dia(h.hour, h.minute), c, m)
+                           for f, h, c, m in datos], args.por_paciente)
+        )
+        print(f"{nombre:<16}{total / 2**20:>10.1f}{total / len(datos):>18.1f}{_medir_lectura(pacientes):>12.2f}")
+        del pacientes
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark de carga y guardado en SQLite (WAL) frente a PostgreSQL.
+
+Sobre el mismo registro sintético mide, en cada base de datos indicada:
+el guardado completo (modo bulk), la carga completa, la carga del
+directorio de pacientes y el guardado incremental de unos pocos cambios.
+
+Uso:
+    python -m benchmarks.bench_motores
+    python -m benchmarks.bench_motores --url sqlite:///bench.db --url postgresql://usuario@localhost/bench
+"""
+
+import argparse
+from datetime import date, time as hora_dia, timedelta
+from benchmarks.bench_persistencia import generar_registro, medir
+
+
+def medir_motor(url, reg, cambios=50):
+    """
+    Mide las operaciones de persistencia sobre una base de datos.
+    
+    Args:
+        url (str): URL de la base de datos
+        reg (registro): Registro sintético a guardar
+        cambios (int): Evoluciones agregadas en el guardado incremental
+        
+    Returns:
+        dict: {operación: segundos}
+    """
+    from modelos import evolucion
+    from modelos_db import configurar_engine
+    from crear_db import migrar
+    from persistencia_db import guardar_registro_db, guardar_cambios_db, cargar_registro_db, cargar_directorio_db
+    
+    configurar_engine(url=url)
+    migrar()
+    tiempos = {}
+    tiempos["guardado completo"] = medir(guardar_registro_db, reg, modo="bulk")
+    tiempos["carga completa"] = medir(cargar_registro_db)
+    tiempos["carga directorio"] = medir(cargar_directorio_db)
+    
+    # Una evolución nueva en los primeros pacientes, en un día sin evoluciones
+    fecha = date.today() + timedelta(days=1)
+    for p in list(reg.pacientes.values())[:cambios]:
+        p.agregar_evolucion(evolucion(fecha, hora_dia(9, 0), "Control de evolución"))
+    tiempos["guardado incremental"] = medir(guardar_cambios_db, reg)
+    for p in list(reg.pacientes.values())[:cambios]:
+        p.eliminar_evolucion(len(p.evoluciones) - 1)
+    guardar_cambios_db(reg)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", help="URL de una base de datos (repetible)")
+    parser.add_argument("--pacientes", type=int, default=2000)
+    parser.add_argument("--evoluciones", type=int, default=10, help="Evoluciones por paciente")
+    args = parser.parse_args()
+    urls = args.url or ["sqlite:///bench_motores.db"]
+    
+    reg = generar_registro(args.pacientes, args.evoluciones)
+    resultados = {}
+    for url in urls:
+        try:
+            resultados[url] = medir_motor(url, reg)
+        except Exception as e:
+            print(f"❌ {url}: {e}")
+    
+    operaciones = ["guardado completo", "carga completa", "carga directorio", "guardado incremental"]
+    print(f"\n{'Operación':<24}" + "".join(f"{url.split(':')[0]:>16}" for url in resultados))
+    for operacion in operaciones:
+        print(f"{operacion:<24}" + "".join(f"{tiempos[operacion]:>15.3f}s" for tiempos in resultados.values()))
+
+
+if __name__ == "__main__":
+    main()
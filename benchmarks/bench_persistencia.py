@@ -0,0 +1,82 @@
+"""
+Benchmark del guardado completo del registro en la base de datos.
+
+Compara el modo "orm" (un objeto ORM por fila) con el modo "bulk"
+(executemany en lotes, COPY en PostgreSQL) sobre un registro sintético.
+
+Uso:
+    python -m benchmarks.bench_persistencia --url sqlite:///bench.db
+    python -m benchmarks.bench_persistencia --url postgresql://usuario@localhost/bench
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, time as hora_dia, timedelta
+
+
+def generar_registro(n_pacientes, evoluciones_por_paciente, semilla=42):
+    """
+    Crea un registro sintético en memoria.
+    
+    Args:
+        n_pacientes (int): Cantidad de pacientes
+        evoluciones_por_paciente (int): Evoluciones de cada paciente
+        semilla (int): Semilla para que los datos sean reproducibles
+        
+    Returns:
+        registro: Registro con pacientes, evoluciones y strikes
+    """
+    from modelos import registro, paciente, evolucion
+    
+    aleatorio = random.Random(semilla)
+    reg = registro()
+    inicio = date.today() - timedelta(days=evoluciones_por_paciente)
+    for i in range(n_pacientes):
+        p = paciente(1000000000 + i, f"Nombre{i}", f"Apellido{i}")
+        for j in range(evoluciones_por_paciente):
+            ev = evolucion(
+                inicio + timedelta(days=j),
+                hora_dia(aleatorio.randint(7, 18), aleatorio.randint(0, 59)),
+                f"Sesión {j} del paciente {i}: ejercicios de movilidad y fortalecimiento"
+            )
+            p.evoluciones.append(ev)
+        reg.cargar_paciente(p)
+        if i % 10 == 0:
+            reg.strikes.append({"razon": "Evolución subida después de las 24 horas", "fecha": str(inicio)})
+    return reg
+
+
+def medir(funcion, *args, **kwargs):
+    """Ejecuta funcion y retorna los segundos que tardó."""
+    inicio = time.perf_counter()
+    funcion(*args, **kwargs)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///bench_persistencia.db", help="URL de la base de datos")
+    parser.add_argument("--pacientes", type=int, default=2000)
+    parser.add_argument("--evoluciones", type=int, default=10, help="Evoluciones por paciente")
+    parser.add_argument("--lote", type=int, default=1000, help="Tamaño de lote del modo bulk")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = args.url
+    from modelos_db import crear_tablas
+    from persistencia_db import guardar_registro_db
+    
+    crear_tablas()
+    reg = generar_registro(args.pacientes, args.evoluciones)
+    filas = len(reg.pacientes) + reg.total_evoluciones() + len(reg.strikes)
+    
+    print(f"\nFilas por guardado: {filas}")
+    print(f"{'Modo':<8}{'Segundos':>12}{'Filas/s':>14}")
+    for modo in ("orm", "bulk"):
+        segundos = medir(guardar_registro_db, reg, modo=modo, tamano_lote=args.lote)
+        print(f"{modo:<8}{segundos:>12.3f}{filas / segundos:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Suite de benchmarks de similitud sobre el corpus de benchmarks.corpus_notas.
+
+Para cada tamaño (pacientes x notas por paciente) mide:
+    calcular_similitud      pares al azar comparados uno por uno
+    al_subir                verificar_similitud_al_subir por cada subida
+    global_indice           verificar_similitud_global con el índice LSH
+                            (construcción del índice aparte, en indice_lsh)
+    global_completo         verificar_similitud_global recorriendo todo
+    reporte_paciente        encontrar_similitudes_paciente de cada paciente
+    reporte_completo        obtener_todas_similitudes
+    reporte_repetido        obtener_todas_similitudes otra vez (con caché)
+
+Cada escenario se repite (--repeticiones) y se reporta la vuelta más
+rápida; cada vuelta empieza con la caché de similitudes vacía (salvo
+reporte_repetido). Además del tiempo guarda un resumen del resultado
+(similitudes encontradas), así un cambio que altere resultados también se
+detecta. Con --comparar se marcan los escenarios más lentos que una
+ejecución anterior guardada con --json.
+
+Uso:
+    python -m benchmarks.bench_similitud
+    python -m benchmarks.bench_similitud --pacientes 100 --pacientes 400 --notas 20 --json base.json
+    python -m benchmarks.bench_similitud --comparar base.json --tolerancia 0.2
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from benchmarks.corpus_notas import generar_corpus, generar_subidas
+
+
+def _medir(funcion, operaciones):
+    """
+    Ejecuta funcion(operacion) por cada operación y mide cada llamada.
+
+    Returns:
+        tuple: (tiempos en segundos, resultados)
+    """
+    tiempos = []
+    resultados = []
+    for operacion in operaciones:
+        inicio = time.perf_counter()
+        resultados.append(funcion(operacion))
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultados
+
+
+def _fila(escenario, tiempos, resultado):
+    """Resume los tiempos de un escenario."""
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] if ordenados else 0.0
+    total = sum(tiempos)
+    return {
+        "escenario": escenario,
+        "operaciones": len(tiempos),
+        "segundos": round(total, 4),
+        "ms_media": round(total / len(tiempos) * 1000, 3) if tiempos else 0.0,
+        "ms_p95": round(p95 * 1000, 3),
+        "resultado": resultado,
+    }
+
+
+def ejecutar(n_pacientes, notas_por_paciente, subidas=50, pares=2000, procesos=1,
+             tasa_duplicados_paciente=0.05, tasa_duplicados_global=0.02, semilla=7, escenarios=None,
+             repeticiones=3):
+    """
+    Corre los escenarios sobre un corpus de ese tamaño.
+
+    Args:
+        n_pacientes (int): Pacientes del corpus
+        notas_por_paciente (int): Evoluciones por paciente
+        subidas (int): Evoluciones nuevas a verificar en al_subir y global_*
+        pares (int): Pares a comparar en calcular_similitud
+        procesos (int): Procesos para obtener_todas_similitudes
+        tasa_duplicados_paciente (float): Ver corpus_notas.generar_corpus
+        tasa_duplicados_global (float): Ver corpus_notas.generar_corpus
+        semilla (int): Semilla del corpus
+        escenarios (list): Escenarios a correr (por defecto todos)
+        repeticiones (int): Veces que se corre cada escenario; se reporta
+            la más rápida, que es la menos afectada por otros procesos
+
+    Returns:
+        list: Un dict por escenario (ver _fila), con pacientes y notas
+    """
+    from analisis import (CACHE_SIMILITUDES, calcular_similitud, verificar_similitud_al_subir,
+                          verificar_similitud_global, encontrar_similitudes_paciente, obtener_todas_similitudes)
+    from similitud_lsh import obtener_indice
+
+    reg, _ = generar_corpus(n_pacientes, notas_por_paciente, tasa_duplicados_paciente,
+                            tasa_duplicados_global, semilla=semilla)
+    nuevas = generar_subidas(reg, subidas, semilla=semilla + 4)
+    evoluciones = [ev for p in reg.pacientes.values() for ev in p.evoluciones]
+    aleatorio = random.Random(semilla)
+    pares_al_azar = [(aleatorio.choice(evoluciones).contenido, aleatorio.choice(evoluciones).contenido)
+                     for _ in range(pares)]
+    pacientes = list(reg.pacientes.values())
+
+    def al_subir(subida):
+        cedula, contenido = subida
+        return verificar_similitud_al_subir(contenido, reg.obtener_paciente(cedula).evoluciones)[0]
+
+    def global_indice(subida):
+        cedula, contenido = subida
+        return verificar_similitud_global(contenido, reg, cedula, usar_indice=True)[0]
+
+    def global_completo(subida):
+        cedula, contenido = subida
+        return verificar_similitud_global(contenido, reg, cedula, usar_indice=False)[0]
+
+    def reporte_completo(_):
+        return len(obtener_todas_similitudes(reg, procesos=procesos))
+
+    casos = [
+        ("calcular_similitud", lambda par: round(calcular_similitud(*par), 4), pares_al_azar,
+         lambda r: round(sum(r), 2)),
+        ("al_subir", al_subir, nuevas, sum),
+        ("indice_lsh", lambda _: len(obtener_indice(reg)), [None], lambda r: r[0]),
+        ("global_indice", global_indice, nuevas, sum),
+        ("global_completo", global_completo, nuevas, sum),
+        ("reporte_paciente", lambda p: len(encontrar_similitudes_paciente(reg, p.cedula)), pacientes, sum),
+        ("reporte_completo", reporte_completo, [None], lambda r: r[0]),
+        ("reporte_repetido", reporte_completo, [None], lambda r: r[0]),
+    ]
+    filas = []
+    for escenario, funcion, operaciones, resumir in casos:
+        if escenarios and escenario not in escenarios:
+            continue
+        mejor = None
+        for _ in range(repeticiones):
+            if escenario == "indice_lsh":
+                reg.indice_lsh = None
+            if escenario != "reporte_repetido":
+                CACHE_SIMILITUDES.limpiar()
+            tiempos, resultados = _medir(funcion, operaciones)
+            if mejor is None or sum(tiempos) < sum(mejor[0]):
+                mejor = (tiempos, resultados)
+        tiempos, resultados = mejor
+        fila = _fila(escenario, tiempos, resumir(resultados))
+        fila.update(pacientes=n_pacientes, notas=notas_por_paciente)
+        filas.append(fila)
+    return filas
+
+
+def comparar(filas, anteriores, tolerancia):
+    """
+    Marca las filas más lentas o con otro resultado que en una ejecución anterior.
+
+    Args:
+        filas (list): Resultados actuales
+        anteriores (list): Resultados guardados antes
+        tolerancia (float): Aumento de tiempo permitido (0.2 = 20 %)
+
+    Returns:
+        int: Cantidad de regresiones
+    """
+    previas = {(f["pacientes"], f["notas"], f["escenario"]): f for f in anteriores}
+    regresiones = 0
+    for fila in filas:
+        previa = previas.get((fila["pacientes"], fila["notas"], fila["escenario"]))
+        if previa is None:
+            fila["comparacion"] = ""
+            continue
+        cambio = fila["segundos"] / previa["segundos"] - 1 if previa["segundos"] else 0.0
+        if fila["resultado"] != previa["resultado"]:
+            fila["comparacion"] = f"❌ resultado {previa['resultado']} -> {fila['resultado']}"
+            regresiones += 1
+        elif cambio > tolerancia:
+            fila["comparacion"] = f"⚠️ {cambio:+.0%}"
+            regresiones += 1
+        else:
+            fila["comparacion"] = f"✅ {cambio:+.0%}"
+    return regresiones
+
+
+def imprimir_tabla(filas):
+    """Muestra los resultados como tabla."""
+    print(f"\n{'Tamaño':<12}{'Escenario':<20}{'Ops':>6}{'Total s':>10}{'ms media':>11}"
+          f"{'ms p95':>10}{'Resultado':>11}  Comparación")
+    for f in filas:
+        print(f"{f['pacientes']}x{f['notas']:<8}{f['escenario']:<20}{f['operaciones']:>6}{f['segundos']:>10.3f}"
+              f"{f['ms_media']:>11.3f}{f['ms_p95']:>10.3f}{f['resultado']!s:>11}  {f.get('comparacion', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, action="append", help="Pacientes del corpus (repetible)")
+    parser.add_argument("--notas", type=int, default=15, help="Notas por paciente")
+    parser.add_argument("--subidas", type=int, default=50)
+    parser.add_argument("--pares", type=int, default=2000, help="Pares para calcular_similitud")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos del reporte completo")
+    parser.add_argument("--duplicados-paciente", type=float, default=0.05)
+    parser.add_argument("--duplicados-global", type=float, default=0.02)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se reporta la más rápida")
+    parser.add_argument("--escenario", action="append", help="Correr solo este escenario (repetible)")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento de tiempo tolerado")
+    args = parser.parse_args()
+
+    filas = []
+    for n_pacientes in args.pacientes or [50, 200]:
+        filas.extend(ejecutar(n_pacientes, args.notas, args.subidas, args.pares, args.procesos,
+                              args.duplicados_paciente, args.duplicados_global, args.semilla, args.escenario, args.repeticiones))
+
+    regresiones = 0
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            regresiones = comparar(filas, json.load(f)["resultados"], args.tolerancia)
+    imprimir_tabla(filas)
+
+    if args.json:
+        datos = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "parametros": {k: v for k, v in vars(args).items() if k not in ("json", "comparar")},
+            "resultados": [{k: v for k, v in f.items() if k != "comparacion"} for f in filas],
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=4, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.json}")
+    if regresiones:
+        print(f"\n❌ {regresiones} escenarios con regresión")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark de verificar_similitud_global: recorrido completo frente al índice LSH.
+
+Genera un registro con notas sintéticas (una parte copiadas con pequeños
+cambios de otros pacientes) y consultas casi duplicadas y nuevas. Para
+cada umbral mide la latencia media por consulta y el recall del índice:
+de las consultas en que el recorrido completo encuentra similitud, qué
+fracción encuentra también el índice.
+
+Uso:
+    python -m benchmarks.bench_similitud_global
+    python -m benchmarks.bench_similitud_global --pacientes 500 --evoluciones 20 --consultas 200
+"""
+
+import argparse
+import random
+import time
+from datetime import date, time as hora_dia, timedelta
+from benchmarks.corpus_notas import generar_nota, alterar_nota
+
+
+def generar_registro_similitud(n_pacientes, evoluciones_por_paciente, tasa_copias=0.05, semilla=7):
+    """
+    Crea un registro con notas sintéticas.
+
+    Args:
+        n_pacientes (int): Cantidad de pacientes
+        evoluciones_por_paciente (int): Evoluciones de cada paciente
+        tasa_copias (float): Fracción de notas copiadas (con cambios) de otra ya creada
+        semilla (int): Semilla para que los datos sean reproducibles
+
+    Returns:
+        registro: Registro sintético
+    """
+    from modelos import registro, paciente, evolucion
+
+    aleatorio = random.Random(semilla)
+    reg = registro()
+    notas = []
+    inicio = date.today() - timedelta(days=evoluciones_por_paciente)
+    for i in range(n_pacientes):
+        p = paciente(1000000000 + i, f"Nombre{i}", f"Apellido{i}")
+        for j in range(evoluciones_por_paciente):
+            if notas and aleatorio.random() < tasa_copias:
+                contenido = alterar_nota(aleatorio, aleatorio.choice(notas))
+            else:
+                contenido = generar_nota(aleatorio)
+            notas.append(contenido)
+            p.evoluciones.append(evolucion(inicio + timedelta(days=j), hora_dia(9, 0), contenido))
+        reg.cargar_paciente(p)
+    return reg
+
+
+def generar_consultas(reg, cantidad, semilla=11):
+    """Mitad copias alteradas de evoluciones existentes, mitad notas nuevas."""
+    aleatorio = random.Random(semilla)
+    pacientes = list(reg.pacientes.values())
+    consultas = []
+    for i in range(cantidad):
+        cedula = aleatorio.choice(pacientes).cedula
+        if i % 2 == 0:
+            origen = aleatorio.choice(pacientes)
+            contenido = alterar_nota(aleatorio, aleatorio.choice(origen.evoluciones).contenido, aleatorio.randint(0, 3))
+        else:
+            contenido = generar_nota(aleatorio)
+        consultas.append((contenido, cedula))
+    return consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=300)
+    parser.add_argument("--evoluciones", type=int, default=20, help="Evoluciones por paciente")
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--umbral", type=float, action="append", help="Umbral (repetible)")
+    args = parser.parse_args()
+    umbrales = args.umbral or [0.87, 0.95]
+
+    from analisis import verificar_similitud_global
+    from similitud_lsh import obtener_indice
+
+    reg = generar_registro_similitud(args.pacientes, args.evoluciones)
+    consultas = generar_consultas(reg, args.consultas)
+    inicio = time.perf_counter()
+    obtener_indice(reg)
+    print(f"Índice construido con {reg.total_evoluciones()} evoluciones en {time.perf_counter() - inicio:.2f}s")
+
+    print(f"\n{'Umbral':<8}{'Completo ms':>14}{'Índice ms':>12}{'Aciertos':>10}{'Recall':>9}")
+    for umbral in umbrales:
+        tiempos = {True: 0.0, False: 0.0}
+        resultados = {True: [], False: []}
+        for usar_indice in (False, True):
+            for contenido, cedula in consultas:
+                inicio = time.perf_counter()
+                resultados[usar_indice].append(
+                    verificar_similitud_global(contenido, reg, cedula, umbral, usar_indice=usar_indice)
+                )
+                tiempos[usar_indice] += time.perf_counter() - inicio
+        positivos = [i for i, r in enumerate(resultados[False]) if r[0]]
+        encontrados = sum(1 for i in positivos if resultados[True][i][:2] == resultados[False][i][:2])
+        recall = encontrados / len(positivos) if positivos else 1.0
+        print(f"{umbral:<8}{tiempos[False] / len(consultas) * 1000:>14.2f}"
+              f"{tiempos[True] / len(consultas) * 1000:>12.2f}{len(positivos):>10}{recall:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
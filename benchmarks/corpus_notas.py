@@ -0,0 +1,220 @@
+"""
+Generador determinístico de notas de fisioterapia sintéticas.
+
+Produce registros con evoluciones en español con la estructura de una
+sesión (subjetivo, objetivo, intervención y plan), coherentes dentro de
+cada paciente (mismo diagnóstico y zona tratada), e inyecta casi
+duplicados con tasas controladas: copias alteradas de una nota anterior
+del mismo paciente y de notas de otros pacientes. Con la misma semilla
+se obtiene siempre el mismo corpus.
+
+También contiene el generador simple de frases sueltas que usan los
+benchmarks de similitud global y de filtros.
+"""
+
+import random
+from datetime import date, time as hora_dia, timedelta
+
+FRASES = [
+    "Paciente refiere dolor {intensidad} en {zona} al realizar {actividad}.",
+    "Se realiza movilización pasiva de {zona} con buena tolerancia.",
+    "Se aplican ejercicios de fortalecimiento de {zona}, {series} series de {repeticiones} repeticiones.",
+    "Se aplica {agente} sobre {zona} durante {minutos} minutos.",
+    "Mejora el rango de movimiento de {zona} respecto a la sesión anterior.",
+    "Se indica plan casero de estiramientos de {zona}.",
+    "Marcha con {ayuda}, sin signos de fatiga.",
+    "Se observa edema {intensidad} en {zona}.",
+]
+VALORES = {
+    "intensidad": ["leve", "moderado", "intenso", "ocasional"],
+    "zona": ["rodilla derecha", "rodilla izquierda", "hombro derecho", "columna lumbar",
+             "tobillo izquierdo", "cadera derecha", "cuello", "muñeca izquierda"],
+    "actividad": ["subir escaleras", "caminar", "flexionar", "levantar peso", "dormir"],
+    "series": ["2", "3", "4"],
+    "repeticiones": ["8", "10", "12", "15"],
+    "agente": ["compresas calientes", "crioterapia", "ultrasonido", "TENS", "láser"],
+    "minutos": ["10", "15", "20"],
+    "ayuda": ["bastón", "caminador", "apoyo unilateral", "marcha independiente"],
+}
+
+# Secciones de una nota de sesión; {zona} y {diagnostico} son los del paciente
+SUBJETIVO = [
+    "Paciente refiere dolor {intensidad} en {zona}, EVA {eva}/10, que aumenta al {actividad}.",
+    "Refiere mejoría desde la sesión anterior, dolor EVA {eva}/10 en {zona}.",
+    "Acude a sesión {sesion} por {diagnostico}. Refiere rigidez matutina de {minutos} minutos.",
+    "Comenta que realizó los ejercicios en casa {frecuencia}. Dolor {intensidad} al {actividad}.",
+    "Refiere que durmió mal por dolor en {zona}; niega parestesias.",
+]
+OBJETIVO = [
+    "Flexión de {zona} {grados}°, extensión {grados_ext}°. Fuerza muscular {fuerza}/5.",
+    "Se observa edema {intensidad} en {zona}, sin signos de infección.",
+    "Marcha con {ayuda}, patrón {patron}. Equilibrio monopodal {segundos} segundos.",
+    "Palpación dolorosa en {estructura}. Pruebas especiales {resultado_prueba}.",
+    "Rango de movimiento de {zona} mejora {mejora}° respecto a la sesión anterior.",
+]
+INTERVENCION = [
+    "Se aplica {agente} sobre {zona} durante {minutos} minutos.",
+    "Movilización pasiva de {zona} grado {grado_mov}, {series} series, con buena tolerancia.",
+    "Ejercicios de fortalecimiento de {musculo}: {series} series de {repeticiones} repeticiones con banda {banda}.",
+    "Estiramientos de {musculo} sostenidos {segundos} segundos, {series} repeticiones.",
+    "Reeducación de la marcha en paralelas y entrenamiento propioceptivo en {superficie}.",
+    "Masoterapia descontracturante en {estructura} durante {minutos} minutos.",
+]
+PLAN = [
+    "Plan: continuar con el protocolo de {diagnostico}, {sesiones_semana} sesiones por semana.",
+    "Se indica plan casero de estiramientos de {zona} {frecuencia}.",
+    "Se progresa la carga de ejercicios; control en {dias} días.",
+    "Se educa sobre higiene postural y uso de {agente_casa} en casa.",
+    "Próxima sesión: reevaluar rango de movimiento y fuerza de {zona}.",
+]
+VALORES_SESION = {
+    "intensidad": ["leve", "moderado", "intenso", "ocasional"],
+    "actividad": ["subir escaleras", "caminar", "flexionar", "levantar peso", "dormir", "sentarse"],
+    "eva": [str(n) for n in range(1, 10)],
+    "minutos": ["10", "15", "20", "30"],
+    "frecuencia": ["a diario", "dos veces al día", "tres veces por semana", "de forma irregular"],
+    "grados": [str(n) for n in range(60, 150, 5)],
+    "grados_ext": [str(n) for n in range(0, 20, 5)],
+    "fuerza": ["3", "3+", "4-", "4", "4+", "5"],
+    "ayuda": ["bastón", "caminador", "apoyo unilateral", "marcha independiente", "muletas"],
+    "patron": ["antálgico", "normal", "con claudicación leve", "en tijera"],
+    "segundos": ["5", "10", "15", "20", "30"],
+    "estructura": ["trapecio superior", "cintilla iliotibial", "tendón rotuliano",
+                   "musculatura paravertebral", "manguito rotador", "fascia plantar"],
+    "resultado_prueba": ["negativas", "positivas", "dudosas"],
+    "mejora": ["5", "10", "15"],
+    "agente": ["compresas calientes", "crioterapia", "ultrasonido", "TENS", "láser", "onda corta"],
+    "grado_mov": ["I", "II", "III", "IV"],
+    "series": ["2", "3", "4"],
+    "repeticiones": ["8", "10", "12", "15"],
+    "musculo": ["cuádriceps", "isquiotibiales", "glúteo medio", "deltoides", "core", "gemelos"],
+    "banda": ["amarilla", "roja", "verde", "azul"],
+    "superficie": ["colchoneta", "bosu", "plataforma inestable", "suelo firme"],
+    "sesiones_semana": ["2", "3", "5"],
+    "dias": ["7", "10", "15"],
+    "agente_casa": ["hielo", "calor local", "faja lumbar", "rodillera"],
+}
+DIAGNOSTICOS = [
+    ("lumbalgia mecánica", "columna lumbar"), ("gonartrosis", "rodilla derecha"),
+    ("esguince de tobillo grado II", "tobillo izquierdo"), ("tendinopatía del manguito rotador", "hombro derecho"),
+    ("cervicalgia", "cuello"), ("postoperatorio de reemplazo de cadera", "cadera derecha"),
+    ("síndrome del túnel carpiano", "muñeca izquierda"), ("fascitis plantar", "pie derecho"),
+    ("condromalacia rotuliana", "rodilla izquierda"), ("epicondilitis lateral", "codo derecho"),
+]
+
+
+def generar_nota(aleatorio, frases=4):
+    """Arma una nota clínica combinando frases con valores al azar."""
+    partes = []
+    for plantilla in aleatorio.sample(FRASES, frases):
+        partes.append(plantilla.format(**{clave: aleatorio.choice(opciones) for clave, opciones in VALORES.items()}))
+    return " ".join(partes)
+
+
+def alterar_nota(aleatorio, nota, cambios=2):
+    """Cambia algunas palabras de la nota (una copia casi idéntica)."""
+    palabras = nota.split()
+    for _ in range(cambios):
+        palabras[aleatorio.randrange(len(palabras))] = aleatorio.choice(VALORES["zona"]).split()[0]
+    return " ".join(palabras)
+
+
+def generar_nota_sesion(aleatorio, diagnostico, zona, sesion):
+    """
+    Arma la nota de una sesión de fisioterapia.
+
+    Args:
+        aleatorio (random.Random): Generador de números al azar
+        diagnostico (str): Diagnóstico del paciente
+        zona (str): Zona tratada
+        sesion (int): Número de sesión
+
+    Returns:
+        str: Nota con una o dos frases de cada sección
+    """
+    valores = {clave: aleatorio.choice(opciones) for clave, opciones in VALORES_SESION.items()}
+    valores.update(diagnostico=diagnostico, zona=zona, sesion=sesion)
+    partes = []
+    for seccion in (SUBJETIVO, OBJETIVO, INTERVENCION, PLAN):
+        for plantilla in aleatorio.sample(seccion, aleatorio.randint(1, 2)):
+            partes.append(plantilla.format(**valores))
+    return " ".join(partes)
+
+
+def generar_corpus(n_pacientes, notas_por_paciente, tasa_duplicados_paciente=0.05,
+                   tasa_duplicados_global=0.02, cambios_duplicado=(0, 3), semilla=7):
+    """
+    Crea un registro con notas de sesión y casi duplicados inyectados.
+
+    Args:
+        n_pacientes (int): Cantidad de pacientes
+        notas_por_paciente (int): Evoluciones de cada paciente (una por día)
+        tasa_duplicados_paciente (float): Fracción de notas copiadas de una
+            nota anterior del mismo paciente
+        tasa_duplicados_global (float): Fracción de notas copiadas de una
+            nota de otro paciente
+        cambios_duplicado (tuple): Mínimo y máximo de palabras cambiadas en
+            cada copia
+        semilla (int): Semilla para que el corpus sea reproducible
+
+    Returns:
+        tuple: (registro, duplicados) donde duplicados es la lista de pares
+               ((cedula, fecha) original, (cedula, fecha) copia) inyectados
+    """
+    from modelos import registro, paciente, evolucion
+
+    aleatorio = random.Random(semilla)
+    reg = registro()
+    notas = []
+    duplicados = []
+    inicio = date(2024, 1, 1)
+    for i in range(n_pacientes):
+        p = paciente(1000000000 + i, f"Nombre{i}", f"Apellido{i}")
+        diagnostico, zona = aleatorio.choice(DIAGNOSTICOS)
+        for j in range(notas_por_paciente):
+            fecha = inicio + timedelta(days=j)
+            azar = aleatorio.random()
+            origen = None
+            if j > 0 and azar < tasa_duplicados_paciente:
+                anterior = p.evoluciones[aleatorio.randrange(j)]
+                origen, texto = (p.cedula, anterior.fecha), anterior.contenido
+            elif notas and azar < tasa_duplicados_paciente + tasa_duplicados_global:
+                cedula_origen, fecha_origen, texto = aleatorio.choice(notas)
+                origen = (cedula_origen, fecha_origen)
+            if origen is None:
+                contenido = generar_nota_sesion(aleatorio, diagnostico, zona, j + 1)
+            else:
+                contenido = alterar_nota(aleatorio, texto, aleatorio.randint(*cambios_duplicado))
+                duplicados.append((origen, (p.cedula, fecha)))
+            p.evoluciones.append(evolucion(fecha, hora_dia(8 + j % 10, 0), contenido))
+        notas.extend((p.cedula, ev.fecha, ev.contenido) for ev in p.evoluciones)
+        reg.cargar_paciente(p)
+    return reg, duplicados
+
+
+def generar_subidas(reg, cantidad, tasa_duplicados=0.5, semilla=11):
+    """
+    Evoluciones nuevas para medir las verificaciones al subir.
+
+    Args:
+        reg (registro): Registro creado con generar_corpus()
+        cantidad (int): Cantidad de subidas
+        tasa_duplicados (float): Fracción que son copias alteradas de una nota existente
+        semilla (int): Semilla
+
+    Returns:
+        list: Tuplas (cedula, contenido)
+    """
+    aleatorio = random.Random(semilla)
+    pacientes = list(reg.pacientes.values())
+    subidas = []
+    for _ in range(cantidad):
+        p = aleatorio.choice(pacientes)
+        if aleatorio.random() < tasa_duplicados:
+            origen = aleatorio.choice(pacientes)
+            contenido = alterar_nota(aleatorio, aleatorio.choice(origen.evoluciones).contenido, aleatorio.randint(0, 3))
+        else:
+            diagnostico, zona = aleatorio.choice(DIAGNOSTICOS)
+            contenido = generar_nota_sesion(aleatorio, diagnostico, zona, p.total_evoluciones() + 1)
+        subidas.append((p.cedula, contenido))
+    return subidas
@@ -1,14 +1,149 @@
 """
-Script para crear las tablas en PostgreSQL.
-Ejecutar una sola vez.
+Script para crear y migrar las tablas en la base de datos (PostgreSQL o SQLite).
+
+Crea las tablas que falten y aplica, en orden, las migraciones pendientes
+sobre una base de datos existente. Las versiones aplicadas se guardan en
+la tabla schema_version, así que puede ejecutarse las veces que haga falta.
+
+Uso:
+    python crear_db.py            # crear tablas y aplicar migraciones
+    python crear_db.py --estado   # ver migraciones aplicadas y pendientes
 """
 
-from modelos_db import crear_tablas
+import sys
+from sqlalchemy import inspect, text
+from modelos_db import Base, StrikeDB, obtener_engine
+
+
+def _migracion_1(conn):
+    """Índice por fecha y restricción única (cedula_paciente, fecha) en evoluciones."""
+    duplicadas = conn.execute(text(
+        "SELECT cedula_paciente, fecha, COUNT(*) FROM evoluciones "
+        "GROUP BY cedula_paciente, fecha HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicadas:
+        detalle = ", ".join(f"{cedula} ({fecha})" for cedula, fecha, _ in duplicadas[:10])
+        raise RuntimeError(
+            f"Hay {len(duplicadas)} pacientes con más de una evolución en el mismo día: "
+            f"{detalle}. Corríjalas antes de migrar."
+        )
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "ALTER TABLE evoluciones ADD CONSTRAINT uq_evoluciones_cedula_fecha "
+            "UNIQUE (cedula_paciente, fecha)"
+        ))
+    else:
+        # SQLite no admite ADD CONSTRAINT; un índice único es equivalente
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_evoluciones_cedula_fecha "
+            "ON evoluciones (cedula_paciente, fecha)"
+        ))
+    conn.execute(text("CREATE INDEX ix_evoluciones_fecha ON evoluciones (fecha)"))
+
+
+def _migracion_2(conn):
+    """Fecha de strikes como Date con índice y enlace opcional al paciente."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE strikes ALTER COLUMN fecha TYPE DATE USING fecha::date"))
+        conn.execute(text(
+            "ALTER TABLE strikes ADD COLUMN cedula_paciente INTEGER "
+            "REFERENCES pacientes (cedula) ON DELETE SET NULL"
+        ))
+        conn.execute(text("CREATE INDEX ix_strikes_fecha ON strikes (fecha)"))
+        conn.execute(text("CREATE INDEX ix_strikes_cedula_paciente ON strikes (cedula_paciente)"))
+    else:
+        # SQLite no permite cambiar el tipo de una columna: se reconstruye la tabla
+        conn.execute(text("ALTER TABLE strikes RENAME TO strikes_anterior"))
+        StrikeDB.__table__.create(conn)
+        conn.execute(text(
+            "INSERT INTO strikes (id, razon, fecha) "
+            "SELECT id, razon, date(fecha) FROM strikes_anterior"
+        ))
+        conn.execute(text("DROP TABLE strikes_anterior"))
+
+
+# (versión, descripción, función) en el orden en que deben aplicarse
+MIGRACIONES = [
+    (1, "Índices y restricción única en evoluciones", _migracion_1),
+    (2, "Fecha de strikes como Date, con índice y enlace al paciente", _migracion_2),
+]
+
+
+def _versiones_aplicadas(conn):
+    """Crea la tabla schema_version si no existe y retorna las versiones aplicadas."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, descripcion VARCHAR(255) NOT NULL)"
+    ))
+    return {fila[0] for fila in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def _marcar_aplicada(conn, version, descripcion):
+    conn.execute(
+        text("INSERT INTO schema_version (version, descripcion) VALUES (:version, :descripcion)"),
+        {"version": version, "descripcion": descripcion}
+    )
+
+
+def migrar(engine=None):
+    """
+    Crea las tablas que falten y aplica las migraciones pendientes.
+
+    En una base de datos nueva las tablas se crean ya con el esquema final
+    y todas las migraciones se marcan como aplicadas.
+
+    Args:
+        engine: Engine a migrar (por defecto el de la aplicación)
+
+    Returns:
+        list: Versiones aplicadas en esta ejecución
+    """
+    engine = engine or obtener_engine()
+    base_nueva = not inspect(engine).has_table("evoluciones")
+    aplicadas_ahora = []
+
+    with engine.begin() as conn:
+        aplicadas = _versiones_aplicadas(conn)
+        if base_nueva:
+            Base.metadata.create_all(conn)
+            for version, descripcion, _ in MIGRACIONES:
+                _marcar_aplicada(conn, version, descripcion)
+            return aplicadas_ahora
+
+    for version, descripcion, funcion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        print(f"Aplicando migración {version}: {descripcion}")
+        # Cada migración en su propia transacción
+        with engine.begin() as conn:
+            funcion(conn)
+            _marcar_aplicada(conn, version, descripcion)
+        aplicadas_ahora.append(version)
+
+    # Tablas nuevas que no existían en la base de datos anterior
+    Base.metadata.create_all(engine)
+    return aplicadas_ahora
+
+
+def mostrar_estado(engine=None):
+    """Imprime las migraciones aplicadas y pendientes."""
+    engine = engine or obtener_engine()
+    with engine.begin() as conn:
+        aplicadas = _versiones_aplicadas(conn)
+    for version, descripcion, _ in MIGRACIONES:
+        marca = "✅" if version in aplicadas else "⏳"
+        print(f"{marca} {version}: {descripcion}")
+
 
 if __name__ == "__main__":
-    print("Creando tablas en PostgreSQL...")
+    if "--estado" in sys.argv:
+        mostrar_estado()
+        sys.exit(0)
+    print("Creando y migrando tablas en la base de datos...")
     try:
-        crear_tablas()
+        aplicadas = migrar()
+        if aplicadas:
+            print(f"Migraciones aplicadas: {aplicadas}")
         print("✅ Base de datos configurada correctamente")
     except Exception as e:
-        print(f"❌ Error al crear tablas: {e}")
\ No newline at end of file
+        print(f"❌ Error al crear tablas: {e}")
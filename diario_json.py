@@ -0,0 +1,277 @@
+"""
+Persistencia JSON con diario (journal) de solo agregado y snapshot.
+
+Cada cambio del registro se agrega como una línea JSON al diario
+(datos.json.diario), con fsync por lotes: cada sincronizar_cada entradas
+o, a más tardar, intervalo_sincronizacion segundos después de escribir
+(un hilo en segundo plano sincroniza aunque no lleguen más cambios).
+compactar() escribe el registro completo en el snapshot (datos.json) de
+forma atómica y vacía el diario.
+Al recuperar se carga el snapshot y se reaplican las entradas del diario
+posteriores a él, así un guardado cuesta lo que mide el cambio y un
+corte a mitad de escritura no corrompe los datos.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date
+from modelos import registro, paciente, evolucion
+
+
+def escribir_snapshot(datos, archivo):
+    """
+    Escribe un dict como JSON de forma atómica (archivo temporal + rename).
+
+    Args:
+        datos (dict): Datos a guardar
+        archivo (str): Ruta del archivo final
+    """
+    temporal = f"{archivo}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, archivo)
+
+
+def _indice_por_fecha(p, fecha_iso):
+    """Retorna el índice de la evolución de p con esa fecha (ISO)."""
+    indice = p.posicion_de_fecha(date.fromisoformat(fecha_iso))
+    if indice is not None:
+        return indice
+    raise ValueError(f"No existe evolución del paciente {p.cedula} con fecha {fecha_iso}")
+
+
+def aplicar_evento(reg: registro, evento):
+    """
+    Reaplica sobre el registro un evento emitido por control_cambios.
+
+    Args:
+        reg (registro): Registro a modificar
+        evento (dict): Evento con la clave "tipo" y sus datos
+    """
+    tipo = evento["tipo"]
+    if tipo == "paciente_agregado":
+        reg.agregar_paciente(paciente.importar_clase(evento["paciente"]))
+    elif tipo == "paciente_modificado":
+        reg.obtener_paciente(evento["cedula"]).editar_datos(evento["nombre"], evento["apellido"])
+    elif tipo == "paciente_eliminado":
+        reg.eliminar_paciente(evento["cedula"])
+    elif tipo == "evolucion_agregada":
+        reg.obtener_paciente(evento["cedula"]).agregar_evolucion(evolucion.importar_clase(evento["evolucion"]))
+    elif tipo == "evolucion_modificada":
+        p = reg.obtener_paciente(evento["cedula"])
+        nueva = evolucion.importar_clase(evento["evolucion"])
+        ev = p.editar_evolucion(_indice_por_fecha(p, evento["fecha_anterior"]),
+                                nueva.fecha, nueva.hora, nueva.contenido)
+        ev.retraso = nueva.retraso
+    elif tipo == "evolucion_eliminada":
+        p = reg.obtener_paciente(evento["cedula"])
+        p.eliminar_evolucion(_indice_por_fecha(p, evento["fecha"]))
+    elif tipo == "strike_agregado":
+        strike = evento["strike"]
+        reg.agregar_strike(strike["razon"], strike["fecha"], strike.get("cedula"))
+    else:
+        raise ValueError(f"Tipo de evento desconocido: {tipo}")
+
+
+class almacen_json:
+    """
+    Almacén de un registro en un snapshot JSON más un diario de cambios.
+
+    Attributes:
+        archivo (str): Ruta del snapshot (el diario es archivo + ".diario")
+        sincronizar_cada (int): Entradas escritas entre cada fsync
+        intervalo_sincronizacion (float): Segundos máximos sin fsync
+        max_entradas_diario (int): Entradas tras las que compactar_si_hace_falta()
+            compacta (0 para compactar solo a pedido)
+        secuencia (int): Número de la última entrada escrita
+    """
+    def __init__(self, archivo="datos.json", sincronizar_cada=20, intervalo_sincronizacion=1.0,
+                 max_entradas_diario=1000):
+        """Inicializa el almacén (no abre archivos hasta recuperar())."""
+        self.archivo = archivo
+        self.archivo_diario = f"{archivo}.diario"
+        self.sincronizar_cada = sincronizar_cada
+        self.intervalo_sincronizacion = intervalo_sincronizacion
+        self.max_entradas_diario = max_entradas_diario
+        self.secuencia = 0
+        self.reg = None
+        self._diario = None
+        self._entradas_diario = 0
+        self._sin_sincronizar = 0
+        self._ultima_sincronizacion = time.monotonic()
+        self._compactar_pendiente = False
+        # Protege el archivo del diario (escrituras, fsync y reemplazo)
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def recuperar(self):
+        """
+        Carga el snapshot, reaplica el diario y empieza a registrar los
+        cambios del registro recuperado.
+
+        Returns:
+            registro: Registro recuperado
+        """
+        self.cerrar()
+        datos = {}
+        if os.path.exists(self.archivo):
+            with open(self.archivo, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        reg = registro.importar_clase(datos)
+        self.secuencia = datos.get("secuencia", 0)
+        if "grafo_similitud" in datos:
+            # Vincularlo antes de reaplicar el diario para que lo actualice
+            from grafo_similitud import grafo_similitud
+            grafo = grafo_similitud.importar(datos["grafo_similitud"])
+            grafo.vincular(reg, reconstruir=False)
+            reg.grafo_similitud = grafo
+        if "indice_lsh" in datos:
+            from similitud_lsh import indice_lsh
+            indice = indice_lsh.importar(datos["indice_lsh"])
+            indice.vincular(reg, reconstruir=False)
+            reg.indice_lsh = indice
+
+        self._entradas_diario = 0
+        if os.path.exists(self.archivo_diario):
+            posicion_valida = 0
+            with open(self.archivo_diario, "rb") as f:
+                for linea in f:
+                    try:
+                        if not linea.endswith(b"\n"):
+                            raise ValueError("línea incompleta")
+                        entrada = json.loads(linea.decode("utf-8"))
+                    except ValueError:
+                        # Última línea incompleta por un corte durante la escritura
+                        break
+                    posicion_valida += len(linea)
+                    self._entradas_diario += 1
+                    if entrada["seq"] <= self.secuencia:
+                        # Ya incluida en el snapshot
+                        continue
+                    aplicar_evento(reg, entrada)
+                    self.secuencia = entrada["seq"]
+            # Descartar el resto incompleto para que las nuevas entradas queden legibles
+            with open(self.archivo_diario, "r+b") as f:
+                f.truncate(posicion_valida)
+        reg.cambios.limpiar()
+        self.vincular(reg, compactar=False)
+        return reg
+
+    def vincular(self, reg: registro, compactar=True):
+        """
+        Empieza a registrar en el diario los cambios de reg.
+
+        Args:
+            reg (registro): Registro a seguir
+            compactar (bool): Escribir primero un snapshot de reg (necesario
+                si reg no proviene de recuperar())
+        """
+        if self.reg is not None:
+            self.reg.cambios.desuscribir(self._agregar)
+        self.reg = reg
+        if compactar:
+            self.compactar()
+        elif self._diario is None:
+            self._diario = open(self.archivo_diario, "a", encoding="utf-8")
+        reg.cambios.suscribir(self._agregar)
+        self._iniciar_sincronizador()
+
+    def _iniciar_sincronizador(self):
+        """Arranca el hilo que sincroniza el diario cada intervalo_sincronizacion."""
+        if self._hilo is not None or not self.intervalo_sincronizacion:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._sincronizar_periodicamente, daemon=True,
+                                      name="sincronizador-diario")
+        self._hilo.start()
+
+    def _sincronizar_periodicamente(self):
+        """Cuerpo del hilo: acota la ventana de pérdida con un diario inactivo."""
+        while not self._detener.wait(self.intervalo_sincronizacion):
+            self.sincronizar()
+
+    def _agregar(self, evento):
+        """Agrega un evento al diario (oyente de control_cambios)."""
+        with self._lock:
+            self.secuencia += 1
+            entrada = {"seq": self.secuencia}
+            entrada.update(evento)
+            self._diario.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self._diario.flush()
+            self._entradas_diario += 1
+            self._sin_sincronizar += 1
+            if (self._sin_sincronizar >= self.sincronizar_cada
+                    or time.monotonic() - self._ultima_sincronizacion >= self.intervalo_sincronizacion):
+                self._sincronizar()
+        # No se compacta aquí: el oyente corre con el lock de reg.cambios
+        # tomado y compactar recorre y escribe todo el registro
+        if self.max_entradas_diario and self._entradas_diario >= self.max_entradas_diario:
+            self._compactar_pendiente = True
+
+    def compactar_si_hace_falta(self):
+        """
+        Compacta si el diario llegó a max_entradas_diario entradas.
+
+        Se llama entre operaciones (p. ej. el menú después de cada opción),
+        cuando no hay un cambio del registro a medio aplicar.
+
+        Returns:
+            bool: True si compactó
+        """
+        if not self._compactar_pendiente:
+            return False
+        self.compactar()
+        return True
+
+    def sincronizar(self):
+        """Fuerza a disco (fsync) las entradas escritas en el diario."""
+        with self._lock:
+            self._sincronizar()
+
+    def _sincronizar(self):
+        """sincronizar() con self._lock ya tomado."""
+        if self._diario is not None and self._sin_sincronizar:
+            os.fsync(self._diario.fileno())
+        self._sin_sincronizar = 0
+        self._ultima_sincronizacion = time.monotonic()
+
+    def compactar(self):
+        """
+        Escribe el registro completo en el snapshot y vacía el diario.
+
+        El snapshot guarda la secuencia de la última entrada que incluye,
+        así si el proceso se corta antes de vaciar el diario esas entradas
+        no se reaplican dos veces. Si el registro tiene grafo de similitud
+        o índice LSH se guardan también, para no recalcularlos al recuperar.
+        """
+        datos = self.reg.exportar_clase()
+        datos["secuencia"] = self.secuencia
+        if self.reg.grafo_similitud is not None:
+            datos["grafo_similitud"] = self.reg.grafo_similitud.exportar()
+        if self.reg.indice_lsh is not None:
+            datos["indice_lsh"] = self.reg.indice_lsh.exportar()
+        escribir_snapshot(datos, self.archivo)
+        with self._lock:
+            if self._diario is not None:
+                self._diario.close()
+            self._diario = open(self.archivo_diario, "w", encoding="utf-8")
+            self._entradas_diario = 0
+            self._sin_sincronizar = 0
+            self._compactar_pendiente = False
+
+    def cerrar(self):
+        """Detiene el hilo de sincronización, sincroniza y cierra el diario."""
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            self._hilo = None
+        with self._lock:
+            if self._diario is not None:
+                self._sincronizar()
+                self._diario.close()
+                self._diario = None
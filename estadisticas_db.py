@@ -0,0 +1,147 @@
+"""
+Estadísticas calculadas directamente en la base de datos.
+
+Reemplazan el recorrido en Python de todas las evoluciones por consultas
+agregadas (COUNT y SUM), con las mismas claves que
+analisis.obtener_estadisticas_generales. Al cargar el directorio de
+pacientes, los totales del registro se suman de obtener_directorio_db (la
+misma consulta que trae el directorio), así las rutas no recorren las
+evoluciones.
+
+comparar_con_memoria() verifica que coincidan con el cálculo en memoria
+(lo ejecutan las pruebas de tests/test_estadisticas_db.py).
+"""
+
+from sqlalchemy import select, func
+from modelos_db import PacienteDB, EvolucionDB, StrikeDB, obtener_sesion
+
+
+def _suma_retraso(campo):
+    """SUM del campo campo del JSON retraso (0 si no hay filas)."""
+    return func.coalesce(func.sum(EvolucionDB.retraso[campo].as_integer()), 0)
+
+
+def obtener_estadisticas_db():
+    """
+    Retorna estadísticas generales del sistema con una sola consulta.
+
+    Returns:
+        dict con las mismas claves que analisis.obtener_estadisticas_generales
+    """
+    session = obtener_sesion()
+
+    try:
+        consulta = select(
+            select(func.count()).select_from(PacienteDB).scalar_subquery(),
+            select(func.count()).select_from(StrikeDB).scalar_subquery(),
+            func.count(EvolucionDB.id),
+            _suma_retraso("dias"),
+            _suma_retraso("horas"),
+            _suma_retraso("minutos")
+        ).select_from(EvolucionDB)
+        (total_pacientes, total_strikes, total_evoluciones,
+         total_dias, total_horas, total_minutos) = session.execute(consulta).one()
+    finally:
+        session.close()
+
+    # Los promedios se calculan igual que en memoria para obtener el mismo redondeo
+    if total_evoluciones > 0:
+        promedio_dias = round(total_dias / total_evoluciones, 2)
+        promedio_horas = round(total_horas / total_evoluciones, 2)
+        promedio_minutos = round(total_minutos / total_evoluciones, 2)
+    else:
+        promedio_dias = promedio_horas = promedio_minutos = 0
+
+    return {
+        "Total Pacientes": total_pacientes,
+        "Total Evoluciones": total_evoluciones,
+        "Total Strikes": total_strikes,
+        "Promedio Retraso (días)": promedio_dias,
+        "Promedio Retraso (horas)": promedio_horas,
+        "Promedio Retraso (minutos)": promedio_minutos
+    }
+
+
+def obtener_directorio_db(session=None):
+    """
+    Pacientes con su cantidad de evoluciones y sus totales de retraso, en
+    una sola consulta (pacientes LEFT JOIN evoluciones agrupado por cédula).
+
+    Sumando las filas se obtienen los argumentos de
+    agregados_registro.inicializar() (salvo los strikes).
+
+    Args:
+        session: Sesión a usar (si es None se abre y se cierra una)
+
+    Returns:
+        list: Un dict por paciente con cedula, nombre, apellido,
+              evoluciones, retraso_dias, retraso_horas, retraso_minutos,
+              retraso_total_minutos y tarde
+    """
+    propia = session is None
+    if propia:
+        session = obtener_sesion()
+
+    try:
+        componentes = [func.coalesce(EvolucionDB.retraso[campo].as_integer(), 0)
+                       for campo in ("dias", "horas", "minutos")]
+        total_minutos = componentes[0] * 1440 + componentes[1] * 60 + componentes[2]
+        filas = session.execute(
+            select(
+                PacienteDB.cedula,
+                PacienteDB.nombre,
+                PacienteDB.apellido,
+                func.count(EvolucionDB.id).label("evoluciones"),
+                func.coalesce(func.sum(componentes[0]), 0).label("retraso_dias"),
+                func.coalesce(func.sum(componentes[1]), 0).label("retraso_horas"),
+                func.coalesce(func.sum(componentes[2]), 0).label("retraso_minutos"),
+                func.coalesce(func.sum(total_minutos), 0).label("retraso_total_minutos"),
+                func.count(EvolucionDB.id).filter(total_minutos > 0).label("tarde")
+            )
+            .outerjoin(EvolucionDB, EvolucionDB.cedula_paciente == PacienteDB.cedula)
+            .group_by(PacienteDB.cedula, PacienteDB.nombre, PacienteDB.apellido)
+        ).mappings().all()
+    finally:
+        if propia:
+            session.close()
+
+    return [dict(fila) for fila in filas]
+
+
+def comparar_con_memoria(reg=None):
+    """
+    Verifica que las estadísticas de la base de datos coincidan con las
+    calculadas en memoria.
+
+    Compara obtener_estadisticas_db() con el recorrido completo de las
+    evoluciones (analisis.obtener_estadisticas_generales sin agregados ni
+    columnas) y con los totales que el registro mantiene (agregados). El
+    registro debe estar guardado: los cambios pendientes aparecen como
+    diferencias.
+
+    Args:
+        reg (registro): Registro a comparar (por defecto se carga completo
+            desde la base de datos)
+
+    Returns:
+        dict: {(origen, clave): (valor_bd, valor_origen)} de las claves que
+              difieren, con origen "recorrido" o "agregados" (vacío si
+              todo coincide)
+    """
+    from analisis import obtener_estadisticas_generales
+    if reg is None:
+        from persistencia_db import cargar_registro_db
+        reg = cargar_registro_db()
+
+    en_bd = obtener_estadisticas_db()
+    calculadas = {
+        "recorrido": obtener_estadisticas_generales(reg, usar_columnas=False, usar_agregados=False),
+        "agregados": obtener_estadisticas_generales(reg),
+    }
+    return {
+        (origen, clave): (en_bd.get(clave), valor)
+        for origen, estadisticas in calculadas.items()
+        for clave, valor in estadisticas.items()
+        if en_bd.get(clave) != valor
+    }
+
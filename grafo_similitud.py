@@ -0,0 +1,350 @@
+"""
+Grafo de similitud entre evoluciones, mantenido de forma incremental.
+
+Para cada evolución guarda sus k evoluciones más parecidas del mismo
+paciente y de otros pacientes (solo las que alcanzan umbral_minimo). Se
+actualiza con los eventos de reg.cambios, así que los reportes de
+similitudes de un paciente y del sistema se resuelven consultando el grafo
+en lugar de comparar todos los pares otra vez.
+
+Los vecinos de otros pacientes de una evolución se calculan la primera
+vez que se piden (con el índice LSH) y desde ahí se mantienen.
+"""
+
+import threading
+from collections import Counter
+from datetime import date
+from indice_evoluciones import indice_contenido, _fecha_iso
+
+_lock_creacion = threading.Lock()
+
+AMBITOS = ("paciente", "global")
+
+
+class grafo_similitud(indice_contenido):
+    """
+    Vecinos más similares (top-k) de cada evolución.
+
+    Las similitudes entre evoluciones del mismo paciente se calculan con la
+    más antigua (la que aparece primero en paciente.evoluciones) como
+    primer texto, igual que analisis.encontrar_similitudes_paciente.
+
+    Attributes:
+        k (int): Vecinos guardados por evolución y ámbito
+        umbral_minimo (float): Similitud mínima para guardar un vecino
+    """
+    def __init__(self, k=5, umbral_minimo=0.80):
+        """
+        Inicializa un grafo vacío.
+
+        Args:
+            k (int): Vecinos guardados por evolución y ámbito
+            umbral_minimo (float): Similitud mínima para guardar un vecino
+        """
+        super().__init__()
+        self.k = k
+        self.umbral_minimo = umbral_minimo
+        # clave -> {"paciente": [(similitud, clave)], "global": [...] o None}
+        self._vecinos = {}
+        # clave -> {(clave que la lista como vecina, ámbito)}
+        self._referencias = {}
+        # Claves con la lista "global" ya calculada
+        self._con_global = set()
+
+    def __len__(self):
+        return len(self._vecinos)
+
+    def vincular(self, reg, reconstruir=True):
+        """
+        Sigue los cambios de reg.
+
+        Args:
+            reg (registro): Registro a seguir
+            reconstruir (bool): Calcular el grafo desde cero. Si es False (grafo
+                importado) solo se reconstruye si no coincide con las
+                evoluciones de reg
+        """
+        if not reconstruir:
+            claves = {(cedula, ev.fecha.isoformat())
+                      for cedula, evoluciones in reg.recorrer_por_paciente() for ev in evoluciones}
+            reconstruir = claves != set(self._vecinos)
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            reg.cambios.suscribir(self.aplicar_evento)
+            if reconstruir:
+                self._vecinos.clear()
+                self._referencias.clear()
+                self._con_global.clear()
+                for cedula, evoluciones in reg.recorrer_por_paciente():
+                    self._agregar_paciente(cedula, evoluciones)
+
+    def _agregar_paciente(self, cedula, evoluciones):
+        """
+        Agrega las evoluciones de un paciente comparando cada par una vez.
+
+        Trabaja sobre la lista recibida (no busca en el registro), así al
+        reconstruir no se carga cada paciente de un registro_perezoso.
+        """
+        claves = [(cedula, ev.fecha.isoformat()) for ev in evoluciones]
+        for clave in claves:
+            self._vecinos[clave] = {"paciente": [], "global": None}
+        for i, ev in enumerate(evoluciones):
+            for j in range(i + 1, len(evoluciones)):
+                similitud = self._similitud(ev, evoluciones[j])
+                if similitud is not None:
+                    self._insertar(claves[i], "paciente", similitud, claves[j])
+                    self._insertar(claves[j], "paciente", similitud, claves[i])
+
+    def _buscar(self, cedula, fecha_iso):
+        """Retorna (paciente, posición, evolución) o None si ya no existe."""
+        p = self.reg.obtener_paciente(cedula)
+        if p is None:
+            return None
+        i = p.posicion_de_fecha(date.fromisoformat(fecha_iso))
+        if i is None:
+            return None
+        return p, i, p.evoluciones[i]
+
+    def _similitud(self, ev1, ev2):
+        """Similitud de ev1 (primer texto) con ev2, o None si no alcanza umbral_minimo."""
+        from analisis import _similitud_si_supera
+        texto = ev1.contenido_normalizado
+        similitud = _similitud_si_supera(texto, Counter(texto), ev1.hash_contenido,
+                                         ev2.contenido_normalizado, ev2.hash_contenido, self.umbral_minimo)
+        if similitud is None or similitud < self.umbral_minimo:
+            return None
+        return similitud
+
+    def _vecinos_paciente(self, p, posicion, ev):
+        """Similitudes de ev con las demás evoluciones de su paciente."""
+        resultado = []
+        for j, otra in enumerate(p.evoluciones):
+            if j == posicion:
+                continue
+            similitud = self._similitud(otra, ev) if j < posicion else self._similitud(ev, otra)
+            if similitud is not None:
+                resultado.append((similitud, (p.cedula, otra.fecha.isoformat())))
+        return resultado
+
+    def _vecinos_globales(self, cedula, ev):
+        """Similitudes de ev con las candidatas LSH de otros pacientes."""
+        from similitud_lsh import obtener_indice
+        indice = obtener_indice(self.reg)
+        resultado = []
+        for otro, otra in indice.resolver(indice.candidatos(ev.contenido, cedula)):
+            similitud = self._similitud(ev, otra)
+            if similitud is not None:
+                resultado.append((similitud, (otro.cedula, otra.fecha.isoformat())))
+        return resultado
+
+    def _insertar(self, clave, ambito, similitud, otra):
+        """Pone otra en la lista de clave, ordenada y recortada a k."""
+        lista = self._vecinos[clave][ambito]
+        lista[:] = [v for v in lista if v[1] != otra]
+        lista.append((similitud, otra))
+        lista.sort(key=lambda v: (-v[0], v[1]))
+        self._referencias.setdefault(otra, set()).add((clave, ambito))
+        for _, descartada in lista[self.k:]:
+            self._referencias.get(descartada, set()).discard((clave, ambito))
+        del lista[self.k:]
+
+    def agregar(self, cedula, fecha, contenido, normalizado=False):
+        """Agrega la evolución del paciente en esa fecha y actualiza a sus vecinas."""
+        clave = (cedula, _fecha_iso(fecha))
+        with self._lock:
+            self._quitar_clave(clave)
+            encontrada = self._buscar(*clave)
+            if encontrada is None:
+                return
+            p, posicion, ev = encontrada
+            self._vecinos[clave] = {"paciente": [], "global": None}
+            for similitud, otra in self._vecinos_paciente(p, posicion, ev):
+                self._insertar(clave, "paciente", similitud, otra)
+                if otra in self._vecinos:
+                    self._insertar(otra, "paciente", similitud, clave)
+            # Solo se avisa a las vecinas globales que ya tienen su lista calculada
+            if not self._con_global:
+                return
+            for similitud, otra in self._vecinos_globales(cedula, ev):
+                if otra in self._con_global:
+                    self._insertar(otra, "global", similitud, clave)
+
+    def quitar(self, cedula, fecha):
+        """Quita la evolución y recalcula las listas que quedaron incompletas."""
+        with self._lock:
+            for otra, ambito in self._quitar_clave((cedula, _fecha_iso(fecha))):
+                self._rellenar(otra, ambito)
+
+    def quitar_paciente(self, cedula):
+        """Quita todas las evoluciones de un paciente."""
+        with self._lock:
+            for clave in [c for c in self._vecinos if c[0] == cedula]:
+                self.quitar(*clave)
+
+    def _quitar_clave(self, clave):
+        """
+        Quita un nodo y sus apariciones en otras listas.
+
+        Returns:
+            list: (clave, ámbito) de las listas que estaban llenas y perdieron
+                  un vecino (puede faltarles uno que había quedado afuera)
+        """
+        nodo = self._vecinos.pop(clave, None)
+        if nodo is None:
+            return []
+        self._con_global.discard(clave)
+        for ambito in AMBITOS:
+            for _, otra in nodo[ambito] or []:
+                self._referencias.get(otra, set()).discard((clave, ambito))
+        incompletas = []
+        for otra, ambito in self._referencias.pop(clave, set()):
+            lista = self._vecinos.get(otra, {}).get(ambito)
+            if lista is None:
+                continue
+            if len(lista) >= self.k:
+                incompletas.append((otra, ambito))
+            lista[:] = [v for v in lista if v[1] != clave]
+        return incompletas
+
+    def _rellenar(self, clave, ambito):
+        """Recalcula desde cero la lista de un ámbito de una evolución."""
+        encontrada = self._buscar(*clave)
+        if encontrada is None or clave not in self._vecinos:
+            return
+        p, posicion, ev = encontrada
+        for _, otra in self._vecinos[clave][ambito] or []:
+            self._referencias.get(otra, set()).discard((clave, ambito))
+        self._vecinos[clave][ambito] = []
+        if ambito == "paciente":
+            vecinos = self._vecinos_paciente(p, posicion, ev)
+        else:
+            vecinos = self._vecinos_globales(p.cedula, ev)
+            self._con_global.add(clave)
+        for similitud, otra in vecinos:
+            self._insertar(clave, ambito, similitud, otra)
+
+    def vecinos(self, cedula, fecha, ambito="paciente"):
+        """
+        Evoluciones más similares a la del paciente en esa fecha.
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución
+            ambito (str): "paciente" (mismo paciente) o "global" (otros pacientes)
+
+        Returns:
+            list: Hasta k tuplas (similitud, (cedula, fecha ISO)), de mayor a
+                  menor similitud; vacía si la evolución no está en el grafo
+        """
+        clave = (cedula, _fecha_iso(fecha))
+        with self._lock:
+            nodo = self._vecinos.get(clave)
+            if nodo is None:
+                return []
+            if nodo[ambito] is None:
+                self._rellenar(clave, ambito)
+            return list(nodo[ambito])
+
+    def pares_paciente(self, cedula, umbral):
+        """
+        Pares similares de un paciente, leídos del grafo.
+
+        Args:
+            cedula (int): Cédula del paciente
+            umbral (float): Similitud mínima (0-1)
+
+        Returns:
+            list: Tuplas (fecha 1, fecha 2, similitud en %) en el mismo orden
+                  que analisis.encontrar_similitudes_paciente, o None si el
+                  grafo no alcanza para responder (umbral menor que
+                  umbral_minimo, o alguna lista llena que pudo dejar afuera
+                  un par sobre el umbral)
+        """
+        if umbral < self.umbral_minimo:
+            return None
+        with self._lock:
+            p = self.reg.obtener_paciente(cedula)
+            if p is None:
+                return []
+            posiciones = {ev.fecha.isoformat(): i for i, ev in enumerate(p.evoluciones)}
+            pares = {}
+            for fecha_iso, i in posiciones.items():
+                nodo = self._vecinos.get((cedula, fecha_iso))
+                if nodo is None:
+                    return None
+                lista = nodo["paciente"]
+                if len(lista) >= self.k and lista[-1][0] >= umbral:
+                    return None
+                for similitud, (_, otra_fecha) in lista:
+                    j = posiciones.get(otra_fecha)
+                    if j is not None and similitud >= umbral:
+                        pares[(min(i, j), max(i, j))] = similitud
+        evoluciones = p.evoluciones
+        return [(evoluciones[i].fecha, evoluciones[j].fecha, round(similitud * 100, 2))
+                for (i, j), similitud in sorted(pares.items())]
+
+    def exportar(self):
+        """
+        Convierte el grafo a un dict serializable en JSON.
+
+        Returns:
+            dict: Parámetros y nodos del grafo
+        """
+        with self._lock:
+            nodos = []
+            for (cedula, fecha), nodo in self._vecinos.items():
+                nodos.append({
+                    "cedula": cedula,
+                    "fecha": fecha,
+                    **{ambito: None if nodo[ambito] is None else
+                       [[similitud, otra[0], otra[1]] for similitud, otra in nodo[ambito]]
+                       for ambito in AMBITOS}
+                })
+        return {"k": self.k, "umbral_minimo": self.umbral_minimo, "nodos": nodos}
+
+    @classmethod
+    def importar(cls, datos):
+        """
+        Crea un grafo desde exportar() (sin registro vinculado).
+
+        Args:
+            datos (dict): Datos exportados
+
+        Returns:
+            grafo_similitud: Grafo para vincular con vincular(reg, reconstruir=False)
+        """
+        grafo = cls(datos["k"], datos["umbral_minimo"])
+        for nodo in datos["nodos"]:
+            clave = (nodo["cedula"], nodo["fecha"])
+            grafo._vecinos[clave] = {}
+            for ambito in AMBITOS:
+                if nodo[ambito] is None:
+                    grafo._vecinos[clave][ambito] = None
+                    continue
+                lista = [(similitud, (cedula, fecha)) for similitud, cedula, fecha in nodo[ambito]]
+                grafo._vecinos[clave][ambito] = lista
+                if ambito == "global":
+                    grafo._con_global.add(clave)
+                for _, otra in lista:
+                    grafo._referencias.setdefault(otra, set()).add((clave, ambito))
+        return grafo
+
+
+def obtener_grafo(reg):
+    """
+    Retorna el grafo de similitud del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        grafo_similitud: Grafo vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.grafo_similitud is None:
+            grafo = grafo_similitud()
+            grafo.vincular(reg)
+            reg.grafo_similitud = grafo
+        return reg.grafo_similitud
@@ -0,0 +1,159 @@
+"""
+Base de los índices que se mantienen al día con los eventos de un registro.
+
+Los índices de similitud (similitud_lsh, similitud_coseno,
+grafo_similitud), el almacén columnar y los índices secundarios
+(indices_registro) se vinculan a un registro, lo recorren una vez y desde
+ahí aplican cada evento de reg.cambios.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from datetime import date
+
+
+class indice_evoluciones(ABC):
+    """
+    Base de los índices que siguen a un registro con sus eventos.
+
+    Identifica cada evolución por (cedula, fecha), que es única porque un
+    paciente tiene a lo sumo una evolución por día. Las subclases
+    implementan lo que el registro llama: agregar_evolucion() al vincular,
+    agregar_exportada() con los eventos, quitar() y quitar_paciente() (una
+    subclase que no los implementa no se puede instanciar).
+    """
+    def __init__(self):
+        """Inicializa un índice sin registro vinculado."""
+        self._lock = threading.RLock()
+        self.reg = None
+
+    @abstractmethod
+    def agregar_evolucion(self, cedula, ev):
+        """
+        Agrega una evolución del registro (al vincular).
+
+        Args:
+            cedula (int): Cédula del paciente
+            ev (evolucion): Evolución del registro
+        """
+
+    @abstractmethod
+    def agregar_exportada(self, cedula, datos):
+        """
+        Agrega (o reemplaza) una evolución recibida en un evento.
+
+        Args:
+            cedula (int): Cédula del paciente
+            datos (dict): Evolución como la da evolucion.exportar_clase()
+        """
+
+    @abstractmethod
+    def quitar(self, cedula, fecha):
+        """
+        Quita la evolución del paciente en esa fecha (si está).
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución (date o ISO)
+        """
+
+    @abstractmethod
+    def quitar_paciente(self, cedula):
+        """
+        Quita todas las evoluciones de un paciente.
+
+        Args:
+            cedula (int): Cédula del paciente
+        """
+
+    def vincular(self, reg):
+        """
+        Indexa todas las evoluciones de reg y lo sigue con sus eventos.
+
+        Args:
+            reg (registro): Registro a indexar
+        """
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            # Suscribirse antes de recorrer: un cambio concurrente se aplica
+            # dos veces como mucho, y agregar/quitar son idempotentes
+            reg.cambios.suscribir(self.aplicar_evento)
+            for cedula, evoluciones in reg.recorrer_por_paciente():
+                for ev in evoluciones:
+                    self.agregar_evolucion(cedula, ev)
+
+    def aplicar_evento(self, evento):
+        """Actualiza el índice con un evento de control_cambios."""
+        tipo = evento["tipo"]
+        if tipo == "evolucion_agregada":
+            self.agregar_exportada(evento["cedula"], evento["evolucion"])
+        elif tipo == "evolucion_modificada":
+            with self._lock:
+                self.quitar(evento["cedula"], evento["fecha_anterior"])
+                self.agregar_exportada(evento["cedula"], evento["evolucion"])
+        elif tipo == "evolucion_eliminada":
+            self.quitar(evento["cedula"], evento["fecha"])
+        elif tipo == "paciente_agregado":
+            datos = evento["paciente"]
+            for ev in datos.get("evoluciones", []):
+                self.agregar_exportada(datos["cedula"], ev)
+        elif tipo == "paciente_eliminado":
+            self.quitar_paciente(evento["cedula"])
+
+    def resolver(self, claves):
+        """
+        Convierte claves (cedula, fecha ISO) en objetos del registro vinculado.
+
+        Returns:
+            list: Tuplas (paciente, evolucion); se omiten las que ya no existen
+        """
+        por_paciente = {}
+        for cedula, fecha in claves:
+            por_paciente.setdefault(cedula, set()).add(fecha)
+        resultado = []
+        for cedula, fechas in por_paciente.items():
+            p = self.reg.obtener_paciente(cedula)
+            if p is None:
+                continue
+            for ev in p.evoluciones:
+                if ev.fecha.isoformat() in fechas:
+                    resultado.append((p, ev))
+        return resultado
+
+
+class indice_contenido(indice_evoluciones):
+    """
+    Base de los índices que solo guardan el contenido de cada evolución
+    (similitud LSH, coseno y grafo de similitud).
+
+    Las subclases implementan agregar(); agregar_evolucion() y
+    agregar_exportada() le pasan el contenido.
+    """
+    @abstractmethod
+    def agregar(self, cedula, fecha, contenido, normalizado=False):
+        """
+        Agrega (o reemplaza) la evolución del paciente en esa fecha.
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución (date o ISO)
+            contenido (str): Contenido de la evolución
+            normalizado (bool): contenido ya pasó por normalizar_texto
+        """
+
+    def agregar_evolucion(self, cedula, ev):
+        """Agrega una evolución del registro (al vincular)."""
+        self.agregar(cedula, ev.fecha, ev.contenido_normalizado, normalizado=True)
+
+    def agregar_exportada(self, cedula, datos):
+        """Agrega una evolución recibida en un evento (dict de exportar_clase)."""
+        self.agregar(cedula, datos["fecha"], datos["contenido"])
+
+
+def _fecha_iso(fecha):
+    """Fecha como texto ISO (acepta date o str)."""
+    if isinstance(fecha, date):
+        return fecha.isoformat()
+    return fecha
@@ -0,0 +1,296 @@
+"""
+Índices secundarios del registro.
+
+El registro solo busca pacientes por cédula (un dict). Estos índices
+evitan recorrer todo para las otras consultas frecuentes:
+
+    indice_nombres  pacientes por prefijo de nombre o apellido (normalizado)
+    indice_fechas   evoluciones de cada fecha y conjunto de evoluciones tarde
+
+Se crean en el primer uso (obtener_indice_nombres, obtener_indice_fechas)
+y se mantienen al día con los eventos de reg.cambios, igual que los
+índices de similitud. indice_nombres no toca las evoluciones, así que
+con un registro_perezoso no obliga a cargarlas.
+"""
+
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import date
+from modelos import _minutos_retraso
+from indice_evoluciones import indice_evoluciones
+
+_lock_creacion = threading.Lock()
+
+
+def normalizar_nombre(texto):
+    """Texto en minúsculas, sin tildes y con los espacios colapsados."""
+    descompuesto = unicodedata.normalize("NFKD", str(texto))
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+class indice_nombres:
+    """
+    Pacientes ordenados por nombre normalizado, para buscar por prefijo.
+
+    Cada paciente aparece con tres claves: su nombre, su apellido y
+    "nombre apellido". Las claves (clave, cédula) se guardan en una lista
+    ordenada; un prefijo ocupa un tramo contiguo de esa lista, que se ubica
+    con bisect.
+
+    Complejidad (n claves, k resultados): buscar() O(log n + k);
+    agregar/quitar un paciente O(n) por el corrimiento de la lista (un
+    memmove, rápido en la práctica).
+    """
+    def __init__(self):
+        """Inicializa un índice vacío sin registro vinculado."""
+        self._lock = threading.RLock()
+        self.reg = None
+        self._claves = []
+        self._claves_por_cedula = {}
+
+    def __len__(self):
+        return len(self._claves_por_cedula)
+
+    def agregar(self, cedula, nombre, apellido):
+        """Indexa (o reindexa) un paciente con ese nombre y apellido."""
+        nombre = normalizar_nombre(nombre)
+        apellido = normalizar_nombre(apellido)
+        claves = {(nombre, cedula), (apellido, cedula), (f"{nombre} {apellido}", cedula)}
+        with self._lock:
+            self.quitar(cedula)
+            for clave in claves:
+                insort(self._claves, clave)
+            self._claves_por_cedula[cedula] = claves
+
+    def quitar(self, cedula):
+        """Quita un paciente del índice (si está)."""
+        with self._lock:
+            for clave in self._claves_por_cedula.pop(cedula, ()):
+                posicion = bisect_left(self._claves, clave)
+                if posicion < len(self._claves) and self._claves[posicion] == clave:
+                    del self._claves[posicion]
+
+    def cedulas(self, prefijo):
+        """
+        Cédulas de los pacientes con nombre, apellido o nombre completo que
+        empieza con prefijo (sin distinguir mayúsculas ni tildes).
+
+        Returns:
+            list: Cédulas en orden alfabético de la clave que coincidió
+        """
+        prefijo = normalizar_nombre(prefijo)
+        encontradas = {}
+        with self._lock:
+            posicion = bisect_left(self._claves, (prefijo,))
+            while posicion < len(self._claves) and self._claves[posicion][0].startswith(prefijo):
+                encontradas.setdefault(self._claves[posicion][1], None)
+                posicion += 1
+        return list(encontradas)
+
+    def buscar(self, prefijo):
+        """
+        Pacientes cuyo nombre o apellido empieza con prefijo.
+
+        Returns:
+            list: Objetos paciente del registro vinculado
+        """
+        pacientes = (self.reg.obtener_paciente(cedula) for cedula in self.cedulas(prefijo))
+        return [p for p in pacientes if p is not None]
+
+    def vincular(self, reg):
+        """
+        Indexa los pacientes de reg y lo sigue con sus eventos.
+
+        Args:
+            reg (registro): Registro a indexar
+        """
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            reg.cambios.suscribir(self.aplicar_evento)
+            claves = []
+            self._claves_por_cedula = {}
+            for p in list(reg.pacientes.values()):
+                nombre = normalizar_nombre(p.nombre)
+                apellido = normalizar_nombre(p.apellido)
+                propias = {(nombre, p.cedula), (apellido, p.cedula), (f"{nombre} {apellido}", p.cedula)}
+                claves.extend(propias)
+                self._claves_por_cedula[p.cedula] = propias
+            claves.sort()
+            self._claves = claves
+
+    def aplicar_evento(self, evento):
+        """Actualiza el índice con un evento de control_cambios."""
+        tipo = evento["tipo"]
+        if tipo == "paciente_agregado":
+            datos = evento["paciente"]
+            self.agregar(datos["cedula"], datos["nombre"], datos["apellido"])
+        elif tipo == "paciente_modificado":
+            self.agregar(evento["cedula"], evento["nombre"], evento["apellido"])
+        elif tipo == "paciente_eliminado":
+            self.quitar(evento["cedula"])
+
+
+class indice_fechas(indice_evoluciones):
+    """
+    Evoluciones agrupadas por fecha y conjunto de evoluciones tarde.
+
+    Guarda claves (cedula, ordinal de la fecha), que identifican una
+    evolución porque un paciente tiene a lo sumo una por día; los objetos
+    se obtienen del registro al consultar (paciente.evolucion_en_fecha,
+    O(1)).
+
+    Complejidad (k resultados): agregar/quitar una evolución O(1),
+    quitar un paciente O(evoluciones del paciente), cedulas_en_fecha()
+    y total_tarde() O(1) más la copia, evoluciones_en_fecha() y
+    evoluciones_tarde() O(k).
+    """
+    def __init__(self):
+        """Inicializa un índice vacío."""
+        super().__init__()
+        self._por_dia = {}
+        self._tarde = set()
+        self._dias_por_cedula = {}
+
+    def __len__(self):
+        return sum(len(cedulas) for cedulas in self._por_dia.values())
+
+    def agregar(self, cedula, fecha, tarde=False):
+        """
+        Agrega (o reemplaza) la evolución del paciente en esa fecha.
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución
+            tarde (bool): La evolución se subió con retraso
+        """
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha)
+        dia = fecha.toordinal()
+        with self._lock:
+            self._por_dia.setdefault(dia, set()).add(cedula)
+            self._dias_por_cedula.setdefault(cedula, set()).add(dia)
+            if tarde:
+                self._tarde.add((cedula, dia))
+            else:
+                self._tarde.discard((cedula, dia))
+
+    def agregar_evolucion(self, cedula, ev):
+        """Agrega una evolución del registro (al vincular)."""
+        self.agregar(cedula, ev.fecha, tarde=ev.es_tarde())
+
+    def agregar_exportada(self, cedula, datos):
+        """Agrega una evolución recibida en un evento (dict de exportar_clase)."""
+        self.agregar(cedula, datos["fecha"], tarde=_minutos_retraso(datos.get("retraso")) > 0)
+
+    def quitar(self, cedula, fecha):
+        """Quita la evolución del paciente en esa fecha (si está)."""
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha)
+        with self._lock:
+            self._quitar_clave(cedula, fecha.toordinal())
+
+    def quitar_paciente(self, cedula):
+        """Quita todas las evoluciones de un paciente."""
+        with self._lock:
+            for dia in list(self._dias_por_cedula.get(cedula, ())):
+                self._quitar_clave(cedula, dia)
+
+    def _quitar_clave(self, cedula, dia):
+        cedulas = self._por_dia.get(dia)
+        if cedulas is not None:
+            cedulas.discard(cedula)
+            if not cedulas:
+                del self._por_dia[dia]
+        dias = self._dias_por_cedula.get(cedula)
+        if dias is not None:
+            dias.discard(dia)
+            if not dias:
+                del self._dias_por_cedula[cedula]
+        self._tarde.discard((cedula, dia))
+
+    def _resolver(self, claves):
+        """(cedula, ordinal) -> (paciente, evolucion), omitiendo las que ya no existen."""
+        resultado = []
+        for cedula, dia in claves:
+            p = self.reg.obtener_paciente(cedula)
+            if p is None:
+                continue
+            ev = p.evolucion_en_fecha(date.fromordinal(dia))
+            if ev is not None:
+                resultado.append((p, ev))
+        return resultado
+
+    def cedulas_en_fecha(self, fecha):
+        """
+        Pacientes con evolución en esa fecha.
+
+        Returns:
+            set: Cédulas
+        """
+        with self._lock:
+            return set(self._por_dia.get(fecha.toordinal(), ()))
+
+    def evoluciones_en_fecha(self, fecha):
+        """
+        Evoluciones de todos los pacientes en esa fecha.
+
+        Returns:
+            list: Tuplas (paciente, evolucion)
+        """
+        dia = fecha.toordinal()
+        return self._resolver((cedula, dia) for cedula in sorted(self.cedulas_en_fecha(fecha)))
+
+    def total_tarde(self):
+        """Cantidad de evoluciones subidas con retraso."""
+        return len(self._tarde)
+
+    def evoluciones_tarde(self):
+        """
+        Evoluciones subidas con retraso, por fecha.
+
+        Returns:
+            list: Tuplas (paciente, evolucion)
+        """
+        with self._lock:
+            claves = sorted(self._tarde, key=lambda clave: (clave[1], clave[0]))
+        return self._resolver(claves)
+
+
+def obtener_indice_nombres(reg):
+    """
+    Retorna el índice de nombres del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        indice_nombres: Índice vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.indice_nombres is None:
+            indice = indice_nombres()
+            indice.vincular(reg)
+            reg.indice_nombres = indice
+        return reg.indice_nombres
+
+
+def obtener_indice_fechas(reg):
+    """
+    Retorna el índice de fechas del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        indice_fechas: Índice vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.indice_fechas is None:
+            indice = indice_fechas()
+            indice.vincular(reg)
+            reg.indice_fechas = indice
+        return reg.indice_fechas
@@ -1,11 +1,25 @@
 from modelos import evolucion, paciente, registro
-from archivos import guardar_json, cargar_json,exportar_a_excel 
+from archivos import exportar_a_excel 
 from utils import pedir_cedula, pedir_fecha, pedir_hora, pedir_contenido,pedir_apellido,pedir_nombre
 from logger import logger
 from analisis import obtener_estadisticas_generales, obtener_evoluciones_en_tabla,verificar_similitud_al_subir,verificar_similitud_global
 from analisis import obtener_retrasos_por_fecha, obtener_pacientes_con_mas_strikes, exportar_todos_reportes
+from diario_json import almacen_json
+from similitudes_guardadas import almacen_similitudes_json, usar_almacen
+import atexit
 
-reg = registro()
+# Cada operación se agrega al diario de datos.json al momento
+almacen = almacen_json("datos.json")
+# Similitudes ya calculadas por los reportes
+similitudes = almacen_similitudes_json("similitudes.json")
+try:
+    reg = almacen.recuperar()
+except Exception as e:
+    print(f"⚠️ No se pudo recuperar datos.json, iniciando vacío: {e}")
+    logger.error(f"Error al recuperar datos.json: {e}")
+    reg = registro()
+usar_almacen(reg, similitudes)
+atexit.register(almacen.cerrar)
 
 def menu():
     print("\n ----Menu Principal---")
@@ -60,11 +74,11 @@ def subir_evolucion():
             return
         
         print("⚠️ Strike agregado por similitud detectada\n")
-        reg.total_strikes += 1
-        reg.strikes.append({
-            "razon": f"Evolución similar ({porcentaje}% con fecha {ev_similar.fecha})",
-            "fecha": str(fecha)
-        })
+        reg.agregar_strike(
+            f"Evolución similar ({porcentaje}% con fecha {ev_similar.fecha})",
+            str(fecha),
+            cedula
+        )
         logger.warning(f"Strike agregado por similitud: {porcentaje}%")
     hay_similitud_global, porcentaje_global, paciente_similar, ev_similar_global = verificar_similitud_global(
     contenido,
@@ -87,11 +101,11 @@ def subir_evolucion():
         
         # Si continúa, agregar strike
         print("⚠️ Strike agregado por similitud global detectada\n")
-        reg.total_strikes += 1
-        reg.strikes.append({
-            "razon": f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
-            "fecha": str(fecha)
-        })
+        reg.agregar_strike(
+            f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
+            str(fecha),
+            cedula
+        )
         logger.warning(f"Strike crítico: similitud global {porcentaje_global}%")
     # Crear evolución
     ev = evolucion(fecha, hora, contenido)
@@ -109,8 +123,7 @@ def subir_evolucion():
     # Verificar retraso y agregar strike si es necesario
     if ev.es_tarde():
         razon = "Evolución subida después de las 24 horas"
-        reg.total_strikes += 1
-        reg.strikes.append({"razon": razon, "fecha": str(fecha)})
+        reg.agregar_strike(razon, str(fecha), cedula)
         print(f"⚠️ Strike agregado. Total strikes: {reg.total_strikes}\n")
         logger.info(f"evolucion subida subida con retraso ")
 def seleccionar_opcion(opcion):
@@ -132,6 +145,8 @@ def seleccionar_opcion(opcion):
         cargar_informacion()
     else:
         print("Ingrese una opción válida")
+    # Entre operaciones, fuera de los oyentes de cambios
+    almacen.compactar_si_hace_falta()
 def consultar_evolucion():
     logger.info(f"Se inicio una nueva consulta ")
     cedula = pedir_cedula()
@@ -239,6 +254,11 @@ def modificar_evolucion():
         logger.info(f"Evolucion encontrada")
         fecha = pedir_fecha()
         logger.info(f"Nueva fecha de evolucion {fecha}")
+        otra = p.evolucion_en_fecha(fecha)
+        if otra is not None and otra is not ev:
+            print("Error: Ya existe una evolucion con esa fecha\n")
+            logger.info(f"La evolucion no pudo ser modificada, fecha {fecha} ocupada")
+            return
         hora = pedir_hora()
         logger.info(f"Nueva hora de evolucion {hora}")
         contenido = pedir_contenido()
@@ -265,11 +285,11 @@ def modificar_evolucion():
             
             # Si continúa, agregar strike
             print("⚠️ Strike agregado por similitud detectada\n")
-            reg.total_strikes += 1
-            reg.strikes.append({
-                "razon": f"Evolución modificada - Similar ({porcentaje}% con fecha {ev_similar.fecha})",
-                "fecha": str(fecha)
-            })
+            reg.agregar_strike(
+                f"Evolución modificada - Similar ({porcentaje}% con fecha {ev_similar.fecha})",
+                str(fecha),
+                cedula
+            )
             logger.warning(f"Strike agregado en modificación por similitud: {porcentaje}%")
             hay_similitud_global, porcentaje_global, paciente_similar, ev_similar_global = verificar_similitud_global(
             contenido,
@@ -292,21 +312,22 @@ def modificar_evolucion():
             
             # Si continúa, agregar strike
             print("⚠️ Strike agregado por similitud global detectada\n")
-            reg.total_strikes += 1
-            reg.strikes.append({
-                "razon": f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
-                "fecha": str(fecha)
-            })
+            reg.agregar_strike(
+                f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
+                str(fecha),
+                cedula
+            )
             logger.warning(f"Strike crítico: similitud global {porcentaje_global}%")
             
-        ev.fecha = fecha
-        ev.hora = hora
-        ev.contenido = contenido
-        ev.retraso = ev.verificar_retraso()
+        try:
+            p.editar_evolucion(n - 1, fecha, hora, contenido)
+        except ValueError as e:
+            print(f"Error: {e}\n")
+            logger.info(f"La evolucion no pudo ser modificada razon {e}")
+            return
         
         if ev.es_tarde():
-            reg.total_strikes += 1
-            reg.strikes.append({"razon": "Evolución modificada fuera de tiempo", "fecha": str(fecha)})
+            reg.agregar_strike("Evolución modificada fuera de tiempo", str(fecha), cedula)
             print(f"⚠️ Strike agregado por modificación fuera de tiempo\n")
         
         print("Evolución modificada correctamente\n")
@@ -316,12 +337,16 @@ def modificar_evolucion():
         logger.info(f"opcion invalida")
 def estadisticas():
     logger.info(f"se solicito la visualizacion de estadisticas")
-    total_evoluciones = reg.total_evoluciones()
-    total_strikes = reg.total_strikes
+    agregados = reg.obtener_agregados()
+    total_evoluciones = agregados.evoluciones
+    total_strikes = agregados.strikes
     
     print(f"\n=== ESTADÍSTICAS ===")
     print(f"Total evoluciones: {total_evoluciones}")
+    print(f"Evoluciones con retraso: {agregados.tarde}")
     print(f"Total strikes: {total_strikes}")
+    for razon, cantidad in agregados.strikes_por_razon.items():
+        print(f"  - {razon}: {cantidad}")
     
     if total_strikes >= 3:
         print("⚠️ ALERTA: Se han alcanzado 3 o más strikes")
@@ -362,7 +387,8 @@ def guardar_informacion():
         
         if op == 1:
             try:
-                guardar_json(reg)
+                # Escribe el snapshot completo y vacía el diario
+                almacen.vincular(reg)
                 print("Información guardada correctamente\n")
                 logger.info("Proceso de guardado finalizado con éxito")
             except Exception as e:
@@ -401,7 +427,8 @@ def cargar_informacion():
         
         if op == 1:
             try:
-                reg = cargar_json()
+                reg = almacen.recuperar()
+                usar_almacen(reg, similitudes)
                 logger.info("Información cargada correctamente desde JSON")
             except Exception as e:
                 print(f"Error al cargar: {e}\n")
@@ -413,6 +440,9 @@ def cargar_informacion():
                 reg_cargado = cargar_desde_excel()
                 if reg_cargado is not None:
                     reg = reg_cargado
+                    # A partir de aquí los cambios se guardan sobre lo cargado
+                    almacen.vincular(reg)
+                    usar_almacen(reg, similitudes)
                     logger.info("Información cargada correctamente desde Excel")
             except Exception as e:
                 print(f"Error al cargar Excel: {e}\n")
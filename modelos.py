@@ -1,28 +1,232 @@
-from datetime import datetime, date, time, timedelta
+from datetime import datetime, date, time
+from bisect import bisect_left, bisect_right
+import hashlib
+import threading
+
+def normalizar_texto(texto):
+    """
+    Texto en minúsculas, tal como lo compara analisis.calcular_similitud.
+
+    No colapsa espacios: SequenceMatcher los cuenta, y la similitud (y con
+    ella los strikes) tiene que ser la misma que comparando los textos.
+    """
+    return texto.lower()
+
+def hash_texto(texto):
+    """Hash corto (hexadecimal) de un texto ya normalizado."""
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+# Microsegundos en un día, para empaquetar fecha y hora en un entero
+_US_DIA = 86400 * 10**6
+
+def _empaquetar_momento(fecha: date, hora: time):
+    """Fecha y hora como microsegundos desde el 1/1/1 (ordinal de la fecha)."""
+    return (fecha.toordinal() * _US_DIA
+            + ((hora.hour * 60 + hora.minute) * 60 + hora.second) * 10**6 + hora.microsecond)
+
+def _minutos_retraso(retraso):
+    """Minutos de un retraso dado como dict {'dias','horas','minutos'} o entero."""
+    if retraso is None:
+        return 0
+    if isinstance(retraso, int):
+        return retraso
+    return retraso.get("dias", 0) * 1440 + retraso.get("horas", 0) * 60 + retraso.get("minutos", 0)
+
+def _hora_de_momento(momento):
+    """Hora de un momento empaquetado con _empaquetar_momento."""
+    segundos, microsegundo = divmod(momento % _US_DIA, 10**6)
+    return time(segundos // 3600, segundos // 60 % 60, segundos % 60, microsegundo)
+
+def _momento_actual():
+    """datetime.now() empaquetado como en _empaquetar_momento."""
+    ahora = datetime.now()
+    return _empaquetar_momento(ahora.date(), ahora.time())
+
+def _minutos_entre(momento, subida):
+    """Minutos de retraso de una evolución subida en subida (0 si pasó menos de un día)."""
+    transcurrido = subida - momento
+    if transcurrido > _US_DIA:
+        return transcurrido // (60 * 10**6)
+    return 0
+
+def _retraso_como_dict(minutos):
+    """Minutos de retraso como {'dias', 'horas', 'minutos'}."""
+    dias, resto = divmod(minutos, 1440)
+    return {"dias": dias, "horas": resto // 60, "minutos": resto % 60}
 
 class evolucion:
     """
     Representa una evolución médica de un paciente.
+    
+    Para ocupar poca memoria con muchas evoluciones usa __slots__, guarda
+    fecha y hora empaquetadas en un solo entero (momento) y el retraso
+    como minutos; fecha, hora y retraso se calculan al leerlos.
+    
+    El retraso se calcula al primer uso, a partir del momento en que se
+    subió la evolución (subida), y queda en caché. Las evoluciones que se
+    leen de un archivo o de la base de datos se crean con guardada(), que
+    recibe el retraso ya calculado y no hace ningún otro cálculo.
+    
     Attributes:
         fecha (date): Fecha en que se realizó la evolución
         hora (time): Hora en que se realizó
+        momento (int): Fecha y hora como un entero (sirve para ordenar)
+        dia (int): Ordinal de la fecha
         contenido (str): Descripción de la evolución (mínimo 35 caracteres)
         retraso (dict): Diccionario con {'dias': int, 'horas': int, 'minutos': int}
+        retraso_minutos (int): El mismo retraso en minutos
+        subida (datetime): Cuándo se subió o modificó por última vez (None
+            si se cargó ya guardada)
+        id (int): Id estable de la evolución, el mismo de su fila en la base
+            de datos (lo asigna el registro; None si aún no está en uno)
+        contenido_normalizado (str): Contenido normalizado (se calcula al
+            primer uso y se descarta al cambiar contenido)
+        hash_contenido (str): Hash del contenido normalizado
     """
-    def __init__(self,fecha : date,hora: time,contenido : str ):
+    __slots__ = ("_momento", "_subida", "_retraso_minutos", "_contenido", "_normalizado", "_hash", "id")
+
+    def __init__(self,fecha : date,hora: time,contenido : str, subida: datetime = None):
         """
         Inicializa una nueva evolución.
         Args:
             fecha (date): Fecha de la evolución
             hora (time): Hora de la evolución
             contenido (str): Descripción de la evolución
+            subida (datetime): Momento en que se sube (por defecto, ahora)
         Raises:
             ValueError: Si el contenido tiene menos de 35 caracteres
         """
-        self.fecha = fecha
-        self.hora = hora
+        self._momento = _empaquetar_momento(fecha, hora)
         self.contenido = contenido
-        self.retraso = self.verificar_retraso()
+        self.subida = subida
+        self.id = None
+    
+    @classmethod
+    def guardada(cls, fecha: date, hora: time, contenido: str, retraso=None, id=None):
+        """
+        Crea una evolución ya guardada (para los cargadores).
+        
+        No registra momento de subida ni calcula nada: el retraso es el
+        que se guardó.
+        
+        Args:
+            fecha (date): Fecha de la evolución
+            hora (time): Hora de la evolución
+            contenido (str): Descripción de la evolución
+            retraso (dict | int): Retraso guardado, como dict o en minutos
+            id (int): Id de la fila en la base de datos
+            
+        Returns:
+            evolucion: La evolución
+        """
+        ev = cls.__new__(cls)
+        ev._momento = _empaquetar_momento(fecha, hora)
+        ev._subida = None
+        ev._retraso_minutos = _minutos_retraso(retraso)
+        ev._contenido = contenido
+        ev._normalizado = None
+        ev._hash = None
+        ev.id = id
+        return ev
+    
+    @property
+    def fecha(self):
+        """Fecha de la evolución."""
+        return date.fromordinal(self._momento // _US_DIA)
+    
+    @fecha.setter
+    def fecha(self, valor):
+        self._momento = _empaquetar_momento(valor, self.hora)
+    
+    @property
+    def hora(self):
+        """Hora de la evolución."""
+        return _hora_de_momento(self._momento)
+    
+    @hora.setter
+    def hora(self, valor):
+        self._momento = _empaquetar_momento(self.fecha, valor)
+    
+    @property
+    def momento(self):
+        """Fecha y hora empaquetadas (microsegundos desde el 1/1/1)."""
+        return self._momento
+    
+    @property
+    def dia(self):
+        """Fecha como ordinal (date.toordinal()), sin crear el objeto date."""
+        return self._momento // _US_DIA
+    
+    @property
+    def subida(self):
+        """Momento en que se subió la evolución (None si se cargó ya guardada)."""
+        if self._subida is None:
+            return None
+        return datetime.combine(date.fromordinal(self._subida // _US_DIA), _hora_de_momento(self._subida))
+    
+    @subida.setter
+    def subida(self, valor):
+        """Fija el momento de subida (None: ahora) y descarta el retraso calculado."""
+        if valor is None:
+            self._subida = _momento_actual()
+        else:
+            self._subida = _empaquetar_momento(valor.date(), valor.time())
+        self._retraso_minutos = None
+    
+    @property
+    def retraso(self):
+        """Retraso como {'dias', 'horas', 'minutos'} (se arma desde retraso_minutos)."""
+        return _retraso_como_dict(self.retraso_minutos)
+    
+    @retraso.setter
+    def retraso(self, valor):
+        self._retraso_minutos = _minutos_retraso(valor)
+    
+    @property
+    def retraso_minutos(self):
+        """Retraso en minutos (0 si se subió a tiempo), calculado al primer uso."""
+        if self._retraso_minutos is None:
+            self._retraso_minutos = _minutos_entre(self._momento, self._subida)
+        return self._retraso_minutos
+    
+    @retraso_minutos.setter
+    def retraso_minutos(self, valor):
+        self._retraso_minutos = valor
+    
+    @property
+    def contenido(self):
+        """Descripción de la evolución."""
+        return self._contenido
+    
+    @contenido.setter
+    def contenido(self, valor):
+        self._contenido = valor
+        self._normalizado = None
+        self._hash = None
+    
+    @property
+    def contenido_normalizado(self):
+        """Contenido en minúsculas (en caché), ver normalizar_texto."""
+        if self._normalizado is None:
+            self._normalizado = normalizar_texto(self._contenido)
+        return self._normalizado
+    
+    @property
+    def hash_contenido(self):
+        """Hash de contenido_normalizado (en caché)."""
+        if self._hash is None:
+            self._hash = hash_texto(self.contenido_normalizado)
+        return self._hash
+    
+    def minutos_de_retraso(self):
+        """
+        Calcula los minutos transcurridos desde que se realizó la evolución
+        hasta ahora.
+        
+        Returns:
+            int: Minutos de retraso, o 0 si pasó menos de un día
+        """
+        return _minutos_entre(self._momento, _momento_actual())
         
     def verificar_retraso(self):
         """
@@ -32,14 +236,7 @@ class evolucion:
             dict: Diccionario con 'dias', 'horas' y 'minutos' de retraso.
                   Si no hay retraso, retorna {'dias': 0, 'horas': 0, 'minutos': 0}
         """
-        fecha_subida=datetime.combine(self.fecha,self.hora)
-        delta = datetime.now()-fecha_subida
-        if delta > timedelta(days=1):
-            dias = delta.days
-            horas = delta.seconds // 3600
-            minutos = (delta.seconds % 3600) // 60
-            return {"dias": dias, "horas": horas, "minutos": minutos}
-        return {"dias": 0, "horas": 0, "minutos": 0}
+        return _retraso_como_dict(self.minutos_de_retraso())
     
     def es_tarde(self):
         """
@@ -48,8 +245,7 @@ class evolucion:
         Returns:
             bool: True si hay retraso, False si no
         """
-        r = self.retraso
-        return r["dias"] > 0 or r["horas"] > 0 or r["minutos"] > 0
+        return self.retraso_minutos > 0
     def exportar_clase(self):
         """
         Convierte la evolución a diccionario para guardar en JSON.
@@ -57,12 +253,15 @@ class evolucion:
         Returns:
             dict: Diccionario serializable con los datos de la evolución
         """
-        return {
+        datos = {
             "fecha": self.fecha.isoformat(),     
             "hora": self.hora.strftime("%H:%M:%S"),  
             "contenido": self.contenido,
             "retraso": self.retraso
         }
+        if self.id is not None:
+            datos["id"] = self.id
+        return datos
     @classmethod
     def importar_clase(cls, d):
         """
@@ -74,14 +273,475 @@ class evolucion:
         Returns:
             evolucion: Instancia de evolución reconstruida
         """
-        fecha = datetime.strptime(d["fecha"], "%Y-%m-%d").date()
-        hora = datetime.strptime(d["hora"], "%H:%M:%S").time()
+        fecha = date.fromisoformat(d["fecha"])
+        hora = time.fromisoformat(d["hora"])
         contenido = d["contenido"]
-        ev = cls(fecha, hora, contenido)
         if "retraso" in d:
-            ev.retraso = d["retraso"]
+            return cls.guardada(fecha, hora, contenido, d["retraso"], d.get("id"))
+        ev = cls(fecha, hora, contenido)
+        ev.id = d.get("id")
         return ev
 
+class agregados_registro:
+    """
+    Totales del registro que se actualizan en O(1) con cada cambio.
+
+    control_cambios los actualiza al registrar cada evolución agregada,
+    editada o eliminada y cada strike, así las estadísticas no recorren
+    las evoluciones. Los datos cargados de un archivo o de la base de
+    datos no pasan por control_cambios: los totales se recuentan una vez
+    (registro.obtener_agregados) o se inicializan con inicializar().
+
+    Attributes:
+        listo (bool): Los totales ya se calcularon y se están manteniendo
+        evoluciones (int): Cantidad de evoluciones
+        retraso_dias (int): Suma de los días de retraso ('dias' de cada retraso)
+        retraso_horas (int): Suma de las horas ('horas' de cada retraso)
+        retraso_minutos (int): Suma de los minutos ('minutos' de cada retraso)
+        retraso_total_minutos (int): Suma de los retrasos completos, en minutos
+        tarde (int): Evoluciones subidas con retraso
+        strikes (int): Cantidad de strikes
+        strikes_por_razon (dict): {razon: cantidad}
+    """
+    CAMPOS = ("evoluciones", "retraso_dias", "retraso_horas", "retraso_minutos",
+              "retraso_total_minutos", "tarde", "strikes", "strikes_por_razon")
+
+    def __init__(self):
+        """Inicializa totales en cero, aún no calculados."""
+        self.inicializar()
+        self.listo = False
+
+    def inicializar(self, evoluciones=0, retraso_dias=0, retraso_horas=0, retraso_minutos=0,
+                    retraso_total_minutos=0, tarde=0, strikes_por_razon=None):
+        """
+        Fija los totales (p. ej. calculados con una consulta a la BD).
+
+        Args:
+            evoluciones (int): Cantidad de evoluciones
+            retraso_dias (int): Suma de los días de retraso
+            retraso_horas (int): Suma de las horas de retraso
+            retraso_minutos (int): Suma de los minutos de retraso
+            retraso_total_minutos (int): Suma de los retrasos en minutos
+            tarde (int): Evoluciones con retraso
+            strikes_por_razon (dict): {razon: cantidad}
+        """
+        self.evoluciones = evoluciones
+        self.retraso_dias = retraso_dias
+        self.retraso_horas = retraso_horas
+        self.retraso_minutos = retraso_minutos
+        self.retraso_total_minutos = retraso_total_minutos
+        self.tarde = tarde
+        self.strikes_por_razon = dict(strikes_por_razon or {})
+        self.strikes = sum(self.strikes_por_razon.values())
+        self.listo = True
+
+    def sumar_evolucion(self, minutos, signo=1):
+        """
+        Suma (signo=1) o resta (signo=-1) una evolución con ese retraso.
+
+        Args:
+            minutos (int): Retraso de la evolución en minutos
+            signo (int): 1 al agregar, -1 al quitar
+        """
+        if not self.listo:
+            return
+        self.evoluciones += signo
+        if minutos:
+            dias, resto = divmod(minutos, 1440)
+            self.retraso_dias += signo * dias
+            self.retraso_horas += signo * (resto // 60)
+            self.retraso_minutos += signo * (resto % 60)
+            self.retraso_total_minutos += signo * minutos
+            self.tarde += signo
+
+    def sumar_strike(self, razon):
+        """Cuenta un strike nuevo."""
+        if not self.listo:
+            return
+        self.strikes += 1
+        self.strikes_por_razon[razon] = self.strikes_por_razon.get(razon, 0) + 1
+
+    def recontar(self, reg):
+        """
+        Calcula todos los totales recorriendo el registro.
+
+        Args:
+            reg (registro): Registro a recontar
+        """
+        self.inicializar()
+        for _, evoluciones in reg.recorrer_por_paciente():
+            for ev in evoluciones:
+                self.sumar_evolucion(ev.retraso_minutos)
+        for strike in reg.strikes:
+            self.sumar_strike(strike["razon"])
+
+    def como_dict(self):
+        """Los totales como dict (con una copia de strikes_por_razon)."""
+        totales = {campo: getattr(self, campo) for campo in self.CAMPOS}
+        totales["strikes_por_razon"] = dict(self.strikes_por_razon)
+        return totales
+
+    def diferencias(self, reg):
+        """
+        Compara los totales mantenidos con un recuento completo del registro.
+
+        Args:
+            reg (registro): Registro al que pertenecen los totales
+
+        Returns:
+            dict: {campo: (mantenido, recontado)} de los campos que difieren
+        """
+        recontados = agregados_registro()
+        recontados.recontar(reg)
+        actuales = self.como_dict()
+        esperados = recontados.como_dict()
+        return {
+            campo: (actuales[campo], esperados[campo])
+            for campo in self.CAMPOS
+            if actuales[campo] != esperados[campo]
+        }
+
+class control_cambios:
+    """
+    Registra los cambios hechos sobre un registro desde el último guardado.
+
+    Permite que la persistencia escriba solo las filas afectadas en lugar
+    de reescribir toda la base de datos. Es seguro usarlo desde varios
+    hilos: tomar() entrega los cambios pendientes de forma atómica para que
+    se guarden en segundo plano mientras se siguen registrando otros.
+    
+    También asigna los ids de las evoluciones que entran al registro (los
+    mismos que tendrán sus filas) y mantiene el índice id -> evolución.
+    Sin reservador los ids salen de un contador propio (solo sirve si un
+    único proceso escribe); con reservador se piden por bloques a la base
+    de datos, así varios procesos nunca entregan el mismo id.
+
+    Attributes:
+        pacientes_nuevos (set): Cédulas de pacientes agregados
+        pacientes_modificados (set): Cédulas de pacientes editados
+        pacientes_eliminados (set): Cédulas de pacientes eliminados
+        evoluciones_nuevas (dict): {evolucion: cedula} de evoluciones agregadas
+        evoluciones_modificadas (dict): {evolucion: cedula} de evoluciones editadas
+        evoluciones_eliminadas (dict): {evolucion: cedula} de evoluciones
+            eliminadas que ya estaban guardadas
+        strikes_nuevos (list): Strikes agregados
+        cedulas_en_vuelo (set): Cédulas con evoluciones o pacientes en el
+            guardado en curso (retirados con tomar())
+        oyentes (list): Funciones que reciben cada cambio como un evento (dict)
+        ultimo_id (int): Mayor id de evolución asignado o visto (sin reservador)
+        reservador (callable): Función cantidad -> lista de ids reservados
+            en la base de datos (ver persistencia_db.reservar_ids_db)
+        bloque_ids (int): Ids que se piden al reservador cada vez
+        evoluciones_por_id (dict): {id: (cedula, evolucion)} de las
+            evoluciones indexadas
+        agregados (agregados_registro): Totales del registro a mantener
+            (None si no hay)
+    """
+    def __init__(self, agregados=None):
+        """
+        Inicializa un control sin cambios pendientes.
+
+        Args:
+            agregados (agregados_registro): Totales que se actualizan con
+                cada cambio
+        """
+        self._lock = threading.RLock()
+        self.cedulas_en_vuelo = set()
+        self.oyentes = []
+        self.ultimo_id = 0
+        self.reservador = None
+        self.bloque_ids = 100
+        self._ids_reservados = []
+        self.evoluciones_por_id = {}
+        self.agregados = agregados
+        self.limpiar()
+
+    def reservar_ids(self, maximo):
+        """
+        Evita que se asignen ids ya usados (al cargar datos guardados).
+
+        Args:
+            maximo (int): Mayor id de evolución existente
+        """
+        with self._lock:
+            if maximo is not None and maximo > self.ultimo_id:
+                self.ultimo_id = maximo
+
+    def indexar(self, cedula, evoluciones):
+        """
+        Agrega evoluciones al índice por id, asignando id a las que no tienen.
+
+        Si el reservador falla, las evoluciones quedan sin id hasta que se
+        guardan (la base de datos les asigna uno al insertarlas).
+
+        Args:
+            cedula (int): Cédula del paciente
+            evoluciones (list): Evoluciones del paciente
+        """
+        with self._lock:
+            self.reservar_ids(max((ev.id for ev in evoluciones if ev.id is not None), default=None))
+            for ev in evoluciones:
+                if ev.id is None:
+                    ev.id = self._nuevo_id()
+                    if ev.id is None:
+                        continue
+                self.evoluciones_por_id[ev.id] = (cedula, ev)
+
+    def usar_reservador(self, reservador):
+        """
+        Pide los ids de evolución a reservador (None para usar el contador propio).
+
+        Descarta los ids ya reservados, que pueden no valer para el nuevo.
+
+        Args:
+            reservador (callable): Función cantidad -> lista de ids reservados
+        """
+        with self._lock:
+            self.reservador = reservador
+            self._ids_reservados = []
+
+    def _nuevo_id(self):
+        """Siguiente id libre (None si el reservador no pudo dar ids)."""
+        if self.reservador is None:
+            self.ultimo_id += 1
+            return self.ultimo_id
+        if not self._ids_reservados:
+            try:
+                # En orden inverso para sacarlos con pop()
+                self._ids_reservados = sorted(self.reservador(self.bloque_ids), reverse=True)
+            except Exception as e:
+                from logger import logger
+                logger.error(f"No se pudieron reservar ids de evolución: {e}")
+                return None
+        return self._ids_reservados.pop()
+
+    def desindexar(self, evoluciones):
+        """Quita evoluciones del índice por id (p. ej. al descargarlas de memoria)."""
+        with self._lock:
+            for ev in evoluciones:
+                if self.evoluciones_por_id.get(ev.id, (None, None))[1] is ev:
+                    del self.evoluciones_por_id[ev.id]
+
+    def suscribir(self, oyente):
+        """
+        Registra una función que recibe cada cambio como un evento.
+
+        El evento es un dict con la clave "tipo" (el nombre del método que
+        lo registró, p. ej. "evolucion_agregada") y los datos necesarios
+        para reaplicarlo.
+
+        Args:
+            oyente (callable): Función que recibe el evento
+        """
+        self.oyentes.append(oyente)
+
+    def desuscribir(self, oyente):
+        """Quita una función registrada con suscribir()."""
+        if oyente in self.oyentes:
+            self.oyentes.remove(oyente)
+
+    def _emitir(self, tipo, **datos):
+        """Envía un evento a los oyentes."""
+        datos["tipo"] = tipo
+        for oyente in self.oyentes:
+            oyente(datos)
+
+    def limpiar(self):
+        """Descarta todos los cambios pendientes (después de guardar)."""
+        with self._lock:
+            self.pacientes_nuevos = set()
+            self.pacientes_modificados = set()
+            self.pacientes_eliminados = set()
+            self.evoluciones_nuevas = {}
+            self.evoluciones_modificadas = {}
+            self.evoluciones_eliminadas = {}
+            self.strikes_nuevos = []
+
+    def hay_cambios(self):
+        """
+        Indica si hay cambios pendientes de guardar.
+
+        Returns:
+            bool: True si hay al menos un cambio pendiente
+        """
+        return bool(self.pacientes_nuevos or self.pacientes_modificados
+                    or self.pacientes_eliminados or self.evoluciones_nuevas
+                    or self.evoluciones_modificadas or self.evoluciones_eliminadas
+                    or self.strikes_nuevos)
+
+    def cedulas_pendientes(self):
+        """
+        Retorna las cédulas de pacientes con evoluciones sin guardar.
+
+        Incluye las de los cambios que se están guardando (retirados con
+        tomar() y aún sin confirmar): hasta que se confirmen, la base de
+        datos todavía no los refleja.
+
+        Returns:
+            set: Cédulas con evoluciones nuevas, modificadas o eliminadas
+                 pendientes o en vuelo, y pacientes nuevos
+        """
+        with self._lock:
+            return self._cedulas_con_cambios() | self.cedulas_en_vuelo
+
+    def _cedulas_con_cambios(self):
+        """Cédulas con evoluciones o pacientes nuevos entre los cambios pendientes."""
+        return (set(self.evoluciones_nuevas.values())
+                | set(self.evoluciones_modificadas.values())
+                | set(self.evoluciones_eliminadas.values())
+                | self.pacientes_nuevos)
+
+    def tomar(self):
+        """
+        Retira los cambios pendientes para guardarlos.
+
+        Los cambios que lleguen después quedan registrados aparte. Después
+        de guardar se debe llamar a confirmar() o, si falló, a restaurar().
+
+        Returns:
+            control_cambios: Control con los cambios retirados
+        """
+        with self._lock:
+            tomados = control_cambios()
+            tomados.pacientes_nuevos = self.pacientes_nuevos
+            tomados.pacientes_modificados = self.pacientes_modificados
+            tomados.pacientes_eliminados = self.pacientes_eliminados
+            tomados.evoluciones_nuevas = self.evoluciones_nuevas
+            tomados.evoluciones_modificadas = self.evoluciones_modificadas
+            tomados.evoluciones_eliminadas = self.evoluciones_eliminadas
+            tomados.strikes_nuevos = self.strikes_nuevos
+            self.cedulas_en_vuelo = self._cedulas_con_cambios()
+            self.limpiar()
+            return tomados
+
+    def confirmar(self, tomados):
+        """Indica que los cambios retirados con tomar() ya se guardaron."""
+        with self._lock:
+            self.cedulas_en_vuelo = set()
+
+    def restaurar(self, tomados):
+        """
+        Devuelve a pendientes los cambios de un guardado fallido,
+        combinándolos con los que se registraron mientras tanto.
+        """
+        with self._lock:
+            self.cedulas_en_vuelo = set()
+            for cedula in tomados.pacientes_nuevos:
+                if cedula in self.pacientes_eliminados and cedula not in self.pacientes_nuevos:
+                    # Se eliminó antes de llegar a guardarse
+                    self.pacientes_eliminados.discard(cedula)
+                else:
+                    self.pacientes_nuevos.add(cedula)
+            self.pacientes_eliminados |= tomados.pacientes_eliminados
+            self.pacientes_modificados |= tomados.pacientes_modificados - self.pacientes_nuevos
+
+            for ev, cedula in tomados.evoluciones_nuevas.items():
+                if ev in self.evoluciones_eliminadas:
+                    del self.evoluciones_eliminadas[ev]
+                else:
+                    self.evoluciones_nuevas.setdefault(ev, cedula)
+                    self.evoluciones_modificadas.pop(ev, None)
+            for ev, cedula in tomados.evoluciones_modificadas.items():
+                if ev not in self.evoluciones_nuevas and ev not in self.evoluciones_eliminadas:
+                    self.evoluciones_modificadas.setdefault(ev, cedula)
+            self.evoluciones_eliminadas.update(tomados.evoluciones_eliminadas)
+            self.strikes_nuevos = tomados.strikes_nuevos + self.strikes_nuevos
+
+    def paciente_agregado(self, p):
+        """Marca un paciente como nuevo."""
+        with self._lock:
+            self.pacientes_nuevos.add(p.cedula)
+            self.indexar(p.cedula, p.evoluciones)
+            for ev in p.evoluciones:
+                self.evoluciones_nuevas[ev] = p.cedula
+                if self.agregados is not None:
+                    self.agregados.sumar_evolucion(ev.retraso_minutos)
+            if self.oyentes:
+                self._emitir("paciente_agregado", paciente=p.exportar_clase())
+
+    def paciente_modificado(self, p):
+        """Marca los datos personales de un paciente como editados."""
+        with self._lock:
+            if p.cedula not in self.pacientes_nuevos:
+                self.pacientes_modificados.add(p.cedula)
+            if self.oyentes:
+                self._emitir("paciente_modificado", cedula=p.cedula, nombre=p.nombre, apellido=p.apellido)
+
+    def paciente_eliminado(self, p):
+        """Marca un paciente (y sus evoluciones) como eliminado."""
+        with self._lock:
+            for ev in p.evoluciones:
+                self.evoluciones_nuevas.pop(ev, None)
+                self.evoluciones_modificadas.pop(ev, None)
+                if self.agregados is not None:
+                    self.agregados.sumar_evolucion(ev.retraso_minutos, -1)
+            self.desindexar(p.evoluciones)
+            self.pacientes_modificados.discard(p.cedula)
+            if p.cedula in self.pacientes_nuevos:
+                self.pacientes_nuevos.discard(p.cedula)
+            else:
+                self.pacientes_eliminados.add(p.cedula)
+            if self.oyentes:
+                self._emitir("paciente_eliminado", cedula=p.cedula)
+
+    def evolucion_agregada(self, cedula, ev):
+        """Marca una evolución como nueva (y le asigna id si no tiene)."""
+        with self._lock:
+            self.indexar(cedula, [ev])
+            self.evoluciones_nuevas[ev] = cedula
+            if self.agregados is not None:
+                self.agregados.sumar_evolucion(ev.retraso_minutos)
+            if self.oyentes:
+                self._emitir("evolucion_agregada", cedula=cedula, evolucion=ev.exportar_clase())
+
+    def evolucion_modificada(self, cedula, ev, fecha_anterior=None, retraso_anterior=None):
+        """
+        Marca una evolución como editada.
+
+        Args:
+            cedula (int): Cédula del paciente
+            ev (evolucion): Evolución ya modificada
+            fecha_anterior (date): Fecha que tenía antes de la edición
+            retraso_anterior (int): Minutos de retraso antes de la edición
+                (None si no cambió)
+        """
+        with self._lock:
+            if self.agregados is not None and retraso_anterior is not None:
+                self.agregados.sumar_evolucion(retraso_anterior, -1)
+                self.agregados.sumar_evolucion(ev.retraso_minutos)
+            if self.oyentes:
+                self._emitir(
+                    "evolucion_modificada",
+                    cedula=cedula,
+                    fecha_anterior=(fecha_anterior or ev.fecha).isoformat(),
+                    evolucion=ev.exportar_clase()
+                )
+            if ev in self.evoluciones_nuevas:
+                return
+            self.evoluciones_modificadas[ev] = cedula
+
+    def evolucion_eliminada(self, cedula, ev):
+        """Marca una evolución como eliminada."""
+        with self._lock:
+            if self.oyentes:
+                self._emitir("evolucion_eliminada", cedula=cedula, fecha=ev.fecha.isoformat())
+            self.evoluciones_modificadas.pop(ev, None)
+            self.desindexar([ev])
+            if self.agregados is not None:
+                self.agregados.sumar_evolucion(ev.retraso_minutos, -1)
+            if self.evoluciones_nuevas.pop(ev, None) is not None:
+                return
+            self.evoluciones_eliminadas[ev] = cedula
+
+    def strike_agregado(self, strike):
+        """Marca un strike como nuevo."""
+        with self._lock:
+            self.strikes_nuevos.append(strike)
+            if self.agregados is not None:
+                self.agregados.sumar_strike(strike["razon"])
+            if self.oyentes:
+                self._emitir("strike_agregado", strike=dict(strike))
+
 class paciente:
     """
     Representa un paciente en el sistema de fisioterapia.
@@ -89,12 +749,24 @@ class paciente:
     Un paciente contiene información personal y todas sus evoluciones
     (sesiones de terapia realizadas).
     
+    Las evoluciones se mantienen ordenadas por fecha, con un índice por
+    fecha al lado: comprobar si ya hay una evolución en una fecha es O(1),
+    agregar una es O(log n) para ubicarla (más el corrimiento de la lista)
+    y evoluciones_entre() obtiene un rango de fechas con bisect. Si la
+    lista se llena directamente (cargadores) el índice se rehace, y la
+    lista se ordena, la primera vez que se usa.
+    
     Attributes:
         cedula (int): Cédula de identidad (10 dígitos)
         nombre (str): Nombre del paciente
         apellido (str): Apellido del paciente
-        evoluciones (list): Lista de objetos evolucion del paciente
+        evoluciones (list): Lista de objetos evolucion del paciente, por fecha
+        cambios (control_cambios): Control de cambios del registro al que
+            pertenece (None si no está en un registro)
     """
+    __slots__ = ("cedula", "nombre", "apellido", "evoluciones", "cambios",
+                 "_dias", "_por_dia", "_lista_indexada")
+
     def __init__(self, cedula: int,nombre: str, apellido: str ):
         """
         Inicializa un nuevo paciente.
@@ -108,10 +780,52 @@ class paciente:
         self.nombre = nombre
         self.apellido = apellido
         self.evoluciones = []
+        self.cambios = None
+        # Ordinales de las fechas (en el orden de evoluciones) y evolución por ordinal
+        self._dias = []
+        self._por_dia = {}
+        self._lista_indexada = None
+    
+    def _indexadas(self):
+        """
+        Retorna evoluciones con el índice al día.
+        
+        El índice se rehace (ordenando la lista por fecha y hora) si la
+        lista fue reemplazada o si se le agregaron o quitaron elementos
+        sin pasar por los métodos del paciente.
+        """
+        evoluciones = self.evoluciones
+        if self._lista_indexada is not evoluciones or len(self._dias) != len(evoluciones):
+            evoluciones.sort(key=lambda ev: ev.momento)
+            self._dias = [ev.dia for ev in evoluciones]
+            self._por_dia = {dia: ev for dia, ev in zip(self._dias, evoluciones)}
+            self._lista_indexada = evoluciones
+        return evoluciones
+    
+    def _descartar_indice(self):
+        """Suelta el índice por fecha (se rehace en el próximo uso)."""
+        self._dias = []
+        self._por_dia = {}
+        self._lista_indexada = None
+    
+    def _insertar(self, evoluciones, ev):
+        """Inserta ev en su lugar por fecha (el índice ya está al día)."""
+        posicion = bisect_right(self._dias, ev.dia)
+        self._dias.insert(posicion, ev.dia)
+        evoluciones.insert(posicion, ev)
+        self._por_dia[ev.dia] = ev
+    
+    def _quitar(self, evoluciones, indice_evo):
+        """Quita la evolución en esa posición (el índice ya está al día)."""
+        ev = evoluciones.pop(indice_evo)
+        del self._dias[indice_evo]
+        if self._por_dia.get(ev.dia) is ev:
+            del self._por_dia[ev.dia]
+        return ev
         
     def agregar_evolucion(self,evolucion: evolucion):
         """
-        Agrega una nueva evolución al paciente.
+        Agrega una nueva evolución al paciente, en su lugar por fecha.
         
         Args:
             evolucion (evolucion): Objeto evolución a agregar
@@ -119,10 +833,71 @@ class paciente:
         Raises:
             ValueError: Si ya existe una evolución en la misma fecha
         """
-        for ev in self.evoluciones:
-            if ev.fecha==evolucion.fecha:
-                raise ValueError("Ya existe una evolucion con esa fecha")
-        self.evoluciones.append(evolucion)
+        evoluciones = self._indexadas()
+        if evolucion.dia in self._por_dia:
+            raise ValueError("Ya existe una evolucion con esa fecha")
+        self._insertar(evoluciones, evolucion)
+        if self.cambios is not None:
+            self.cambios.evolucion_agregada(self.cedula, evolucion)
+    
+    def cargar_evoluciones(self, evoluciones):
+        """
+        Incorpora evoluciones ya guardadas (al cargar datos).
+        
+        No comprueba fechas repetidas ni las marca como cambio pendiente;
+        el índice por fecha se arma una sola vez al final.
+        
+        Args:
+            evoluciones (list): Evoluciones a incorporar
+        """
+        self.evoluciones.extend(evoluciones)
+        self._indexadas()
+    
+    def evolucion_en_fecha(self, fecha: date):
+        """
+        Busca la evolución de una fecha.
+        
+        Args:
+            fecha (date): Fecha buscada
+            
+        Returns:
+            evolucion: La evolución de esa fecha, o None si no hay
+        """
+        self._indexadas()
+        return self._por_dia.get(fecha.toordinal())
+    
+    def posicion_de_fecha(self, fecha: date):
+        """
+        Índice en evoluciones de la evolución de una fecha.
+        
+        Args:
+            fecha (date): Fecha buscada
+            
+        Returns:
+            int: Posición, o None si no hay evolución en esa fecha
+        """
+        self._indexadas()
+        dia = fecha.toordinal()
+        posicion = bisect_left(self._dias, dia)
+        if posicion < len(self._dias) and self._dias[posicion] == dia:
+            return posicion
+        return None
+    
+    def evoluciones_entre(self, desde: date = None, hasta: date = None):
+        """
+        Evoluciones con fecha en el rango [desde, hasta], en orden.
+        
+        Args:
+            desde (date): Primera fecha incluida (None: desde el inicio)
+            hasta (date): Última fecha incluida (None: hasta el final)
+            
+        Returns:
+            list: Evoluciones del rango
+        """
+        evoluciones = self._indexadas()
+        inicio = 0 if desde is None else bisect_left(self._dias, desde.toordinal())
+        fin = len(evoluciones) if hasta is None else bisect_right(self._dias, hasta.toordinal())
+        return evoluciones[inicio:fin]
     
     def eliminar_evolucion(self, indice_evo : int):
         """
@@ -134,10 +909,74 @@ class paciente:
         Raises:
             ValueError: Si el índice es inválido
         """
-        if indice_evo < 0 or indice_evo>=len(self.evoluciones):
+        evoluciones = self._indexadas()
+        if indice_evo < 0 or indice_evo>=len(evoluciones):
             raise ValueError("Seleccione una evolucion valida ")
-        del self.evoluciones[indice_evo]
+        ev = self._quitar(evoluciones, indice_evo)
+        if self.cambios is not None:
+            self.cambios.evolucion_eliminada(self.cedula, ev)
+
+    def editar_evolucion(self, indice_evo: int, fecha: date, hora: time, contenido: str):
+        """
+        Modifica una evolución del paciente y recalcula su retraso.
+        
+        Si cambia la fecha, la evolución se mueve a su nuevo lugar en
+        evoluciones (su índice puede cambiar).
         
+        Args:
+            indice_evo (int): Índice de la evolución a modificar
+            fecha (date): Nueva fecha
+            hora (time): Nueva hora
+            contenido (str): Nuevo contenido
+            
+        Returns:
+            evolucion: La evolución modificada
+            
+        Raises:
+            ValueError: Si el índice es inválido o ya existe otra evolución
+                en la nueva fecha
+        """
+        evoluciones = self._indexadas()
+        if indice_evo < 0 or indice_evo>=len(evoluciones):
+            raise ValueError("Seleccione una evolucion valida ")
+        ev = evoluciones[indice_evo]
+        otra = self._por_dia.get(fecha.toordinal())
+        if otra is not None and otra is not ev:
+            raise ValueError("Ya existe una evolucion con esa fecha")
+        fecha_anterior = ev.fecha
+        retraso_anterior = ev.retraso_minutos
+        self._quitar(evoluciones, indice_evo)
+        ev.fecha = fecha
+        ev.hora = hora
+        ev.contenido = contenido
+        ev.subida = None
+        self._insertar(evoluciones, ev)
+        if self.cambios is not None:
+            self.cambios.evolucion_modificada(self.cedula, ev, fecha_anterior, retraso_anterior)
+        return ev
+
+    def editar_datos(self, nombre: str, apellido: str):
+        """
+        Modifica el nombre y apellido del paciente.
+        
+        Args:
+            nombre (str): Nuevo nombre
+            apellido (str): Nuevo apellido
+        """
+        self.nombre = nombre
+        self.apellido = apellido
+        if self.cambios is not None:
+            self.cambios.paciente_modificado(self)
+        
+    def total_evoluciones(self):
+        """
+        Cuenta las evoluciones del paciente.
+        
+        Returns:
+            int: Número de evoluciones
+        """
+        return len(self.evoluciones)
+
     def exportar_clase(self):
         """
         Convierte el paciente a diccionario para guardar en JSON.
@@ -163,8 +1002,7 @@ class paciente:
             paciente: Instancia de paciente reconstruida
         """
         p = cls(int(d["cedula"]), d["nombre"], d["apellido"])
-        for ev_d in d.get("evoluciones",[]):
-            p.evoluciones.append(evolucion.importar_clase(ev_d))
+        p.cargar_evoluciones([evolucion.importar_clase(ev_d) for ev_d in d.get("evoluciones", [])])
         return p
 class registro:
     """
@@ -177,13 +1015,100 @@ class registro:
     Attributes:
         pacientes (dict): Diccionario de pacientes {cedula: paciente}
         strikes (list): Lista de strikes registrados
-        total_strikes (int): Contador total de strikes
+        total_strikes (int): Contador total de strikes (de agregados)
+        agregados (agregados_registro): Totales mantenidos con cada cambio
+            (usar obtener_agregados(), que los calcula la primera vez)
+        cambios (control_cambios): Cambios pendientes de guardar
+        indice_lsh (indice_lsh): Índice de similitud global (se crea en el
+            primer uso, ver similitud_lsh.obtener_indice)
+        indice_coseno (indice_coseno): Ídem para el backend coseno
+            (similitud_coseno.obtener_indice)
+        grafo_similitud (grafo_similitud): Vecinos más similares de cada
+            evolución (grafo_similitud.obtener_grafo)
+        similitudes_guardadas (almacen_similitudes): Dónde leer y guardar las
+            similitudes calculadas (similitudes_guardadas.usar_almacen)
+        almacen_columnar (almacen_columnar): Evoluciones por columnas para
+            los reportes (almacen_columnar.obtener_almacen)
+        indice_nombres (indice_nombres): Pacientes por prefijo de nombre o
+            apellido (indices_registro.obtener_indice_nombres)
+        indice_fechas (indice_fechas): Evoluciones por fecha y evoluciones
+            tarde (indices_registro.obtener_indice_fechas)
     """
     def __init__(self):
         """Inicializa un registro vacío."""
         self.pacientes={}     
         self.strikes = []    
-        self.total_strikes = 0
+        self.agregados = agregados_registro()
+        self.cambios = control_cambios(self.agregados)
+        self.indice_lsh = None
+        self.indice_coseno = None
+        self.grafo_similitud = None
+        self.similitudes_guardadas = None
+        self.almacen_columnar = None
+        self.indice_nombres = None
+        self.indice_fechas = None
+    def cargar_paciente(self, paciente: paciente):
+        """
+        Incorpora un paciente ya guardado (al cargar datos) sin marcarlo
+        como cambio pendiente.
+        
+        Args:
+            paciente (paciente): Objeto paciente a incorporar
+        """
+        paciente.cambios = self.cambios
+        self.pacientes[paciente.cedula] = paciente
+    def recorrer_por_paciente(self):
+        """
+        Recorre las evoluciones de todos los pacientes, de a un paciente.
+        
+        Los índices y recuentos globales usan esto en lugar de leer
+        paciente.evoluciones de cada uno (registro_perezoso lo resuelve
+        con una sola consulta, sin cargar los pacientes).
+        
+        Yields:
+            tuple: (cedula, lista de evoluciones del paciente)
+        """
+        for p in list(self.pacientes.values()):
+            yield p.cedula, list(p.evoluciones)
+    def obtener_evolucion(self, id_evolucion: int, cedula: int = None):
+        """
+        Busca una evolución por su id.
+        
+        Las evoluciones cargadas se indexan al primer uso: si el id no está
+        en el índice se indexa el paciente indicado (o, sin cédula, todo el
+        registro) y se vuelve a buscar.
+        
+        Args:
+            id_evolucion (int): Id de la evolución
+            cedula (int): Cédula del paciente, si se conoce
+            
+        Returns:
+            tuple: (paciente, evolucion), o None si no existe
+        """
+        encontrada = self.cambios.evoluciones_por_id.get(id_evolucion)
+        if encontrada is None:
+            pacientes = [self.obtener_paciente(cedula)] if cedula is not None else list(self.pacientes.values())
+            for p in pacientes:
+                if p is not None:
+                    self.indexar_evoluciones(p)
+            encontrada = self.cambios.evoluciones_por_id.get(id_evolucion)
+            if encontrada is None:
+                return None
+        cedula_ev, ev = encontrada
+        if cedula is not None and cedula_ev != cedula:
+            return None
+        p = self.obtener_paciente(cedula_ev)
+        if p is None or p.evolucion_en_fecha(ev.fecha) is not ev:
+            return None
+        return p, ev
+    def indexar_evoluciones(self, p: paciente):
+        """
+        Indexa por id las evoluciones de un paciente (asigna id a las que no tienen).
+        
+        Args:
+            p (paciente): Paciente del registro
+        """
+        self.cambios.indexar(p.cedula, p.evoluciones)
     def agregar_paciente(self, paciente: paciente):
         """
         Agrega un nuevo paciente al registro.
@@ -197,6 +1122,8 @@ class registro:
         if paciente.cedula in self.pacientes:
             raise ValueError("Paciente ya registrado.")
         self.pacientes[paciente.cedula] = paciente
+        paciente.cambios = self.cambios
+        self.cambios.paciente_agregado(paciente)
     def obtener_paciente(self, cedula: int):
         """
         Obtiene un paciente por su cédula.
@@ -223,7 +1150,7 @@ class registro:
         p = self.obtener_paciente(cedula)
         if p is None:
             p = paciente(cedula, nombre, apellido)
-            self.pacientes[cedula] = p
+            self.agregar_paciente(p)
         return p
 
     def eliminar_paciente(self, cedula: int):
@@ -237,10 +1164,62 @@ class registro:
             KeyError: Si el paciente no existe
         """
         if cedula in self.pacientes:
-            del self.pacientes[cedula]
+            p = self.pacientes.pop(cedula)
+            self.cambios.paciente_eliminado(p)
+            p.cambios = None
         else:
             raise KeyError("Paciente no encontrado.")
 
+    def agregar_strike(self, razon: str, fecha: str, cedula: int = None):
+        """
+        Registra un nuevo strike.
+        
+        Args:
+            razon (str): Motivo del strike
+            fecha (str): Fecha de la evolución que lo originó
+            cedula (int): Cédula del paciente de esa evolución (opcional)
+            
+        Returns:
+            dict: El strike registrado
+        """
+        strike = {"razon": razon, "fecha": fecha, "cedula": cedula}
+        self.strikes.append(strike)
+        self.cambios.strike_agregado(strike)
+        return strike
+
+    def obtener_agregados(self):
+        """
+        Totales del registro (evoluciones, retrasos, tarde y strikes).
+        
+        La primera vez se recuentan recorriendo el registro (salvo que el
+        cargador ya los haya inicializado); después se mantienen en O(1)
+        con cada cambio.
+        
+        Returns:
+            agregados_registro: Totales del registro
+        """
+        if not self.agregados.listo:
+            with self.cambios._lock:
+                if not self.agregados.listo:
+                    self.agregados.recontar(self)
+        return self.agregados
+
+    def verificar_agregados(self):
+        """
+        Compara los totales mantenidos con un recuento completo.
+        
+        Returns:
+            dict: {campo: (mantenido, recontado)} de los campos que difieren
+                  (vacío si son consistentes)
+        """
+        with self.cambios._lock:
+            return self.obtener_agregados().diferencias(self)
+
+    @property
+    def total_strikes(self):
+        """Cantidad de strikes."""
+        return self.obtener_agregados().strikes
+
     def total_evoluciones(self):
         """
         Cuenta el total de evoluciones en el sistema.
@@ -248,7 +1227,7 @@ class registro:
         Returns:
             int: Número total de evoluciones de todos los pacientes
         """
-        return sum(len(p.evoluciones) for p in self.pacientes.values())
+        return self.obtener_agregados().evoluciones
 
     def exportar_clase(self):
         """
@@ -277,7 +1256,11 @@ class registro:
         r = cls()
         for p_d in d.get("pacientes", []):
             p = paciente.importar_clase(p_d)
-            r.pacientes[p.cedula] = p
+            r.cargar_paciente(p)
+        # Los ids guardados primero, para no repetirlos al asignar los que faltan
+        r.cambios.reservar_ids(max((ev.id for p in r.pacientes.values() for ev in p.evoluciones
+                                    if ev.id is not None), default=None))
+        for p in r.pacientes.values():
+            r.indexar_evoluciones(p)
         r.strikes = d.get("strikes", [])
-        r.total_strikes = d.get("total_strikes", 0)
         return r            
\ No newline at end of file
@@ -1,14 +1,18 @@
 """
 Modelos de base de datos con SQLAlchemy.
-Mapea las clases Python a tablas PostgreSQL.
+Mapea las clases Python a tablas PostgreSQL o SQLite (archivo local en
+modo WAL, usado cuando DATABASE_URL no está configurada).
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Date, Time, Text, ForeignKey, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Date, Time, Text, Float, ForeignKey, JSON, Index, UniqueConstraint
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
 import os
+import time
 from dotenv import load_dotenv
+from logger import logger
 
 # Cargar variables de entorno
 load_dotenv()
@@ -16,15 +20,173 @@ load_dotenv()
 # Crear base
 Base = declarative_base()
 
-# Configurar conexión a PostgreSQL
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Sesiones sin engine fijo: se enlazan al engine en obtener_sesion()
+Session = sessionmaker()
 
-# Render usa "postgres://" pero SQLAlchemy necesita "postgresql://"
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Engine creado en el primer uso (importar este módulo no abre conexiones)
+_engine = None
 
-engine = create_engine(DATABASE_URL, echo=True)
-Session = sessionmaker(bind=engine)
+# Base de datos usada si no hay DATABASE_URL (instalaciones de un solo equipo y pruebas)
+URL_SQLITE_POR_DEFECTO = "sqlite:///evoluciones.db"
+
+def _leer_bool(nombre, por_defecto):
+    """Lee una variable de entorno booleana ("1", "true", "si"...)."""
+    valor = os.getenv(nombre)
+    if valor is None:
+        return por_defecto
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+def leer_configuracion_db():
+    """
+    Lee la configuración de la base de datos desde variables de entorno.
+    
+    Variables:
+        DATABASE_URL: URL de conexión (por defecto el archivo SQLite
+            URL_SQLITE_POR_DEFECTO)
+        DB_ECHO: Imprimir cada sentencia SQL (por defecto desactivado)
+        DB_POOL_SIZE: Conexiones mantenidas en el pool
+        DB_MAX_OVERFLOW: Conexiones extra permitidas sobre el pool
+        DB_POOL_PRE_PING: Verificar la conexión antes de usarla
+        DB_POOL_RECYCLE: Segundos antes de reciclar una conexión
+        DB_STATEMENT_TIMEOUT_MS: Tiempo máximo por sentencia (0 = sin límite)
+        DB_SLOW_QUERY_MS: Umbral para registrar consultas lentas (0 = no registrar)
+        DB_SQLITE_SYNCHRONOUS: PRAGMA synchronous de SQLite (por defecto NORMAL)
+        DB_SQLITE_CACHE_KB: Caché de páginas de SQLite en KB
+        DB_SQLITE_MMAP_MB: Tamaño del mapeo en memoria de SQLite en MB
+        DB_SQLITE_BUSY_TIMEOUT_MS: Espera de SQLite ante una base bloqueada
+    
+    Returns:
+        dict: Opciones para crear_engine_db()
+    """
+    url = os.getenv('DATABASE_URL')
+    
+    # Render usa "postgres://" pero SQLAlchemy necesita "postgresql://"
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if not url:
+        url = URL_SQLITE_POR_DEFECTO
+    
+    return {
+        "url": url,
+        "echo": _leer_bool("DB_ECHO", False),
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": _leer_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+        "slow_query_ms": int(os.getenv("DB_SLOW_QUERY_MS", "500")),
+        "sqlite_synchronous": os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL"),
+        "sqlite_cache_kb": int(os.getenv("DB_SQLITE_CACHE_KB", "65536")),
+        "sqlite_mmap_mb": int(os.getenv("DB_SQLITE_MMAP_MB", "256")),
+        "sqlite_busy_timeout_ms": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    }
+
+def crear_engine_db(url, echo=False, pool_size=5, max_overflow=10, pool_pre_ping=True,
+                    pool_recycle=1800, statement_timeout_ms=0, slow_query_ms=500,
+                    sqlite_synchronous="NORMAL", sqlite_cache_kb=65536, sqlite_mmap_mb=256,
+                    sqlite_busy_timeout_ms=5000):
+    """
+    Crea un engine de SQLAlchemy con pool y registro de consultas lentas.
+    
+    Args:
+        url (str): URL de conexión
+        echo (bool): Imprimir cada sentencia SQL
+        pool_size (int): Conexiones mantenidas en el pool
+        max_overflow (int): Conexiones extra permitidas sobre el pool
+        pool_pre_ping (bool): Verificar la conexión antes de usarla
+        pool_recycle (int): Segundos antes de reciclar una conexión
+        statement_timeout_ms (int): Tiempo máximo por sentencia en PostgreSQL
+        slow_query_ms (int): Umbral en ms para registrar consultas lentas
+        sqlite_synchronous (str): PRAGMA synchronous en SQLite (OFF, NORMAL, FULL)
+        sqlite_cache_kb (int): Caché de páginas en SQLite, en KB
+        sqlite_mmap_mb (int): Mapeo en memoria del archivo SQLite, en MB
+        sqlite_busy_timeout_ms (int): Espera en SQLite si otra conexión escribe
+        
+    Returns:
+        Engine: Engine configurado
+        
+    Raises:
+        RuntimeError: Si no hay URL de base de datos configurada
+    """
+    if not url:
+        raise RuntimeError("DATABASE_URL no está configurada")
+    
+    opciones = {"echo": echo, "pool_pre_ping": pool_pre_ping}
+    backend = make_url(url).get_backend_name()
+    if backend != "sqlite":
+        opciones.update(pool_size=pool_size, max_overflow=max_overflow, pool_recycle=pool_recycle)
+    if backend == "postgresql" and statement_timeout_ms > 0:
+        opciones["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+    
+    nuevo_engine = create_engine(url, **opciones)
+    if backend == "sqlite":
+        if str(sqlite_synchronous).upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Valor inválido para PRAGMA synchronous: {sqlite_synchronous}")
+        _configurar_sqlite(nuevo_engine, sqlite_synchronous, sqlite_cache_kb,
+                           sqlite_mmap_mb, sqlite_busy_timeout_ms)
+    if slow_query_ms > 0:
+        _registrar_consultas_lentas(nuevo_engine, slow_query_ms)
+    return nuevo_engine
+
+def _configurar_sqlite(engine_db, synchronous, cache_kb, mmap_mb, busy_timeout_ms):
+    """
+    Aplica los PRAGMA de SQLite a cada conexión nueva.
+    
+    WAL permite leer mientras el escritor diferido guarda; con WAL,
+    synchronous=NORMAL solo hace fsync al pasar el diario a la base.
+    """
+    @event.listens_for(engine_db, "connect")
+    def _pragmas(conexion_dbapi, registro_conexion):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous.upper()}")
+        # cache_size negativo se interpreta en KB
+        cursor.execute(f"PRAGMA cache_size=-{int(cache_kb)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def _registrar_consultas_lentas(engine_db, slow_query_ms):
+    """Registra en el log las sentencias que tardan más de slow_query_ms."""
+    @event.listens_for(engine_db, "before_cursor_execute")
+    def _inicio(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine_db, "after_cursor_execute")
+    def _fin(conn, cursor, statement, parameters, context, executemany):
+        duracion_ms = (time.perf_counter() - conn.info["inicio_consulta"].pop()) * 1000
+        if duracion_ms >= slow_query_ms:
+            logger.warning(f"Consulta lenta ({duracion_ms:.0f} ms): {statement[:200]}")
+
+def obtener_engine():
+    """
+    Retorna el engine de la aplicación, creándolo en el primer uso.
+    
+    Returns:
+        Engine: Engine configurado según leer_configuracion_db()
+    """
+    global _engine
+    if _engine is None:
+        _engine = crear_engine_db(**leer_configuracion_db())
+    return _engine
+
+def configurar_engine(**opciones):
+    """
+    Reemplaza el engine de la aplicación por uno con otras opciones.
+    
+    Las opciones no indicadas se toman de leer_configuracion_db().
+    
+    Returns:
+        Engine: El nuevo engine
+    """
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+    configuracion = leer_configuracion_db()
+    configuracion.update(opciones)
+    _engine = crear_engine_db(**configuracion)
+    return _engine
 
 # Modelos de tablas
 
@@ -42,6 +204,12 @@ class PacienteDB(Base):
 class EvolucionDB(Base):
     """Tabla de evoluciones"""
     __tablename__ = 'evoluciones'
+    __table_args__ = (
+        # Una evolución por paciente y día; su índice (cedula_paciente, fecha)
+        # resuelve también las búsquedas por paciente
+        UniqueConstraint('cedula_paciente', 'fecha', name='uq_evoluciones_cedula_fecha'),
+        Index('ix_evoluciones_fecha', 'fecha'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     cedula_paciente = Column(Integer, ForeignKey('pacientes.cedula'), nullable=False)
@@ -59,15 +227,52 @@ class StrikeDB(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     razon = Column(String(255), nullable=False)
-    fecha = Column(String(50), nullable=False)
+    fecha = Column(Date, nullable=False, index=True)
+    cedula_paciente = Column(Integer, ForeignKey('pacientes.cedula', ondelete='SET NULL'), nullable=True, index=True)
+
+class SecuenciaDB(Base):
+    """
+    Contadores para reservar ids en bases de datos sin secuencias (SQLite).
+    
+    Cada proceso pide bloques de ids de evolución incrementando la fila
+    "evoluciones" (ver persistencia_db.reservar_ids_db), así dos procesos
+    no usan el mismo id. PostgreSQL usa la secuencia SERIAL de la tabla.
+    """
+    __tablename__ = 'secuencias'
+    
+    nombre = Column(String(50), primary_key=True)
+    valor = Column(Integer, nullable=False)
+
+class SimilitudDB(Base):
+    """
+    Tabla de similitudes ya calculadas entre dos evoluciones.
+    
+    Cada evolución se identifica por (cédula, fecha); la primera es la que
+    se pasa primero a SequenceMatcher. hash_contenido resume el contenido
+    de ambas al calcular la similitud: si no coincide con el actual la fila
+    está vencida y se ignora. Sin claves foráneas para que los guardados
+    completos (que reescriben pacientes y evoluciones) no la vacíen.
+    """
+    __tablename__ = 'similitudes'
+    __table_args__ = (
+        Index('ix_similitudes_evolucion_2', 'cedula_2', 'fecha_2'),
+    )
+    
+    cedula_1 = Column(Integer, primary_key=True)
+    fecha_1 = Column(Date, primary_key=True)
+    cedula_2 = Column(Integer, primary_key=True)
+    fecha_2 = Column(Date, primary_key=True)
+    hash_contenido = Column(String(32), nullable=False)
+    similitud = Column(Float, nullable=False)
+    version = Column(Integer, nullable=False)
 
 # Función para crear todas las tablas
 def crear_tablas():
     """Crea todas las tablas en la base de datos"""
-    Base.metadata.create_all(engine)
+    Base.metadata.create_all(obtener_engine())
     print("✅ Tablas creadas exitosamente")
 
 # Función para obtener sesión
 def obtener_sesion():
     """Retorna una nueva sesión de base de datos"""
-    return Session()
\ No newline at end of file
+    return Session(bind=obtener_engine())
\ No newline at end of file
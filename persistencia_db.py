@@ -1,17 +1,36 @@
 """
-Funciones para trabajar con PostgreSQL.
+Funciones para trabajar con la base de datos (PostgreSQL o SQLite).
 CRUD usando SQLAlchemy.
 """
 
-from modelos_db import PacienteDB, EvolucionDB, StrikeDB, obtener_sesion
-from modelos import paciente, evolucion, registro
-from datetime import datetime
+from sqlalchemy import select, insert, text, func
+from modelos_db import PacienteDB, EvolucionDB, StrikeDB, obtener_sesion, obtener_engine
+from modelos import paciente, evolucion, registro, control_cambios
+from logger import logger
+from datetime import datetime, date
+import csv
+import io
+import json
+import threading
+import time
 
-def guardar_registro_db(reg: registro):
+TAMANO_LOTE = 1000
+
+# Evita que dos guardados incrementales se ejecuten a la vez
+_lock_guardado = threading.Lock()
+
+def guardar_registro_db(reg: registro, modo="bulk", tamano_lote=TAMANO_LOTE):
     """
-    Guarda todo el registro en PostgreSQL.
+    Guarda todo el registro en la base de datos.
     Elimina datos anteriores y guarda los nuevos.
+    
+    Args:
+        reg (registro): Registro a guardar
+        modo (str): "bulk" envía las filas en lotes con executemany (y COPY
+            en PostgreSQL); "orm" crea un objeto ORM por fila
+        tamano_lote (int): Filas por lote en el modo "bulk"
     """
+    _asegurar_ids(reg)
     session = obtener_sesion()
     
     try:
@@ -20,36 +39,24 @@ def guardar_registro_db(reg: registro):
         session.query(EvolucionDB).delete()
         session.query(PacienteDB).delete()
         
-        # Guardar pacientes
-        for p in reg.pacientes.values():
-            paciente_db = PacienteDB(
-                cedula=p.cedula,
-                nombre=p.nombre,
-                apellido=p.apellido
-            )
-            session.add(paciente_db)
-            
-            # Guardar evoluciones del paciente
-            for ev in p.evoluciones:
-                evolucion_db = EvolucionDB(
-                    cedula_paciente=p.cedula,
-                    fecha=ev.fecha,
-                    hora=ev.hora,
-                    contenido=ev.contenido,
-                    retraso=ev.retraso
-                )
-                session.add(evolucion_db)
-        
-        # Guardar strikes
-        for strike in reg.strikes:
-            strike_db = StrikeDB(
-                razon=strike['razon'],
-                fecha=strike['fecha']
-            )
-            session.add(strike_db)
+        if modo == "orm":
+            _guardar_registro_orm(session, reg)
+        else:
+            _guardar_registro_bulk(session, reg, tamano_lote)
+        if session.get_bind().dialect.name == "postgresql":
+            # Los ids explícitos no avanzan la secuencia SERIAL; nunca se
+            # retrocede, porque otros procesos pueden tener ids reservados
+            session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('evoluciones', 'id'), "
+                "GREATEST(nextval(pg_get_serial_sequence('evoluciones', 'id')), "
+                "COALESCE((SELECT MAX(id) FROM evoluciones), 0) + 1))"
+            ))
         
         session.commit()
-        print("✅ Datos guardados en PostgreSQL")
+        reg.cambios.limpiar()
+        # Desde aquí los ids nuevos se reservan en esta base de datos
+        reg.cambios.usar_reservador(reservar_ids_db)
+        print("✅ Datos guardados en la base de datos")
         
     except Exception as e:
         session.rollback()
@@ -58,47 +65,648 @@ def guardar_registro_db(reg: registro):
     finally:
         session.close()
 
-def cargar_registro_db():
+def reservar_ids_db(cantidad):
+    """
+    Reserva ids de evolución que ningún otro proceso va a usar.
+    
+    Con varios procesos (p. ej. workers de gunicorn) cada uno asigna ids a
+    sus evoluciones nuevas antes de guardarlas; reservarlos en la base de
+    datos evita que dos procesos usen el mismo. PostgreSQL los toma de la
+    secuencia SERIAL de evoluciones.id; SQLite incrementa el contador de la
+    tabla secuencias en una transacción propia (que bloquea la base hasta
+    confirmar) y nunca por debajo del mayor id guardado.
+    
+    Args:
+        cantidad (int): Ids a reservar
+        
+    Returns:
+        list: Ids reservados
+    """
+    with obtener_engine().begin() as conn:
+        if conn.dialect.name == "postgresql":
+            filas = conn.execute(
+                text("SELECT nextval(pg_get_serial_sequence('evoluciones', 'id')) "
+                     "FROM generate_series(1, :cantidad)"),
+                {"cantidad": cantidad}
+            )
+            return [fila[0] for fila in filas]
+        conn.execute(text("INSERT OR IGNORE INTO secuencias (nombre, valor) VALUES ('evoluciones', 0)"))
+        conn.execute(
+            text("UPDATE secuencias SET valor = MAX(valor, "
+                 "(SELECT COALESCE(MAX(id), 0) FROM evoluciones)) + :cantidad "
+                 "WHERE nombre = 'evoluciones'"),
+            {"cantidad": cantidad}
+        )
+        ultimo = conn.execute(text("SELECT valor FROM secuencias WHERE nombre = 'evoluciones'")).scalar()
+        return list(range(ultimo - cantidad + 1, ultimo + 1))
+
+def _asegurar_ids(reg: registro):
+    """
+    Da un id del registro a las evoluciones sin id o con un id repetido.
+    
+    Las filas se insertan con el id de la evolución, así el id que usan
+    las rutas es el mismo de la base de datos. El guardado completo
+    reemplaza todas las filas, así que los ids que faltan se numeran a
+    partir del mayor id en memoria; la secuencia de la base de datos se
+    ajusta después (ver reservar_ids_db).
+    """
+    ids_usados = set()
+    sin_id = []
+    for p in reg.pacientes.values():
+        for ev in p.evoluciones:
+            if ev.id is not None and ev.id not in ids_usados:
+                ids_usados.add(ev.id)
+            else:
+                sin_id.append(ev)
+    siguiente = max(ids_usados, default=0)
+    for ev in sin_id:
+        siguiente += 1
+        ev.id = siguiente
+    reg.cambios.reservar_ids(siguiente)
+    for p in reg.pacientes.values():
+        reg.indexar_evoluciones(p)
+
+def _guardar_registro_orm(session, reg: registro):
+    """Inserta el registro creando un objeto ORM por fila."""
+    # Guardar pacientes
+    for p in reg.pacientes.values():
+        paciente_db = PacienteDB(
+            cedula=p.cedula,
+            nombre=p.nombre,
+            apellido=p.apellido
+        )
+        session.add(paciente_db)
+        
+        # Guardar evoluciones del paciente
+        for ev in p.evoluciones:
+            evolucion_db = EvolucionDB(
+                id=ev.id,
+                cedula_paciente=p.cedula,
+                fecha=ev.fecha,
+                hora=ev.hora,
+                contenido=ev.contenido,
+                retraso=ev.retraso
+            )
+            session.add(evolucion_db)
+    
+    # Guardar strikes
+    for strike in reg.strikes:
+        strike_db = StrikeDB(**_fila_strike(reg, strike))
+        session.add(strike_db)
+
+def _guardar_registro_bulk(session, reg: registro, tamano_lote):
+    """
+    Inserta el registro en lotes con Core insert() (executemany).
+    En PostgreSQL usa COPY, que es la vía más rápida de carga.
+    """
+    filas_pacientes = [
+        {"cedula": p.cedula, "nombre": p.nombre, "apellido": p.apellido}
+        for p in reg.pacientes.values()
+    ]
+    
+    filas_evoluciones = [
+        {
+            "id": ev.id,
+            "cedula_paciente": p.cedula,
+            "fecha": ev.fecha,
+            "hora": ev.hora,
+            "contenido": ev.contenido,
+            "retraso": ev.retraso
+        }
+        for p in reg.pacientes.values()
+        for ev in p.evoluciones
+    ]
+    filas_strikes = [
+        _fila_strike(reg, strike)
+        for strike in reg.strikes
+    ]
+    
+    if session.get_bind().dialect.name == "postgresql":
+        _copiar_filas(session, PacienteDB.__table__, filas_pacientes)
+        _copiar_filas(session, EvolucionDB.__table__, filas_evoluciones)
+        _copiar_filas(session, StrikeDB.__table__, filas_strikes)
+    else:
+        _insertar_en_lotes(session, PacienteDB.__table__, filas_pacientes, tamano_lote)
+        _insertar_en_lotes(session, EvolucionDB.__table__, filas_evoluciones, tamano_lote)
+        _insertar_en_lotes(session, StrikeDB.__table__, filas_strikes, tamano_lote)
+
+def _fila_strike(reg: registro, strike):
+    """
+    Convierte un strike en memoria en los valores de su fila.
+    La fecha (texto ISO en memoria) se guarda como Date, y el enlace al
+    paciente se omite si el paciente ya no está en el registro.
+    """
+    fecha = strike['fecha']
+    if not isinstance(fecha, date):
+        fecha = date.fromisoformat(str(fecha)[:10])
+    cedula = strike.get('cedula')
+    if cedula is not None and reg.obtener_paciente(cedula) is None:
+        cedula = None
+    return {"razon": strike['razon'], "fecha": fecha, "cedula_paciente": cedula}
+
+def _insertar_en_lotes(session, tabla, filas, tamano_lote):
+    """Inserta filas con executemany en lotes de tamano_lote."""
+    for i in range(0, len(filas), tamano_lote):
+        session.execute(insert(tabla), filas[i:i + tamano_lote])
+
+def _copiar_filas(session, tabla, filas):
+    """Carga filas en una tabla PostgreSQL con COPY ... FROM STDIN (CSV)."""
+    if not filas:
+        return
+    columnas = list(filas[0].keys())
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow([
+            json.dumps(fila[c]) if isinstance(fila[c], dict) else fila[c]
+            for c in columnas
+        ])
+    buffer.seek(0)
+    
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {tabla.name} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def guardar_cambios_db(reg: registro):
+    """
+    Guarda en la base de datos solo los cambios pendientes del registro.
+    
+    Escribe INSERT/UPDATE/DELETE únicamente para los pacientes, evoluciones
+    y strikes marcados en reg.cambios, en una sola transacción corta.
+    Si falla, los cambios quedan pendientes para el próximo guardado.
+    Los guardados se serializan, así que puede llamarse desde varios hilos.
+    
+    Args:
+        reg (registro): Registro con los cambios pendientes
+    """
+    with _lock_guardado:
+        if not reg.cambios.hay_cambios():
+            return
+        
+        cambios = reg.cambios.tomar()
+        session = obtener_sesion()
+        
+        try:
+            _escribir_cambios(session, reg, cambios)
+            reg.cambios.confirmar(cambios)
+            
+        except Exception as e:
+            session.rollback()
+            reg.cambios.restaurar(cambios)
+            print(f"❌ Error al guardar cambios: {e}")
+            raise
+        finally:
+            session.close()
+
+def guardar_cambios_aislados(reg: registro):
+    """
+    Guarda los cambios pendientes paciente por paciente, apartando los que fallan.
+    
+    Sirve cuando guardar_cambios_db falla una y otra vez por unos pocos
+    cambios (p. ej. una fila que viola una restricción): los cambios de
+    cada paciente y cada strike se escriben en su propia transacción, así
+    uno inválido no impide guardar los demás. Los que fallan se retiran de
+    los pendientes y se devuelven descritos para guardarlos aparte (ver
+    persistencia_diferida). Si la base de datos no responde no se aparta
+    nada: lo que falte queda pendiente y se lanza el error.
+    
+    Args:
+        reg (registro): Registro con los cambios pendientes
+        
+    Returns:
+        list: Un dict por grupo de cambios que no se pudo guardar (ver
+              _describir_cambios)
+        
+    Raises:
+        Exception: Si la base de datos no está disponible
+    """
+    with _lock_guardado:
+        if not reg.cambios.hay_cambios():
+            return []
+        _verificar_conexion()
+        
+        cambios = reg.cambios.tomar()
+        grupos = _dividir_cambios(cambios)
+        descartados = []
+        for posicion, grupo in enumerate(grupos):
+            session = obtener_sesion()
+            try:
+                _escribir_cambios(session, reg, grupo)
+            except Exception as e:
+                session.rollback()
+                try:
+                    _verificar_conexion()
+                except Exception:
+                    # No es el grupo sino la conexión: lo que falta queda pendiente
+                    # (en orden inverso: restaurar() antepone los strikes)
+                    for restante in reversed(grupos[posicion:]):
+                        reg.cambios.restaurar(restante)
+                    raise
+                logger.error(f"Cambios descartados del guardado: {e}")
+                descartados.append(_describir_cambios(reg, grupo, e))
+            finally:
+                session.close()
+        reg.cambios.confirmar(cambios)
+        return descartados
+
+def _verificar_conexion():
+    """Lanza el error de conexión si la base de datos no responde."""
+    session = obtener_sesion()
+    try:
+        session.execute(text("SELECT 1"))
+    finally:
+        session.close()
+
+def _dividir_cambios(cambios):
+    """
+    Separa cambios retirados con tomar() en grupos que se guardan por separado.
+    
+    Returns:
+        list: Un control_cambios por paciente (con sus evoluciones) y, al
+              final, uno por strike
+    """
+    grupos = {}
+    
+    def grupo(cedula):
+        if cedula not in grupos:
+            grupos[cedula] = control_cambios()
+        return grupos[cedula]
+    
+    for cedula in cambios.pacientes_eliminados:
+        grupo(cedula).pacientes_eliminados.add(cedula)
+    for cedula in cambios.pacientes_nuevos:
+        grupo(cedula).pacientes_nuevos.add(cedula)
+    for cedula in cambios.pacientes_modificados:
+        grupo(cedula).pacientes_modificados.add(cedula)
+    for ev, cedula in cambios.evoluciones_eliminadas.items():
+        grupo(cedula).evoluciones_eliminadas[ev] = cedula
+    for ev, cedula in cambios.evoluciones_modificadas.items():
+        grupo(cedula).evoluciones_modificadas[ev] = cedula
+    for ev, cedula in cambios.evoluciones_nuevas.items():
+        grupo(cedula).evoluciones_nuevas[ev] = cedula
+    
+    divididos = list(grupos.values())
+    for strike in cambios.strikes_nuevos:
+        solo_strike = control_cambios()
+        solo_strike.strikes_nuevos.append(strike)
+        divididos.append(solo_strike)
+    return divididos
+
+def _describir_cambios(reg: registro, cambios, error):
+    """
+    Describe un grupo de cambios que no se pudo guardar (serializable a JSON).
+    
+    Returns:
+        dict: error y los pacientes, evoluciones y strikes del grupo
+    """
+    pacientes = []
+    for cedula in sorted(cambios.pacientes_nuevos | cambios.pacientes_modificados):
+        p = reg.obtener_paciente(cedula)
+        if p is not None:
+            pacientes.append({"cedula": p.cedula, "nombre": p.nombre, "apellido": p.apellido})
+    return {
+        "error": str(error),
+        "pacientes": pacientes,
+        "pacientes_eliminados": sorted(cambios.pacientes_eliminados),
+        "evoluciones_nuevas": [
+            dict(ev.exportar_clase(), cedula=cedula) for ev, cedula in cambios.evoluciones_nuevas.items()
+        ],
+        "evoluciones_modificadas": [
+            dict(ev.exportar_clase(), cedula=cedula) for ev, cedula in cambios.evoluciones_modificadas.items()
+        ],
+        "evoluciones_eliminadas": [
+            {"id": ev.id, "cedula": cedula, "fecha": ev.fecha.isoformat()}
+            for ev, cedula in cambios.evoluciones_eliminadas.items()
+        ],
+        "strikes": [
+            {"razon": s["razon"], "fecha": str(s["fecha"]), "cedula": s.get("cedula")}
+            for s in cambios.strikes_nuevos
+        ],
+    }
+
+def _escribir_cambios(session, reg: registro, cambios):
     """
-    Carga todo el registro desde PostgreSQL.
+    Escribe y confirma en la sesión los cambios retirados del registro.
+    
+    El orden respeta la restricción única (cedula_paciente, fecha): primero
+    las eliminaciones, después las evoluciones editadas y al final las
+    nuevas, con un flush entre cada paso y sin autoflush, así una evolución
+    nueva puede ocupar la fecha que otra dejó libre en el mismo lote.
+    """
+    with session.no_autoflush:
+        # Eliminaciones
+        ids_eliminados = [ev.id for ev in cambios.evoluciones_eliminadas if ev.id is not None]
+        if ids_eliminados:
+            session.query(EvolucionDB).filter(
+                EvolucionDB.id.in_(ids_eliminados)
+            ).delete(synchronize_session=False)
+        if cambios.pacientes_eliminados:
+            session.query(EvolucionDB).filter(
+                EvolucionDB.cedula_paciente.in_(cambios.pacientes_eliminados)
+            ).delete(synchronize_session=False)
+            session.query(PacienteDB).filter(
+                PacienteDB.cedula.in_(cambios.pacientes_eliminados)
+            ).delete(synchronize_session=False)
+        
+        # Pacientes nuevos y modificados
+        for cedula in cambios.pacientes_nuevos:
+            p = reg.obtener_paciente(cedula)
+            if p is not None:
+                session.add(PacienteDB(cedula=p.cedula, nombre=p.nombre, apellido=p.apellido))
+        for cedula in cambios.pacientes_modificados:
+            p = reg.obtener_paciente(cedula)
+            if p is not None:
+                session.query(PacienteDB).filter_by(cedula=cedula).update(
+                    {"nombre": p.nombre, "apellido": p.apellido},
+                    synchronize_session=False
+                )
+        session.flush()
+        
+        # Evoluciones modificadas
+        _actualizar_evoluciones(session, cambios.evoluciones_modificadas)
+        session.flush()
+        
+        # Evoluciones nuevas, con el id que ya les dio el registro (si no
+        # pudo reservarlo, lo asigna la base de datos al insertar)
+        sin_id = []
+        for ev, cedula in cambios.evoluciones_nuevas.items():
+            if reg.obtener_paciente(cedula) is None:
+                # El paciente se eliminó mientras se preparaba el guardado
+                continue
+            fila = EvolucionDB(
+                id=ev.id,
+                cedula_paciente=cedula,
+                fecha=ev.fecha,
+                hora=ev.hora,
+                contenido=ev.contenido,
+                retraso=ev.retraso
+            )
+            session.add(fila)
+            if ev.id is None:
+                sin_id.append((cedula, ev, fila))
+        
+        # Strikes nuevos
+        for strike in cambios.strikes_nuevos:
+            session.add(StrikeDB(**_fila_strike(reg, strike)))
+        session.flush()
+        ids_asignados = [(cedula, ev, fila.id) for cedula, ev, fila in sin_id]
+    
+    session.commit()
+    for cedula, ev, id_db in ids_asignados:
+        ev.id = id_db
+        reg.cambios.indexar(cedula, [ev])
+
+def _actualizar_evoluciones(session, modificadas):
+    """
+    Escribe las evoluciones editadas.
+    
+    Si un paciente tiene varias editadas en el lote (p. ej. dos que
+    intercambiaron fechas), esas filas pasan primero por fechas temporales
+    distintas para que ningún UPDATE choque con la restricción única
+    mientras las otras todavía tienen su fecha anterior.
+    
+    Args:
+        session: Sesión de la transacción del guardado
+        modificadas (dict): {evolucion: cedula} de las evoluciones editadas
+    """
+    editadas_por_cedula = {}
+    for ev, cedula in modificadas.items():
+        editadas_por_cedula.setdefault(cedula, []).append(ev)
+    
+    for evoluciones in editadas_por_cedula.values():
+        if len(evoluciones) < 2:
+            continue
+        # Fechas a partir del 1/1/0001, que no usa ninguna evolución real
+        for temporal, ev in enumerate(evoluciones, start=1):
+            session.query(EvolucionDB).filter_by(id=ev.id).update(
+                {"fecha": date.fromordinal(temporal)},
+                synchronize_session=False
+            )
+    
+    for ev in modificadas:
+        session.query(EvolucionDB).filter_by(id=ev.id).update(
+            {
+                "fecha": ev.fecha,
+                "hora": ev.hora,
+                "contenido": ev.contenido,
+                "retraso": ev.retraso
+            },
+            synchronize_session=False
+        )
+
+def cargar_registro_db(tamano_lote=1000):
+    """
+    Carga todo el registro desde la base de datos.
     Reconstruye objetos Python desde la BD.
+    
+    Usa una cantidad constante de consultas (pacientes, evoluciones y
+    strikes) en lugar de una consulta de evoluciones por paciente. Las
+    evoluciones se leen en lotes de tamano_lote filas.
+    
+    Args:
+        tamano_lote (int): Filas por lote al leer evoluciones
     """
     session = obtener_sesion()
     
     try:
+        inicio = time.perf_counter()
         reg = registro()
         
         # Cargar pacientes
-        pacientes_db = session.query(PacienteDB).all()
+        filas_pacientes = session.execute(
+            select(PacienteDB.cedula, PacienteDB.nombre, PacienteDB.apellido)
+        )
+        for cedula, nombre, apellido in filas_pacientes:
+            reg.cargar_paciente(paciente(cedula, nombre, apellido))
         
-        for p_db in pacientes_db:
-            p = paciente(p_db.cedula, p_db.nombre, p_db.apellido)
-            
-            # Cargar evoluciones del paciente
-            evoluciones_db = session.query(EvolucionDB).filter_by(cedula_paciente=p_db.cedula).all()
-            
-            for ev_db in evoluciones_db:
-                ev = evolucion(ev_db.fecha, ev_db.hora, ev_db.contenido)
-                ev.retraso = ev_db.retraso
-                p.evoluciones.append(ev)
-            
-            reg.pacientes[p.cedula] = p
+        # Cargar evoluciones de todos los pacientes en una sola consulta
+        consulta_evoluciones = (
+            select(
+                EvolucionDB.id,
+                EvolucionDB.cedula_paciente,
+                EvolucionDB.fecha,
+                EvolucionDB.hora,
+                EvolucionDB.contenido,
+                EvolucionDB.retraso
+            )
+            .order_by(EvolucionDB.cedula_paciente, EvolucionDB.fecha, EvolucionDB.hora, EvolucionDB.id)
+            .execution_options(yield_per=tamano_lote)
+        )
+        total_evoluciones = 0
+        ultimo_id = None
+        p = None
+        evoluciones = []
+        for id_db, cedula, fecha, hora, contenido, retraso in session.execute(consulta_evoluciones):
+            if p is None or p.cedula != cedula:
+                if p is not None:
+                    p.cargar_evoluciones(evoluciones)
+                evoluciones = []
+                p = reg.obtener_paciente(cedula)
+                if p is None:
+                    continue
+            evoluciones.append(evolucion.guardada(fecha, hora, contenido, retraso, id_db))
+            total_evoluciones += 1
+            if ultimo_id is None or id_db > ultimo_id:
+                ultimo_id = id_db
+        if p is not None:
+            p.cargar_evoluciones(evoluciones)
+        reg.cambios.reservar_ids(ultimo_id)
+        reg.cambios.usar_reservador(reservar_ids_db)
         
         # Cargar strikes
-        strikes_db = session.query(StrikeDB).all()
-        for strike_db in strikes_db:
+        filas_strikes = session.execute(
+            select(StrikeDB.razon, StrikeDB.fecha, StrikeDB.cedula_paciente).order_by(StrikeDB.id)
+        )
+        for razon, fecha, cedula in filas_strikes:
             reg.strikes.append({
-                "razon": strike_db.razon,
-                "fecha": strike_db.fecha
+                "razon": razon,
+                "fecha": str(fecha),
+                "cedula": cedula
             })
         
-        reg.total_strikes = len(reg.strikes)
         
-        print("✅ Datos cargados desde PostgreSQL")
+        duracion = time.perf_counter() - inicio
+        filas = len(reg.pacientes) + total_evoluciones + len(reg.strikes)
+        filas_por_segundo = filas / duracion if duracion > 0 else 0
+        print(f"✅ Datos cargados desde la base de datos ({filas} filas en {duracion:.2f}s, {filas_por_segundo:.0f} filas/s)")
+        logger.info(f"Carga desde BD: {filas} filas en {duracion:.2f}s ({filas_por_segundo:.0f} filas/s)")
         return reg
         
     except Exception as e:
         print(f"❌ Error al cargar: {e}")
         return registro()  # Retorna registro vacío si falla
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+def cargar_evoluciones_paciente_db(cedula: int):
+    """
+    Carga las evoluciones guardadas de un paciente.
+    
+    Args:
+        cedula (int): Cédula del paciente
+        
+    Returns:
+        list: Evoluciones del paciente ordenadas por fecha y hora
+    """
+    session = obtener_sesion()
+    
+    try:
+        filas = session.execute(
+            select(
+                EvolucionDB.id,
+                EvolucionDB.fecha,
+                EvolucionDB.hora,
+                EvolucionDB.contenido,
+                EvolucionDB.retraso
+            )
+            .where(EvolucionDB.cedula_paciente == cedula)
+            .order_by(EvolucionDB.fecha, EvolucionDB.hora, EvolucionDB.id)
+        )
+        return [evolucion.guardada(fecha, hora, contenido, retraso, id_db)
+                for id_db, fecha, hora, contenido, retraso in filas]
+    finally:
+        session.close()
+
+def recorrer_evoluciones_db(tamano_lote=1000):
+    """
+    Recorre todas las evoluciones guardadas con una sola consulta.
+    
+    Se leen en lotes de tamano_lote filas y se entregan agrupadas por
+    paciente, así solo hay en memoria las de un paciente a la vez (ver
+    registro_perezoso.recorrer_por_paciente).
+    
+    Args:
+        tamano_lote (int): Filas por lote
+        
+    Yields:
+        tuple: (cedula, lista de evoluciones del paciente ordenadas por fecha)
+    """
+    session = obtener_sesion()
+    
+    try:
+        consulta = (
+            select(
+                EvolucionDB.cedula_paciente,
+                EvolucionDB.id,
+                EvolucionDB.fecha,
+                EvolucionDB.hora,
+                EvolucionDB.contenido,
+                EvolucionDB.retraso
+            )
+            .order_by(EvolucionDB.cedula_paciente, EvolucionDB.fecha, EvolucionDB.hora, EvolucionDB.id)
+            .execution_options(yield_per=tamano_lote)
+        )
+        cedula_actual = None
+        evoluciones = []
+        for cedula, id_db, fecha, hora, contenido, retraso in session.execute(consulta):
+            if cedula != cedula_actual:
+                if evoluciones:
+                    yield cedula_actual, evoluciones
+                cedula_actual = cedula
+                evoluciones = []
+            evoluciones.append(evolucion.guardada(fecha, hora, contenido, retraso, id_db))
+        if evoluciones:
+            yield cedula_actual, evoluciones
+    finally:
+        session.close()
+
+def cargar_directorio_db(capacidad_evoluciones=200000):
+    """
+    Carga el directorio de pacientes y los strikes, sin evoluciones.
+    
+    Las evoluciones de cada paciente se leen al primer acceso (ver
+    registro_perezoso), así el arranque no depende de cuántas evoluciones
+    haya en la base de datos. La cantidad de evoluciones de cada paciente
+    y los totales del registro salen de la misma consulta que el
+    directorio (estadisticas_db.obtener_directorio_db).
+    
+    Args:
+        capacidad_evoluciones (int): Máximo de evoluciones en memoria
+        
+    Returns:
+        registro_perezoso: Registro con el directorio de pacientes
+    """
+    from registro_perezoso import registro_perezoso
+    from estadisticas_db import obtener_directorio_db
+    
+    session = obtener_sesion()
+    
+    try:
+        inicio = time.perf_counter()
+        reg = registro_perezoso(cargar_evoluciones_paciente_db, capacidad_evoluciones,
+                                recorrer_guardadas=recorrer_evoluciones_db)
+        reg.cambios.usar_reservador(reservar_ids_db)
+        
+        totales = dict.fromkeys(("evoluciones", "retraso_dias", "retraso_horas", "retraso_minutos",
+                                 "retraso_total_minutos", "tarde"), 0)
+        for fila in obtener_directorio_db(session):
+            reg.agregar_al_directorio(fila["cedula"], fila["nombre"], fila["apellido"], fila["evoluciones"])
+            for campo in totales:
+                totales[campo] += fila[campo]
+        
+        filas_strikes = session.execute(
+            select(StrikeDB.razon, StrikeDB.fecha, StrikeDB.cedula_paciente).order_by(StrikeDB.id)
+        )
+        strikes_por_razon = {}
+        for razon, fecha, cedula in filas_strikes:
+            reg.strikes.append({
+                "razon": razon,
+                "fecha": str(fecha),
+                "cedula": cedula
+            })
+            strikes_por_razon[razon] = strikes_por_razon.get(razon, 0) + 1
+        
+        # Totales calculados en la BD, para no cargar todas las evoluciones
+        reg.agregados.inicializar(strikes_por_razon=strikes_por_razon, **totales)
+        
+        duracion = time.perf_counter() - inicio
+        print(f"✅ Directorio cargado desde la base de datos ({len(reg.pacientes)} pacientes en {duracion:.2f}s)")
+        logger.info(f"Carga de directorio desde BD: {len(reg.pacientes)} pacientes en {duracion:.2f}s")
+        return reg
+    
+    finally:
+        session.close()
@@ -0,0 +1,298 @@
+"""
+Guardado diferido (write-behind) del registro en la base de datos.
+
+Las rutas web modifican el registro en memoria y solo avisan al escritor.
+Un hilo en segundo plano agrupa esos avisos y guarda los cambios
+pendientes (reg.cambios) en lotes, cada cierto tiempo o al acumular
+suficientes eventos, sin que la petición espere a la base de datos.
+
+Si un guardado falla se reintenta con esperas crecientes. Tras varios
+fallos seguidos los cambios se guardan paciente por paciente y los que
+siguen fallando se apartan a un diario de descartados (un JSON por
+línea), para que un cambio inválido no detenga todos los guardados.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from logger import logger
+
+
+class escritor_diferido:
+    """
+    Hilo que guarda en segundo plano los cambios de un registro.
+
+    Attributes:
+        reg (registro): Registro cuyos cambios se guardan
+        intervalo (float): Segundos máximos entre que llega un evento y se guarda
+        max_eventos (int): Eventos que disparan un guardado inmediato
+        max_cola (int): Eventos que pueden esperar en la cola; al llenarse,
+            notificar() bloquea a quien llama (contrapresión)
+        espera_cola (float): Segundos que notificar() espera si la cola está
+            llena antes de guardar él mismo de forma síncrona
+        max_reintentos (int): Fallos seguidos antes de apartar los cambios
+            que fallan
+        espera_reintento (float): Espera tras el primer fallo; se duplica
+            con cada fallo seguido hasta espera_reintento_max
+        archivo_descartados (str): Diario donde se apartan los cambios que
+            no se pudieron guardar
+    """
+    def __init__(self, reg, guardar=None, intervalo=1.0, max_eventos=50, max_cola=1000, espera_cola=5.0,
+                 max_reintentos=5, espera_reintento=1.0, espera_reintento_max=60.0,
+                 guardar_aislando=None, archivo_descartados="logs/guardado_descartado.jsonl"):
+        """
+        Inicializa el escritor (no arranca el hilo hasta iniciar()).
+
+        Args:
+            reg (registro): Registro cuyos cambios se guardan
+            guardar (callable): Función que guarda reg.cambios; por defecto
+                persistencia_db.guardar_cambios_db
+            intervalo (float): Segundos máximos de espera para guardar
+            max_eventos (int): Eventos que disparan un guardado inmediato
+            max_cola (int): Capacidad de la cola de eventos
+            espera_cola (float): Espera máxima de notificar() con la cola llena
+            max_reintentos (int): Fallos seguidos antes de apartar cambios
+            espera_reintento (float): Segundos de espera tras el primer fallo
+            espera_reintento_max (float): Espera máxima entre reintentos
+            guardar_aislando (callable): Función que guarda los cambios por
+                separado y retorna los que fallaron (lista de dicts); por
+                defecto persistencia_db.guardar_cambios_aislados si tampoco
+                se indicó guardar. Sin ella se reintenta indefinidamente
+            archivo_descartados (str): Diario de cambios descartados
+        """
+        if guardar is None:
+            from persistencia_db import guardar_cambios_db, guardar_cambios_aislados
+            guardar = guardar_cambios_db
+            if guardar_aislando is None:
+                guardar_aislando = guardar_cambios_aislados
+        self.reg = reg
+        self.guardar = guardar
+        self.guardar_aislando = guardar_aislando
+        self.intervalo = intervalo
+        self.max_eventos = max_eventos
+        self.max_cola = max_cola
+        self.espera_cola = espera_cola
+        self.max_reintentos = max_reintentos
+        self.espera_reintento = espera_reintento
+        self.espera_reintento_max = espera_reintento_max
+        self.archivo_descartados = archivo_descartados
+
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._pendiente_desde = None
+        self._eventos_pendientes = 0
+        self.ultimo_guardado = None
+        self.guardados = 0
+        self.errores = 0
+        self.ultimo_error = None
+        self.fallos_seguidos = 0
+        self.descartados = 0
+
+    def iniciar(self):
+        """Arranca el hilo escritor."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="escritor_diferido", daemon=True)
+        self._hilo.start()
+        logger.info("Escritor diferido iniciado")
+
+    def notificar(self, descripcion=""):
+        """
+        Avisa que el registro cambió y debe guardarse.
+
+        Si la cola está llena espera hasta espera_cola segundos; si sigue
+        llena, guarda de forma síncrona para no perder el cambio.
+
+        Args:
+            descripcion (str): Descripción del cambio (para el log)
+        """
+        if self._hilo is None or not self._hilo.is_alive():
+            # Sin hilo en marcha el guardado es síncrono
+            self._guardar([(time.monotonic(), descripcion)])
+            return
+        try:
+            self._cola.put((time.monotonic(), descripcion), timeout=self.espera_cola)
+        except queue.Full:
+            logger.warning("Cola de guardado llena, guardando de forma síncrona")
+            self._guardar([(time.monotonic(), descripcion)])
+
+    def vaciar(self):
+        """Guarda ya todos los eventos en cola y los cambios pendientes."""
+        eventos = self._drenar()
+        self._guardar(eventos)
+
+    def detener(self, timeout=10.0):
+        """
+        Detiene el hilo y guarda lo que quede pendiente.
+        Pensado para registrarse con atexit al cerrar la aplicación.
+
+        Args:
+            timeout (float): Segundos máximos de espera al hilo
+        """
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+        self.vaciar()
+        logger.info("Escritor diferido detenido")
+
+    def estado(self):
+        """
+        Retorna el estado de la cola de guardado.
+
+        Returns:
+            dict: eventos_en_cola, eventos_pendientes, retraso_segundos
+                  (antigüedad del cambio más viejo aún no guardado),
+                  guardados, errores, ultimo_error, ultimo_guardado,
+                  fallos_seguidos y descartados (grupos de cambios
+                  apartados en archivo_descartados)
+        """
+        with self._lock:
+            pendiente_desde = self._pendiente_desde
+            eventos_pendientes = self._eventos_pendientes
+        retraso = 0.0
+        if pendiente_desde is not None:
+            retraso = round(time.monotonic() - pendiente_desde, 3)
+        return {
+            "eventos_en_cola": self._cola.qsize(),
+            "eventos_pendientes": eventos_pendientes + self._cola.qsize(),
+            "retraso_segundos": retraso,
+            "guardados": self.guardados,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+            "ultimo_guardado": self.ultimo_guardado,
+            "fallos_seguidos": self.fallos_seguidos,
+            "descartados": self.descartados,
+        }
+
+    def _ejecutar(self):
+        """
+        Bucle del hilo: agrupa eventos y guarda por tiempo o por cantidad.
+        Tras un fallo no guarda hasta que pase la espera del reintento.
+        """
+        eventos = []
+        reintentar_en = None
+        while not self._detener.is_set():
+            if reintentar_en is not None:
+                limite = reintentar_en
+            elif eventos:
+                limite = eventos[0][0] + self.intervalo
+            else:
+                limite = time.monotonic() + self.intervalo
+            try:
+                evento = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                self._marcar_pendiente(evento[0], 1)
+                if reintentar_en is not None:
+                    # Ya cuenta como pendiente; se guarda con el reintento
+                    continue
+                eventos.append(evento)
+                if len(eventos) < self.max_eventos:
+                    continue
+            except queue.Empty:
+                pass
+            ahora = time.monotonic()
+            if reintentar_en is not None:
+                toca_guardar = ahora >= reintentar_en
+            else:
+                toca_guardar = eventos and (len(eventos) >= self.max_eventos
+                                            or ahora - eventos[0][0] >= self.intervalo)
+            if toca_guardar:
+                if self._guardar(eventos):
+                    eventos = []
+                    reintentar_en = None
+                else:
+                    eventos = [(ahora, "reintento")]
+                    reintentar_en = time.monotonic() + self._espera_tras_fallo()
+        if eventos:
+            self._guardar(eventos)
+
+    def _espera_tras_fallo(self):
+        """Segundos hasta el próximo reintento (se duplican con cada fallo seguido)."""
+        exponente = min(max(self.fallos_seguidos - 1, 0), 30)
+        return min(self.espera_reintento * 2 ** exponente, self.espera_reintento_max)
+
+    def _drenar(self):
+        """Retira todos los eventos que están en la cola."""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self._cola.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def _marcar_pendiente(self, instante, cantidad):
+        """Registra eventos aún no guardados (para calcular el retraso)."""
+        with self._lock:
+            if self._pendiente_desde is None:
+                self._pendiente_desde = instante
+            self._eventos_pendientes += cantidad
+
+    def _guardar(self, eventos):
+        """
+        Guarda los cambios pendientes del registro.
+
+        Returns:
+            bool: True si se guardó, False si falló
+        """
+        try:
+            self.guardar(self.reg)
+        except Exception as e:
+            # Los cambios siguen en reg.cambios y se reintentan después
+            self.errores += 1
+            self.fallos_seguidos += 1
+            self.ultimo_error = str(e)
+            logger.error(f"Error en guardado diferido ({len(eventos)} eventos, "
+                         f"fallo {self.fallos_seguidos}): {e}")
+            if self.fallos_seguidos < self.max_reintentos or not self._apartar_fallidos():
+                return False
+        self.fallos_seguidos = 0
+        with self._lock:
+            self._pendiente_desde = None
+            self._eventos_pendientes = 0
+        self.guardados += 1
+        self.ultimo_guardado = time.strftime("%Y-%m-%d %H:%M:%S")
+        if eventos:
+            logger.info(f"Guardado diferido de {len(eventos)} eventos")
+        return True
+
+    def _apartar_fallidos(self):
+        """
+        Guarda los cambios por separado y aparta los que fallan al diario.
+
+        Returns:
+            bool: True si el resto de los cambios quedó guardado
+        """
+        if self.guardar_aislando is None:
+            return False
+        try:
+            descartados = self.guardar_aislando(self.reg)
+        except Exception as e:
+            logger.error(f"No se pudieron separar los cambios que fallan: {e}")
+            return False
+        if descartados:
+            self._escribir_descartados(descartados)
+        return True
+
+    def _escribir_descartados(self, descartados):
+        """Agrega los cambios descartados al diario (un JSON por línea)."""
+        self.descartados += len(descartados)
+        momento = time.strftime("%Y-%m-%d %H:%M:%S")
+        lineas = [json.dumps(dict(d, momento=momento), ensure_ascii=False, default=str) for d in descartados]
+        try:
+            carpeta = os.path.dirname(self.archivo_descartados)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            with open(self.archivo_descartados, "a", encoding="utf-8") as archivo:
+                archivo.write("\n".join(lineas) + "\n")
+        except OSError as e:
+            # Sin el diario, al menos quedan en el log
+            for linea in lineas:
+                logger.error(f"Cambio descartado (no se pudo escribir el diario: {e}): {linea}")
+            return
+        logger.error(f"{len(descartados)} grupos de cambios apartados en {self.archivo_descartados}")
+        print(f"⚠️ {len(descartados)} grupos de cambios no se pudieron guardar, ver {self.archivo_descartados}")
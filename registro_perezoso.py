@@ -0,0 +1,210 @@
+"""
+Registro con carga perezosa de evoluciones.
+
+Al iniciar solo se carga el directorio de pacientes (cédula, nombre,
+apellido y cantidad de evoluciones). Las evoluciones de un paciente se
+leen la primera vez que se usan y se mantienen en una caché LRU con un
+límite de evoluciones en memoria; al superarlo se descargan las de los
+pacientes usados hace más tiempo (si no tienen cambios sin guardar).
+
+Los índices globales (similitud, fechas, columnas, grafo) y los recuentos
+recorren las evoluciones con recorrer_por_paciente(), que lee las de los
+pacientes no cargados con una sola consulta en lugar de cargarlos uno
+por uno.
+"""
+
+import threading
+from collections import OrderedDict
+from modelos import paciente, registro
+
+
+class paciente_perezoso(paciente):
+    """
+    Paciente cuyas evoluciones se cargan al primer acceso.
+
+    Attributes:
+        conteo_evoluciones (int): Cantidad de evoluciones mientras no están cargadas
+    """
+    __slots__ = ("_reg_perezoso", "_evoluciones", "conteo_evoluciones", "_conteo_en_cache")
+
+    def __init__(self, cedula: int, nombre: str, apellido: str, reg_perezoso, conteo_evoluciones=0):
+        """
+        Inicializa un paciente sin evoluciones cargadas.
+
+        Args:
+            cedula (int): Cédula del paciente
+            nombre (str): Nombre del paciente
+            apellido (str): Apellido del paciente
+            reg_perezoso (registro_perezoso): Registro que carga sus evoluciones
+            conteo_evoluciones (int): Evoluciones guardadas del paciente
+        """
+        super().__init__(cedula, nombre, apellido)
+        self._reg_perezoso = reg_perezoso
+        self._evoluciones = None
+        self.conteo_evoluciones = conteo_evoluciones
+
+    @property
+    def evoluciones(self):
+        """Lista de evoluciones (se cargan al primer acceso)."""
+        if self._evoluciones is None:
+            self._reg_perezoso._cargar(self)
+        else:
+            self._reg_perezoso._tocar(self)
+        return self._evoluciones
+
+    @evoluciones.setter
+    def evoluciones(self, valor):
+        self._evoluciones = valor
+
+    def esta_cargado(self):
+        """Indica si las evoluciones están en memoria."""
+        return self._evoluciones is not None
+
+    def total_evoluciones(self):
+        """Cantidad de evoluciones, sin cargarlas si no están en memoria."""
+        if self._evoluciones is None:
+            return self.conteo_evoluciones
+        return len(self._evoluciones)
+
+
+class registro_perezoso(registro):
+    """
+    Registro que carga las evoluciones de cada paciente bajo demanda.
+
+    Attributes:
+        cargar_evoluciones (callable): Función cedula -> lista de evoluciones
+        recorrer_guardadas (callable): Función sin argumentos que recorre
+            las evoluciones guardadas de todos los pacientes, agrupadas
+            como tuplas (cedula, lista de evoluciones) (None si no hay)
+        capacidad_evoluciones (int): Máximo de evoluciones cargadas en memoria
+        evoluciones_cargadas (int): Evoluciones actualmente en memoria
+    """
+    def __init__(self, cargar_evoluciones, capacidad_evoluciones=200000, recorrer_guardadas=None):
+        """
+        Inicializa un registro perezoso vacío.
+
+        Args:
+            cargar_evoluciones (callable): Función que recibe una cédula y
+                retorna la lista de evoluciones guardadas de ese paciente
+            capacidad_evoluciones (int): Máximo de evoluciones en memoria
+            recorrer_guardadas (callable): Recorrido de todas las evoluciones
+                guardadas (ver recorrer_por_paciente)
+        """
+        super().__init__()
+        self.cargar_evoluciones = cargar_evoluciones
+        self.recorrer_guardadas = recorrer_guardadas
+        self.capacidad_evoluciones = capacidad_evoluciones
+        self.evoluciones_cargadas = 0
+        self._cache = OrderedDict()
+        self._lock_cache = threading.RLock()
+
+    def agregar_al_directorio(self, cedula: int, nombre: str, apellido: str, conteo_evoluciones=0):
+        """
+        Incorpora un paciente guardado sin cargar sus evoluciones.
+
+        Returns:
+            paciente_perezoso: El paciente incorporado
+        """
+        p = paciente_perezoso(cedula, nombre, apellido, self, conteo_evoluciones)
+        self.cargar_paciente(p)
+        return p
+
+    def agregar_paciente(self, p):
+        """Agrega un paciente nuevo (sus evoluciones quedan en memoria)."""
+        super().agregar_paciente(p)
+        if isinstance(p, paciente_perezoso) and p.esta_cargado():
+            self._tocar(p)
+
+    def eliminar_paciente(self, cedula: int):
+        """Elimina un paciente y lo quita de la caché."""
+        super().eliminar_paciente(cedula)
+        with self._lock_cache:
+            p = self._cache.pop(cedula, None)
+            if p is not None:
+                self.evoluciones_cargadas -= len(p._evoluciones)
+
+    def recorrer_por_paciente(self):
+        """
+        Recorre las evoluciones de todos los pacientes sin cargarlos.
+
+        Las de los pacientes cargados se toman de memoria (pueden tener
+        cambios sin guardar); las de los demás salen de recorrer_guardadas,
+        que las lee de una vez y no pasan por la caché. Un paciente no
+        cargado no tiene cambios pendientes, así que lo guardado está al día.
+
+        Yields:
+            tuple: (cedula, lista de evoluciones del paciente)
+        """
+        if self.recorrer_guardadas is None:
+            yield from super().recorrer_por_paciente()
+            return
+        vistos = set()
+        for cedula, guardadas in self.recorrer_guardadas():
+            p = self.pacientes.get(cedula)
+            if p is None:
+                continue
+            vistos.add(cedula)
+            yield cedula, self._evoluciones_actuales(p, guardadas)
+        for cedula, p in list(self.pacientes.items()):
+            if cedula not in vistos:
+                # Sin evoluciones guardadas: solo tiene las que estén en memoria
+                yield cedula, self._evoluciones_actuales(p, [])
+
+    @staticmethod
+    def _evoluciones_actuales(p, guardadas):
+        """Las evoluciones en memoria de p si está cargado, si no guardadas."""
+        evoluciones = p._evoluciones if isinstance(p, paciente_perezoso) else p.evoluciones
+        return guardadas if evoluciones is None else list(evoluciones)
+
+    def _cargar(self, p):
+        """Lee las evoluciones de un paciente y lo pone en la caché."""
+        with self._lock_cache:
+            if p._evoluciones is None:
+                p._evoluciones = list(self.cargar_evoluciones(p.cedula))
+            self._registrar_uso(p)
+        self._aplicar_limite(p.cedula)
+
+    def _tocar(self, p):
+        """Marca un paciente como usado recientemente y aplica el límite."""
+        with self._lock_cache:
+            self._registrar_uso(p)
+        self._aplicar_limite(p.cedula)
+
+    def _registrar_uso(self, p):
+        """Mueve p al final de la caché y actualiza el conteo (con _lock_cache tomado)."""
+        if p.cedula in self._cache:
+            self._cache.move_to_end(p.cedula)
+            anterior = self._cache[p.cedula]._conteo_en_cache
+        else:
+            self._cache[p.cedula] = p
+            anterior = 0
+        p._conteo_en_cache = len(p._evoluciones)
+        self.evoluciones_cargadas += p._conteo_en_cache - anterior
+
+    def _aplicar_limite(self, cedula_actual):
+        """
+        Descarga los pacientes menos usados mientras se supere la capacidad.
+
+        Orden de los locks: primero el de reg.cambios y después _lock_cache
+        (los eventos de cambios leen evoluciones, que toman _lock_cache).
+        Por eso no se llama con _lock_cache tomado.
+        """
+        if self.evoluciones_cargadas <= self.capacidad_evoluciones:
+            return
+        with self.cambios._lock:
+            # Con cambios sin guardar o guardándose, recargar desde la BD
+            # perdería esos cambios (o reviviría evoluciones eliminadas)
+            pendientes = self.cambios.cedulas_pendientes()
+            with self._lock_cache:
+                for cedula in list(self._cache):
+                    if self.evoluciones_cargadas <= self.capacidad_evoluciones:
+                        break
+                    if cedula == cedula_actual or cedula in pendientes:
+                        continue
+                    p = self._cache[cedula]
+                    del self._cache[cedula]
+                    self.evoluciones_cargadas -= p._conteo_en_cache
+                    p.conteo_evoluciones = len(p._evoluciones)
+                    self.cambios.desindexar(p._evoluciones)
+                    p._evoluciones = None
+                    p._descartar_indice()
@@ -0,0 +1,377 @@
+"""
+Similitud por coseno de n-gramas de caracteres (alternativa a difflib).
+
+Cada contenido normalizado se convierte en un vector disperso con los
+n-gramas de caracteres que contiene (presencia, no conteo), con el n-grama
+llevado a una columna por hash (sin vocabulario), y normalizado a largo 1. La similitud de dos textos es
+el producto escalar de sus vectores, así que las de muchos pares salen de
+un producto de matrices dispersas (scipy.sparse).
+
+Los valores no son los de SequenceMatcher: los umbrales de analisis
+(0.80, 0.85, 0.95) se traducen con una calibración que puede recalcularse
+sobre datos propios.
+
+Uso (calibrar los umbrales):
+    python similitud_coseno.py --calibrar
+    python similitud_coseno.py --calibrar --json datos.json --guardar
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import numpy as np
+from scipy import sparse
+from modelos import normalizar_texto
+from indice_evoluciones import indice_contenido, _fecha_iso
+
+TAMANO_NGRAMA = 5
+BITS_DIMENSION = 18
+
+ARCHIVO_CALIBRACION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibracion_coseno.json")
+
+# Umbral de coseno equivalente a cada umbral de SequenceMatcher, calibrado
+# sobre notas sintéticas (recall 99%); se reemplaza con calibracion_coseno.json
+UMBRALES_POR_DEFECTO = {0.80: 0.77, 0.85: 0.82, 0.95: 0.90}
+
+_BASE = np.uint64(1000003)
+_MULTIPLICADOR = np.uint64(0x9E3779B97F4A7C15)
+_lock_creacion = threading.Lock()
+_calibracion = None
+
+
+def _columnas_ngramas(texto, n=TAMANO_NGRAMA, bits=BITS_DIMENSION):
+    """Columna (hash de bits bits) de cada n-grama del texto."""
+    codigos = np.frombuffer(texto.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codigos) == 0:
+        return codigos
+    n = min(n, len(codigos))
+    cantidad = len(codigos) - n + 1
+    h = np.zeros(cantidad, dtype=np.uint64)
+    for k in range(n):
+        h = h * _BASE + codigos[k:k + cantidad]
+    return (h * _MULTIPLICADOR) >> np.uint64(64 - bits)
+
+
+def vector_fila(texto):
+    """
+    Vector de un texto normalizado, como (columnas, valores).
+
+    Returns:
+        tuple: (np.ndarray int32 de columnas ordenadas, np.ndarray float32 de largo 1)
+    """
+    columnas = np.unique(_columnas_ngramas(texto))
+    valores = np.full(len(columnas), 1.0 / np.sqrt(max(len(columnas), 1)), dtype=np.float32)
+    return columnas.astype(np.int32), valores
+
+
+def _matriz(filas):
+    """Matriz CSR a partir de una lista de (columnas, valores)."""
+    punteros = np.zeros(len(filas) + 1, dtype=np.int64)
+    if filas:
+        punteros[1:] = np.cumsum([len(columnas) for columnas, _ in filas])
+        columnas = np.concatenate([c for c, _ in filas])
+        valores = np.concatenate([v for _, v in filas])
+    else:
+        columnas = np.empty(0, dtype=np.int32)
+        valores = np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((valores, columnas, punteros), shape=(len(filas), 2 ** BITS_DIMENSION))
+
+
+def vectorizar(textos):
+    """
+    Matriz dispersa (una fila por texto normalizado) de n-gramas.
+
+    Returns:
+        scipy.sparse.csr_matrix: len(textos) x 2**BITS_DIMENSION
+    """
+    return _matriz([vector_fila(texto) for texto in textos])
+
+
+def pares_similares(textos, umbral):
+    """
+    Pares de textos con similitud coseno >= umbral.
+
+    Args:
+        textos (list): Textos normalizados
+        umbral (float): Umbral de coseno
+
+    Returns:
+        list: Tuplas (i, j, similitud) con i < j, en el orden de un doble
+              recorrido i, j
+    """
+    if len(textos) < 2:
+        return []
+    m = vectorizar(textos)
+    similitudes = (m @ m.T).toarray()
+    filas, columnas = np.triu_indices(len(textos), k=1)
+    valores = similitudes[filas, columnas]
+    seleccion = valores >= umbral
+    return list(zip(filas[seleccion].tolist(), columnas[seleccion].tolist(), valores[seleccion].tolist()))
+
+
+def cargar_calibracion():
+    """
+    Retorna {umbral SequenceMatcher: umbral coseno}.
+
+    Lee ARCHIVO_CALIBRACION si existe; si no, usa UMBRALES_POR_DEFECTO.
+    """
+    global _calibracion
+    if _calibracion is None:
+        calibracion = dict(UMBRALES_POR_DEFECTO)
+        if os.path.exists(ARCHIVO_CALIBRACION):
+            with open(ARCHIVO_CALIBRACION, "r", encoding="utf-8") as f:
+                calibracion = {float(umbral): valor for umbral, valor in json.load(f)["umbrales"].items()}
+        _calibracion = calibracion
+    return _calibracion
+
+
+def umbral_coseno(umbral):
+    """
+    Traduce un umbral de SequenceMatcher a uno de coseno.
+
+    Entre los umbrales calibrados se interpola linealmente (y hacia 0 y 1
+    en los extremos).
+    """
+    calibracion = cargar_calibracion()
+    puntos = sorted(calibracion.items())
+    return float(np.interp(umbral, [0.0] + [u for u, _ in puntos] + [1.0],
+                           [0.0] + [c for _, c in puntos] + [1.0]))
+
+
+class indice_coseno(indice_contenido):
+    """
+    Matriz global de vectores de las evoluciones de un registro.
+
+    Las filas nuevas se acumulan y se incorporan a la matriz por tandas;
+    las eliminadas se marcan como inactivas hasta la siguiente compactación.
+
+    Attributes:
+        max_pendientes (int): Filas nuevas que disparan la reconstrucción
+    """
+    def __init__(self, max_pendientes=256):
+        """Inicializa un índice vacío."""
+        super().__init__()
+        self.max_pendientes = max_pendientes
+        self._filas = []
+        self._claves = []
+        self._posicion = {}
+        self._eliminadas = 0
+        self._matriz = None
+        self._en_matriz = 0
+        self._activas = np.empty(0, dtype=bool)
+        self._cedulas = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._posicion)
+
+    def agregar(self, cedula, fecha, contenido, normalizado=False):
+        """Agrega (o reemplaza) la evolución del paciente en esa fecha."""
+        if not normalizado:
+            contenido = normalizar_texto(contenido)
+        fila = vector_fila(contenido)
+        clave = (cedula, _fecha_iso(fecha))
+        with self._lock:
+            self._quitar_clave(clave)
+            self._posicion[clave] = len(self._filas)
+            self._filas.append(fila)
+            self._claves.append(clave)
+
+    def quitar(self, cedula, fecha):
+        """Quita la evolución del paciente en esa fecha (si está)."""
+        with self._lock:
+            self._quitar_clave((cedula, _fecha_iso(fecha)))
+
+    def quitar_paciente(self, cedula):
+        """Quita todas las evoluciones de un paciente."""
+        with self._lock:
+            for clave in [c for c in self._posicion if c[0] == cedula]:
+                self._quitar_clave(clave)
+
+    def _quitar_clave(self, clave):
+        posicion = self._posicion.pop(clave, None)
+        if posicion is None:
+            return
+        self._filas[posicion] = None
+        self._eliminadas += 1
+        if posicion < self._en_matriz:
+            self._activas[posicion] = False
+
+    def _reconstruir(self):
+        """Descarta las filas eliminadas y arma la matriz con todas las demás."""
+        vigentes = [(clave, fila) for clave, fila in zip(self._claves, self._filas) if fila is not None]
+        self._claves = [clave for clave, _ in vigentes]
+        self._filas = [fila for _, fila in vigentes]
+        self._posicion = {clave: i for i, clave in enumerate(self._claves)}
+        self._eliminadas = 0
+        self._matriz = _matriz(self._filas)
+        self._en_matriz = len(self._filas)
+        self._activas = np.ones(self._en_matriz, dtype=bool)
+        self._cedulas = np.array([clave[0] for clave in self._claves], dtype=np.int64)
+
+    def mas_similar(self, contenido, excluir_cedula=None):
+        """
+        Evolución indexada con mayor similitud coseno a contenido.
+
+        Args:
+            contenido (str): Texto a comparar
+            excluir_cedula (int): Paciente cuyas evoluciones se omiten
+
+        Returns:
+            tuple: (similitud, clave (cedula, fecha ISO)), o (0.0, None)
+        """
+        columnas, valores = vector_fila(normalizar_texto(contenido))
+        consulta = np.zeros(2 ** BITS_DIMENSION, dtype=np.float32)
+        consulta[columnas] = valores
+        with self._lock:
+            pendientes = len(self._filas) - self._en_matriz
+            if pendientes > self.max_pendientes or self._eliminadas > len(self._filas) // 4:
+                self._reconstruir()
+            mejor, mejor_clave = 0.0, None
+            if self._matriz is not None and self._en_matriz:
+                similitudes = self._matriz @ consulta
+                mascara = self._activas.copy()
+                if excluir_cedula is not None:
+                    mascara &= self._cedulas != excluir_cedula
+                similitudes[~mascara] = -1.0
+                i = int(np.argmax(similitudes))
+                if similitudes[i] > mejor:
+                    mejor, mejor_clave = float(similitudes[i]), self._claves[i]
+            for i in range(self._en_matriz, len(self._filas)):
+                fila = self._filas[i]
+                if fila is None or self._claves[i][0] == excluir_cedula:
+                    continue
+                similitud = float(np.dot(consulta[fila[0]], fila[1]))
+                if similitud > mejor:
+                    mejor, mejor_clave = similitud, self._claves[i]
+        return mejor, mejor_clave
+
+
+def obtener_indice(reg):
+    """
+    Retorna el índice coseno del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        indice_coseno: Índice vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.indice_coseno is None:
+            indice = indice_coseno()
+            indice.vincular(reg)
+            reg.indice_coseno = indice
+        return reg.indice_coseno
+
+
+def _pares_calibracion(reg, max_pares, semilla=5):
+    """
+    Pares de textos normalizados para calibrar: los de cada paciente, los
+    casi duplicados entre pacientes (candidatos LSH) y pares al azar.
+    """
+    from similitud_lsh import indice_lsh
+
+    evoluciones = [(p.cedula, ev) for p in reg.pacientes.values() for ev in p.evoluciones]
+    pares = set()
+    for p in reg.pacientes.values():
+        textos = [ev.contenido_normalizado for ev in p.evoluciones]
+        pares.update((textos[i], textos[j]) for i in range(len(textos)) for j in range(i + 1, len(textos)))
+    indice = indice_lsh()
+    indice.vincular(reg)
+    for cedula, ev in evoluciones:
+        for otro, ev_otro in indice.resolver(indice.candidatos(ev.contenido, cedula)):
+            pares.add((ev.contenido_normalizado, ev_otro.contenido_normalizado))
+    reg.cambios.desuscribir(indice.aplicar_evento)
+    aleatorio = random.Random(semilla)
+    for _ in range(min(len(pares), max_pares // 4)):
+        (_, a), (_, b) = aleatorio.sample(evoluciones, 2)
+        pares.add((a.contenido_normalizado, b.contenido_normalizado))
+    pares = sorted(pares)
+    aleatorio.shuffle(pares)
+    return pares[:max_pares]
+
+
+def calibrar(reg, umbrales=(0.80, 0.85, 0.95), recall=0.99, max_pares=50000):
+    """
+    Calcula el umbral de coseno equivalente a cada umbral de SequenceMatcher.
+
+    Para cada umbral toma los pares con SequenceMatcher >= umbral y elige el
+    mayor umbral de coseno que conserva al menos recall de ellos.
+
+    Args:
+        reg (registro): Registro con las evoluciones de referencia
+        umbrales (tuple): Umbrales de SequenceMatcher a traducir
+        recall (float): Fracción de pares similares que debe conservarse
+        max_pares (int): Máximo de pares a comparar
+
+    Returns:
+        dict: {umbral: {"coseno", "precision", "pares_similares"}}
+    """
+    from difflib import SequenceMatcher
+
+    pares = _pares_calibracion(reg, max_pares)
+    ratios = np.array([SequenceMatcher(None, a, b).ratio() for a, b in pares])
+    cosenos = np.empty(len(pares))
+    for inicio in range(0, len(pares), 1000):
+        lote = pares[inicio:inicio + 1000]
+        m1 = vectorizar([a for a, _ in lote])
+        m2 = vectorizar([b for _, b in lote])
+        cosenos[inicio:inicio + len(lote)] = np.asarray(m1.multiply(m2).sum(axis=1)).ravel()
+
+    resultado = {}
+    for umbral in umbrales:
+        positivos = cosenos[ratios >= umbral]
+        if len(positivos) == 0:
+            continue
+        coseno = float(np.floor(np.quantile(positivos, 1 - recall, method="lower") * 100) / 100)
+        seleccionados = cosenos >= coseno
+        resultado[umbral] = {
+            "coseno": coseno,
+            "precision": float((ratios[seleccionados] >= umbral).mean()),
+            "pares_similares": int(len(positivos)),
+        }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calibrar", action="store_true", help="Calcular los umbrales equivalentes")
+    parser.add_argument("--json", help="Calibrar con un archivo JSON del registro")
+    parser.add_argument("--bd", action="store_true", help="Calibrar con la base de datos")
+    parser.add_argument("--recall", type=float, default=0.99)
+    parser.add_argument("--pares", type=int, default=50000, help="Máximo de pares a comparar")
+    parser.add_argument("--guardar", action="store_true", help=f"Escribir {os.path.basename(ARCHIVO_CALIBRACION)}")
+    args = parser.parse_args()
+    if not args.calibrar:
+        parser.print_help()
+        return
+
+    if args.json:
+        from modelos import registro
+        with open(args.json, "r", encoding="utf-8") as f:
+            reg = registro.importar_clase(json.load(f))
+    elif args.bd:
+        from persistencia_db import cargar_registro_db
+        reg = cargar_registro_db()
+    else:
+        from benchmarks.bench_similitud_global import generar_registro_similitud
+        reg = generar_registro_similitud(100, 20, tasa_copias=0.2)
+
+    resultado = calibrar(reg, recall=args.recall, max_pares=args.pares)
+    if not resultado:
+        print("❌ No hay pares similares para calibrar")
+        return
+    print(f"\n{'SequenceMatcher':<17}{'Coseno':>8}{'Precisión':>11}{'Pares':>8}")
+    for umbral, datos in resultado.items():
+        print(f"{umbral:<17}{datos['coseno']:>8.2f}{datos['precision']:>11.1%}{datos['pares_similares']:>8}")
+    if args.guardar:
+        with open(ARCHIVO_CALIBRACION, "w", encoding="utf-8") as f:
+            json.dump({"recall": args.recall,
+                       "umbrales": {str(u): d["coseno"] for u, d in resultado.items()}}, f, indent=4)
+        print(f"✅ Calibración guardada en {ARCHIVO_CALIBRACION}")
+
+
+if __name__ == "__main__":
+    main()
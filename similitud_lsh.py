@@ -0,0 +1,255 @@
+"""
+Índice LSH (MinHash con bandas) para buscar evoluciones casi duplicadas.
+
+verificar_similitud_global compara una evolución nueva con las de todos
+los demás pacientes. En lugar de calcular SequenceMatcher contra todas, el
+índice devuelve solo las candidatas que comparten alguna banda de su firma
+MinHash (calculada sobre los shingles de caracteres del contenido), y solo
+a esas se les calcula la similitud exacta.
+
+El índice se construye la primera vez que se usa y se mantiene al día con
+los eventos de reg.cambios (evoluciones agregadas, editadas y eliminadas,
+pacientes agregados y eliminados). Con persistencia JSON se guarda en el
+snapshot (diario_json), así al recuperar no se recalculan las firmas. Con
+la base de datos cada proceso lo arma en el primer uso, leyendo todas las
+evoluciones con una sola consulta (registro.recorrer_por_paciente, sin
+cargar los pacientes de un registro_perezoso); las firmas se recalculan
+en ese momento.
+"""
+
+import base64
+import hashlib
+import threading
+import zlib
+import numpy as np
+from modelos import normalizar_texto
+from indice_evoluciones import indice_contenido, _fecha_iso
+
+_lock_creacion = threading.Lock()
+
+# Primo mayor que 2**32 para las permutaciones (a*x + b) % PRIMO
+_PRIMO = np.uint64(4294967311)
+
+
+class indice_lsh(indice_contenido):
+    """
+    Índice de firmas MinHash agrupadas en bandas.
+
+    Dos textos cuya similitud de Jaccard (sobre shingles) es s comparten al menos una
+    banda con probabilidad 1 - (1 - s**filas)**bandas. Con los valores
+    por defecto un par con Jaccard 0.7 (una similitud SequenceMatcher de
+    alrededor de 0.87 en notas clínicas) es candidato con probabilidad
+    0.98, y uno con Jaccard 0.3 con probabilidad 0.02.
+
+    Attributes:
+        tamano_shingle (int): Caracteres por shingle
+        bandas (int): Cantidad de bandas de la firma
+        filas (int): Valores de la firma por banda
+    """
+    def __init__(self, tamano_shingle=4, bandas=32, filas=6, semilla=1):
+        """
+        Inicializa un índice vacío.
+
+        Args:
+            tamano_shingle (int): Caracteres por shingle
+            bandas (int): Cantidad de bandas
+            filas (int): Valores de la firma por banda (la firma mide bandas*filas)
+            semilla (int): Semilla de las funciones de hash
+        """
+        self.tamano_shingle = tamano_shingle
+        self.bandas = bandas
+        self.filas = filas
+        self.semilla = semilla
+        generador = np.random.default_rng(semilla)
+        # a < 2**31 y x < 2**32: a*x + b no desborda uint64
+        self._a = generador.integers(1, 2**31, size=bandas * filas, dtype=np.uint64)
+        self._b = generador.integers(0, 2**31, size=bandas * filas, dtype=np.uint64)
+        super().__init__()
+        self._cubetas = {}
+        self._bandas_por_clave = {}
+        self._claves_por_cedula = {}
+
+    def __len__(self):
+        return len(self._bandas_por_clave)
+
+    def firma(self, texto):
+        """
+        Calcula la firma MinHash de un texto ya normalizado.
+
+        Returns:
+            np.ndarray: bandas*filas valores (uint64)
+        """
+        k = self.tamano_shingle
+        if len(texto) <= k:
+            shingles = {texto}
+        else:
+            shingles = {texto[i:i + k] for i in range(len(texto) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIMO).min(axis=1)
+
+    def _claves_bandas(self, firma):
+        """Una clave por banda: (número de banda, hash de 64 bits de sus valores)."""
+        return [(i, int.from_bytes(hashlib.blake2b(firma[i * self.filas:(i + 1) * self.filas].tobytes(),
+                                                   digest_size=8).digest(), "little"))
+                for i in range(self.bandas)]
+
+    def agregar(self, cedula, fecha, contenido, normalizado=False):
+        """
+        Agrega (o reemplaza) la evolución del paciente en esa fecha.
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución
+            contenido (str): Contenido de la evolución
+            normalizado (bool): contenido ya pasó por normalizar_texto
+        """
+        clave = (cedula, _fecha_iso(fecha))
+        if not normalizado:
+            contenido = normalizar_texto(contenido)
+        bandas = self._claves_bandas(self.firma(contenido))
+        with self._lock:
+            self._quitar_clave(clave)
+            for banda in bandas:
+                self._cubetas.setdefault(banda, set()).add(clave)
+            self._bandas_por_clave[clave] = bandas
+            self._claves_por_cedula.setdefault(cedula, set()).add(clave)
+
+    def quitar(self, cedula, fecha):
+        """Quita la evolución del paciente en esa fecha (si está)."""
+        with self._lock:
+            self._quitar_clave((cedula, _fecha_iso(fecha)))
+
+    def quitar_paciente(self, cedula):
+        """Quita todas las evoluciones de un paciente."""
+        with self._lock:
+            for clave in list(self._claves_por_cedula.get(cedula, ())):
+                self._quitar_clave(clave)
+
+    def _quitar_clave(self, clave):
+        bandas = self._bandas_por_clave.pop(clave, None)
+        if bandas is None:
+            return
+        for banda in bandas:
+            cubeta = self._cubetas.get(banda)
+            if cubeta is not None:
+                cubeta.discard(clave)
+                if not cubeta:
+                    del self._cubetas[banda]
+        claves = self._claves_por_cedula.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._claves_por_cedula[clave[0]]
+
+    def vincular(self, reg, reconstruir=True):
+        """
+        Sigue los cambios de reg.
+
+        Args:
+            reg (registro): Registro a seguir
+            reconstruir (bool): Indexar todas las evoluciones. Si es False
+                (índice importado) solo se reindexa si no coincide con las
+                evoluciones de reg
+        """
+        if not reconstruir:
+            claves = {(cedula, ev.fecha.isoformat())
+                      for cedula, evoluciones in reg.recorrer_por_paciente() for ev in evoluciones}
+            reconstruir = claves != set(self._bandas_por_clave)
+        if reconstruir:
+            with self._lock:
+                self._cubetas.clear()
+                self._bandas_por_clave.clear()
+                self._claves_por_cedula.clear()
+            super().vincular(reg)
+            return
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            reg.cambios.suscribir(self.aplicar_evento)
+
+    def exportar(self):
+        """
+        Convierte el índice a un dict serializable en JSON.
+
+        Returns:
+            dict: Parámetros y bandas de cada evolución (base64 de los hashes)
+        """
+        with self._lock:
+            evoluciones = [
+                [cedula, fecha, base64.b64encode(
+                    np.array([valor for _, valor in bandas], dtype=np.uint64).tobytes()).decode("ascii")]
+                for (cedula, fecha), bandas in self._bandas_por_clave.items()
+            ]
+        return {"tamano_shingle": self.tamano_shingle, "bandas": self.bandas, "filas": self.filas,
+                "semilla": self.semilla, "evoluciones": evoluciones}
+
+    @classmethod
+    def importar(cls, datos):
+        """
+        Crea un índice desde exportar() (sin registro vinculado).
+
+        Args:
+            datos (dict): Datos exportados
+
+        Returns:
+            indice_lsh: Índice para vincular con vincular(reg, reconstruir=False)
+        """
+        indice = cls(datos["tamano_shingle"], datos["bandas"], datos["filas"], datos["semilla"])
+        for cedula, fecha, codificadas in datos["evoluciones"]:
+            valores = np.frombuffer(base64.b64decode(codificadas), dtype=np.uint64)
+            clave = (cedula, fecha)
+            bandas = [(i, int(valor)) for i, valor in enumerate(valores)]
+            for banda in bandas:
+                indice._cubetas.setdefault(banda, set()).add(clave)
+            indice._bandas_por_clave[clave] = bandas
+            indice._claves_por_cedula.setdefault(cedula, set()).add(clave)
+        return indice
+
+    def candidatos(self, contenido, excluir_cedula=None):
+        """
+        Retorna las evoluciones que comparten al menos una banda con contenido.
+
+        Args:
+            contenido (str): Texto a buscar
+            excluir_cedula (int): Paciente cuyas evoluciones se omiten
+
+        Returns:
+            set: Claves (cedula, fecha ISO) de las candidatas
+        """
+        bandas = self._claves_bandas(self.firma(normalizar_texto(contenido)))
+        encontrados = set()
+        with self._lock:
+            for banda in bandas:
+                encontrados.update(self._cubetas.get(banda, ()))
+        if excluir_cedula is not None:
+            encontrados = {clave for clave in encontrados if clave[0] != excluir_cedula}
+        return encontrados
+
+    def evoluciones_candidatas(self, contenido, excluir_cedula=None):
+        """
+        Resuelve las candidatas a objetos del registro vinculado.
+
+        Returns:
+            list: Tuplas (paciente, evolucion)
+        """
+        return self.resolver(self.candidatos(contenido, excluir_cedula))
+
+
+def obtener_indice(reg):
+    """
+    Retorna el índice LSH del registro, creándolo en el primer uso.
+
+    Args:
+        reg (registro): Registro del sistema
+
+    Returns:
+        indice_lsh: Índice vinculado a reg
+    """
+    with _lock_creacion:
+        if reg.indice_lsh is None:
+            indice = indice_lsh()
+            indice.vincular(reg)
+            reg.indice_lsh = indice
+        return reg.indice_lsh
@@ -0,0 +1,361 @@
+"""
+Similitudes entre evoluciones guardadas entre ejecuciones.
+
+Los reportes de similitud comparan todos los pares de evoluciones de cada
+paciente. Sin guardar los resultados, cada reinicio (y cada worker de
+gunicorn) los vuelve a calcular. Un almacén lee las similitudes guardadas
+(tabla similitudes o similitudes.json), analisis las usa en lugar de
+recalcular y al terminar cada reporte escribe en bloque las nuevas.
+
+Cada fila lleva el hash del contenido de las dos evoluciones y la versión
+del algoritmo: si el contenido cambió (o el algoritmo) la fila se ignora.
+Además las filas de una evolución editada o eliminada se borran al recibir
+el evento de reg.cambios.
+
+Por ahora solo se guardan pares del mismo paciente (los de los reportes).
+
+Uso (precalcular todas las similitudes fuera de horario):
+    python similitudes_guardadas.py --calentar --bd
+    python similitudes_guardadas.py --calentar --json datos.json --salida similitudes.json
+"""
+
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from datetime import date
+from modelos import hash_texto
+from logger import logger
+
+# Cambiarla si cambia el cálculo (normalización o SequenceMatcher), así
+# las similitudes guardadas con el anterior se ignoran
+VERSION_ALGORITMO = 1
+
+
+def hash_par(hash1, hash2):
+    """Hash que resume el contenido de las dos evoluciones de un par."""
+    return hash_texto(hash1 + hash2)
+
+
+class almacen_similitudes(ABC):
+    """
+    Base de los almacenes de similitudes, con las filas leídas en memoria.
+
+    Las subclases implementan _leer() y _escribir() (una subclase que no
+    los implementa no se puede instanciar).
+
+    Attributes:
+        lee_todo (bool): _leer() retorna siempre todas las filas
+        reg (registro): Registro cuyos cambios invalidan filas
+    """
+    lee_todo = False
+
+    def __init__(self):
+        """Inicializa un almacén sin filas leídas."""
+        self._lock = threading.RLock()
+        # cedula 1 -> {(fecha 1, cedula 2, fecha 2): (hash, similitud)}
+        self._filas = {}
+        self._cedulas_leidas = set()
+        self._todas_leidas = False
+        # Pendientes de escribir
+        self._nuevas = {}
+        self._invalidadas = set()
+        self.reg = None
+
+    @abstractmethod
+    def _leer(self, cedulas):
+        """
+        Lee filas de la versión actual.
+
+        Args:
+            cedulas (list o None): Pacientes a leer (None: todos)
+
+        Returns:
+            iterable: Tuplas (cedula 1, fecha 1, cedula 2, fecha 2, hash, similitud)
+                      con fechas ISO
+        """
+
+    @abstractmethod
+    def _escribir(self, nuevas, invalidadas):
+        """
+        Escribe las filas nuevas y borra las invalidadas.
+
+        Args:
+            nuevas (dict): (cedula 1, fecha 1, cedula 2, fecha 2) -> (hash, similitud)
+            invalidadas (set): Evoluciones (cedula, fecha ISO) cuyas filas se
+                borran; fecha None borra todas las del paciente
+        """
+
+    def vincular(self, reg):
+        """Invalida filas con los eventos de reg.cambios."""
+        with self._lock:
+            if self.reg is not None:
+                self.reg.cambios.desuscribir(self.aplicar_evento)
+            self.reg = reg
+            reg.cambios.suscribir(self.aplicar_evento)
+
+    def cargar(self, cedulas=None):
+        """
+        Lee (una sola vez) las filas de esos pacientes.
+
+        Args:
+            cedulas (list o None): Pacientes (None: todos)
+        """
+        with self._lock:
+            if self._todas_leidas:
+                return
+            if cedulas is not None:
+                cedulas = [c for c in cedulas if c not in self._cedulas_leidas]
+                if not cedulas:
+                    return
+            for cedula1, fecha1, cedula2, fecha2, hash_contenido, similitud in self._leer(cedulas):
+                # Lo que ya está en memoria es igual o más nuevo
+                self._filas.setdefault(cedula1, {}).setdefault((fecha1, cedula2, fecha2), (hash_contenido, similitud))
+            if cedulas is None or self.lee_todo:
+                self._todas_leidas = True
+            else:
+                self._cedulas_leidas.update(cedulas)
+
+    def guardadas(self, cedula):
+        """
+        Similitudes guardadas entre evoluciones de un paciente.
+
+        Returns:
+            dict: (fecha 1 ISO, fecha 2 ISO) -> (hash, similitud)
+        """
+        self.cargar([cedula])
+        with self._lock:
+            return {(fecha1, fecha2): valor
+                    for (fecha1, cedula2, fecha2), valor in self._filas.get(cedula, {}).items()
+                    if cedula2 == cedula}
+
+    def agregar(self, cedula, nuevas):
+        """
+        Agrega similitudes calculadas entre evoluciones de un paciente.
+
+        Args:
+            cedula (int): Cédula del paciente
+            nuevas (list): Tuplas (fecha 1 ISO, fecha 2 ISO, hash, similitud)
+        """
+        if not nuevas:
+            return
+        with self._lock:
+            filas = self._filas.setdefault(cedula, {})
+            for fecha1, fecha2, hash_contenido, similitud in nuevas:
+                filas[(fecha1, cedula, fecha2)] = (hash_contenido, similitud)
+                self._nuevas[(cedula, fecha1, cedula, fecha2)] = (hash_contenido, similitud)
+
+    def invalidar(self, cedula, fecha=None):
+        """
+        Borra las filas de una evolución (o de todo el paciente si fecha es None).
+
+        Args:
+            cedula (int): Cédula del paciente
+            fecha (date o str): Fecha de la evolución
+        """
+        if isinstance(fecha, date):
+            fecha = fecha.isoformat()
+        with self._lock:
+            if fecha is None:
+                self._filas.pop(cedula, None)
+            else:
+                filas = self._filas.get(cedula, {})
+                for clave in [c for c in filas if c[0] == fecha or c[2] == fecha]:
+                    del filas[clave]
+            for clave in [c for c in self._nuevas if c[0] == cedula and fecha in (None, c[1], c[3])]:
+                del self._nuevas[clave]
+            self._invalidadas.add((cedula, fecha))
+
+    def aplicar_evento(self, evento):
+        """Invalida las filas afectadas por un evento de control_cambios."""
+        tipo = evento["tipo"]
+        if tipo == "evolucion_modificada":
+            self.invalidar(evento["cedula"], evento["fecha_anterior"])
+            self.invalidar(evento["cedula"], evento["evolucion"]["fecha"])
+        elif tipo == "evolucion_eliminada":
+            self.invalidar(evento["cedula"], evento["fecha"])
+        elif tipo == "paciente_eliminado":
+            self.invalidar(evento["cedula"])
+
+    def pendientes(self):
+        """Cantidad de filas nuevas sin escribir."""
+        return len(self._nuevas)
+
+    def guardar(self):
+        """
+        Escribe en bloque las filas nuevas y las invalidaciones pendientes.
+
+        Un error se registra en el log sin propagarse: lo único que se
+        pierde es trabajo que se volverá a calcular.
+        """
+        with self._lock:
+            if not self._nuevas and not self._invalidadas:
+                return
+            nuevas, self._nuevas = self._nuevas, {}
+            invalidadas, self._invalidadas = self._invalidadas, set()
+            try:
+                self._escribir(nuevas, invalidadas)
+            except Exception as e:
+                print(f"⚠️ No se pudieron guardar las similitudes calculadas: {e}")
+                logger.error(f"Error al guardar similitudes: {e}")
+
+
+class almacen_similitudes_json(almacen_similitudes):
+    """
+    Almacén en un archivo JSON (ver archivos.guardar_similitudes_json).
+
+    Attributes:
+        archivo (str): Ruta del archivo
+    """
+    lee_todo = True
+
+    def __init__(self, archivo="similitudes.json"):
+        """
+        Args:
+            archivo (str): Ruta del archivo
+        """
+        super().__init__()
+        self.archivo = archivo
+
+    def _leer(self, cedulas):
+        from archivos import cargar_similitudes_json
+        return cargar_similitudes_json(VERSION_ALGORITMO, self.archivo)
+
+    def _escribir(self, nuevas, invalidadas):
+        # El archivo se reescribe completo con lo que hay en memoria (las
+        # invalidaciones ya se aplicaron ahí)
+        from archivos import guardar_similitudes_json
+        self.cargar()
+        filas = [[cedula1, fecha1, cedula2, fecha2, hash_contenido, similitud]
+                 for cedula1, filas_paciente in self._filas.items()
+                 for (fecha1, cedula2, fecha2), (hash_contenido, similitud) in filas_paciente.items()]
+        guardar_similitudes_json(filas, VERSION_ALGORITMO, self.archivo)
+
+
+class almacen_similitudes_db(almacen_similitudes):
+    """Almacén en la tabla similitudes (modelos_db.SimilitudDB)."""
+
+    def _leer(self, cedulas):
+        from sqlalchemy import select
+        from modelos_db import SimilitudDB, obtener_sesion
+        columnas = (SimilitudDB.cedula_1, SimilitudDB.fecha_1, SimilitudDB.cedula_2, SimilitudDB.fecha_2,
+                    SimilitudDB.hash_contenido, SimilitudDB.similitud)
+        consulta = select(*columnas).where(SimilitudDB.version == VERSION_ALGORITMO)
+        with obtener_sesion() as session:
+            if cedulas is None:
+                resultados = session.execute(consulta).all()
+            else:
+                resultados = []
+                for inicio in range(0, len(cedulas), 500):
+                    lote = cedulas[inicio:inicio + 500]
+                    resultados.extend(session.execute(consulta.where(SimilitudDB.cedula_1.in_(lote))).all())
+        return [(c1, f1.isoformat(), c2, f2.isoformat(), h, s) for c1, f1, c2, f2, h, s in resultados]
+
+    def _escribir(self, nuevas, invalidadas):
+        from sqlalchemy import delete, insert, and_, or_, bindparam
+        from modelos_db import SimilitudDB, obtener_sesion
+        with obtener_sesion() as session:
+            for cedula, fecha in invalidadas:
+                if fecha is None:
+                    condicion = or_(SimilitudDB.cedula_1 == cedula, SimilitudDB.cedula_2 == cedula)
+                else:
+                    fecha = date.fromisoformat(fecha)
+                    condicion = or_(and_(SimilitudDB.cedula_1 == cedula, SimilitudDB.fecha_1 == fecha),
+                                    and_(SimilitudDB.cedula_2 == cedula, SimilitudDB.fecha_2 == fecha))
+                session.execute(delete(SimilitudDB).where(condicion))
+            if nuevas:
+                filas = [{"c1": c1, "f1": date.fromisoformat(f1), "c2": c2, "f2": date.fromisoformat(f2),
+                          "hash_contenido": h, "similitud": s, "version": VERSION_ALGORITMO}
+                         for (c1, f1, c2, f2), (h, s) in nuevas.items()]
+                # Reemplazo portable (PostgreSQL y SQLite): borrar y volver a insertar
+                session.connection().execute(
+                    delete(SimilitudDB).where(
+                        SimilitudDB.cedula_1 == bindparam("c1"), SimilitudDB.fecha_1 == bindparam("f1"),
+                        SimilitudDB.cedula_2 == bindparam("c2"), SimilitudDB.fecha_2 == bindparam("f2")),
+                    filas
+                )
+                session.connection().execute(
+                    insert(SimilitudDB).values(
+                        cedula_1=bindparam("c1"), fecha_1=bindparam("f1"),
+                        cedula_2=bindparam("c2"), fecha_2=bindparam("f2")),
+                    filas
+                )
+            session.commit()
+
+
+def usar_almacen(reg, almacen):
+    """
+    Hace que los reportes de similitud de reg lean y guarden en almacen.
+
+    Args:
+        reg (registro): Registro del sistema
+        almacen (almacen_similitudes): Almacén a usar
+    """
+    almacen.vincular(reg)
+    reg.similitudes_guardadas = almacen
+
+
+def calentar(reg, almacen, progreso=None, guardar_cada=200):
+    """
+    Calcula y guarda la similitud de todos los pares de cada paciente.
+
+    Sin cotas: quedan guardadas también las similitudes bajas, así los
+    reportes posteriores no comparan nada. Los pares ya guardados con el
+    contenido actual se saltean.
+
+    Args:
+        reg (registro): Registro con las evoluciones
+        almacen (almacen_similitudes): Almacén donde guardar
+        progreso (callable): Función (pacientes_hechos, total_pacientes)
+        guardar_cada (int): Pacientes entre cada escritura
+
+    Returns:
+        int: Similitudes calculadas
+    """
+    from analisis import _pares_similares, _compactar_evoluciones
+
+    pacientes = list(reg.pacientes.values())
+    almacen.cargar()
+    calculadas = 0
+    for hechos, p in enumerate(pacientes, 1):
+        nuevas = []
+        _pares_similares(_compactar_evoluciones(p), 0.0, almacen.guardadas(p.cedula), nuevas)
+        almacen.agregar(p.cedula, nuevas)
+        calculadas += len(nuevas)
+        if hechos % guardar_cada == 0:
+            almacen.guardar()
+        if progreso is not None:
+            progreso(hechos, len(pacientes))
+    almacen.guardar()
+    return calculadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calentar", action="store_true", help="Calcular y guardar todas las similitudes")
+    parser.add_argument("--json", help="Registro en un archivo JSON (con su diario)")
+    parser.add_argument("--salida", default="similitudes.json", help="Archivo de similitudes (con --json)")
+    parser.add_argument("--bd", action="store_true", help="Registro y similitudes en la base de datos")
+    args = parser.parse_args()
+    if not args.calentar or bool(args.json) == args.bd:
+        parser.print_help()
+        return
+
+    from analisis import mostrar_progreso
+    if args.bd:
+        from crear_db import migrar
+        from persistencia_db import cargar_registro_db
+        migrar()
+        reg = cargar_registro_db()
+        almacen = almacen_similitudes_db()
+    else:
+        from diario_json import almacen_json
+        diario = almacen_json(args.json)
+        reg = diario.recuperar()
+        diario.cerrar()
+        almacen = almacen_similitudes_json(args.salida)
+    calculadas = calentar(reg, almacen, progreso=mostrar_progreso)
+    print(f"✅ {calculadas} similitudes calculadas y guardadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Fixtures compartidas de las pruebas."""
+
+import pytest
+
+import modelos_db
+
+
+@pytest.fixture
+def db_sqlite(tmp_path, monkeypatch):
+    """
+    Base de datos SQLite vacía en un directorio temporal, usada como la
+    base de la aplicación mientras dure la prueba.
+
+    Returns:
+        Engine: Engine de la base temporal
+    """
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'evoluciones.db'}")
+    monkeypatch.setattr(modelos_db, "_engine", None)
+    engine = modelos_db.obtener_engine()
+    modelos_db.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+    modelos_db._engine = None
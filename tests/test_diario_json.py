@@ -0,0 +1,65 @@
+"""
+Pruebas del diario JSON: un diario inactivo se sincroniza dentro de
+intervalo_sincronizacion y el oyente de cambios no compacta.
+"""
+
+import threading
+import time
+
+import diario_json
+from diario_json import almacen_json
+from modelos import registro, paciente
+
+
+def test_diario_inactivo_se_sincroniza_dentro_del_intervalo(tmp_path, monkeypatch):
+    fsyncs = []
+    fsync = diario_json.os.fsync
+    monkeypatch.setattr(diario_json.os, "fsync", lambda fd: fsyncs.append(fd) or fsync(fd))
+    almacen = almacen_json(str(tmp_path / "datos.json"), sincronizar_cada=1000,
+                           intervalo_sincronizacion=0.1, max_entradas_diario=0)
+    reg = almacen.recuperar()
+    try:
+        reg.agregar_paciente(paciente(1, "Ana", "Pérez"))
+        assert almacen._sin_sincronizar == 1
+        limite = time.monotonic() + 2
+        while almacen._sin_sincronizar and time.monotonic() < limite:
+            time.sleep(0.02)
+        assert almacen._sin_sincronizar == 0
+        assert fsyncs
+    finally:
+        almacen.cerrar()
+    assert almacen._hilo is None
+
+
+def _lock_libre(lock):
+    """True si otro hilo puede tomar el lock en este momento."""
+    libre = []
+
+    def probar():
+        if lock.acquire(blocking=False):
+            libre.append(True)
+            lock.release()
+
+    hilo = threading.Thread(target=probar)
+    hilo.start()
+    hilo.join()
+    return bool(libre)
+
+
+def test_compactar_fuera_del_oyente(tmp_path):
+    archivo = str(tmp_path / "datos.json")
+    almacen = almacen_json(archivo, max_entradas_diario=2)
+    reg = almacen.recuperar()
+    compactaciones = []
+    compactar = almacen.compactar
+    almacen.compactar = lambda: compactaciones.append(_lock_libre(reg.cambios._lock)) or compactar()
+    reg.agregar_paciente(paciente(1, "Ana", "Pérez"))
+    reg.agregar_paciente(paciente(2, "Luis", "Gómez"))
+    assert compactaciones == []
+    assert almacen.compactar_si_hace_falta()
+    assert compactaciones == [True]
+    assert not almacen.compactar_si_hace_falta()
+    almacen.cerrar()
+
+    recuperado = almacen_json(archivo).recuperar()
+    assert sorted(recuperado.pacientes) == [1, 2]
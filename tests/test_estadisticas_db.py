@@ -0,0 +1,42 @@
+"""
+Pruebas de las estadísticas calculadas en la base de datos: coinciden con
+el recorrido en memoria y con los totales que arma el directorio.
+"""
+
+from datetime import date, time, timedelta
+
+from modelos import registro, paciente, evolucion, agregados_registro
+from estadisticas_db import comparar_con_memoria
+from persistencia_db import guardar_registro_db, cargar_directorio_db, cargar_registro_db
+
+
+def _registro():
+    reg = registro()
+    for cedula in range(1, 8):
+        p = paciente(cedula, "Ana", "Pérez")
+        for dia in range(cedula % 4):
+            # Retrasos en minutos: de 0 a más de un día
+            p.evoluciones.append(evolucion.guardada(
+                date(2025, 1, 1) + timedelta(days=dia), time(9 + dia),
+                f"Paciente {cedula}, día {dia}", dia * 1440 + cedula * 67))
+        reg.agregar_paciente(p)
+    reg.agregar_strike("Evolución similar", "2025-01-02", 1)
+    reg.agregar_strike("Evolución similar", "2025-01-03", 2)
+    reg.agregar_strike("Retraso", "2025-01-03", 3)
+    return reg
+
+
+def test_estadisticas_db_coinciden_con_memoria(db_sqlite):
+    reg = _registro()
+    guardar_registro_db(reg)
+    assert comparar_con_memoria(reg) == {}
+    assert comparar_con_memoria(cargar_registro_db()) == {}
+
+
+def test_directorio_coincide_con_recuento(db_sqlite):
+    guardar_registro_db(_registro())
+    reg = cargar_directorio_db()
+    recontados = agregados_registro()
+    recontados.recontar(reg)
+    assert reg.obtener_agregados().como_dict() == recontados.como_dict()
+    assert comparar_con_memoria(reg) == {}
@@ -0,0 +1,156 @@
+"""
+Pruebas de indices_registro: los índices dan lo mismo que recorrer todo el
+registro después de agregar, editar y eliminar, y las búsquedas no pasan
+por todas las filas (las cotas de complejidad de los docstrings).
+"""
+
+import math
+import random
+from datetime import date, time, timedelta
+
+import pytest
+
+from modelos import registro, paciente, evolucion
+from indices_registro import obtener_indice_nombres, obtener_indice_fechas, normalizar_nombre
+
+NOMBRES = ["Ana", "Andrés", "José", "Josefina", "María", "Mario", "Lucía", "Luis", "Ñusta", "Óscar"]
+INICIO = date(2025, 1, 1)
+
+
+def _contenido(cedula, dia):
+    return f"Evolución del paciente {cedula} del día {dia}: estable, sin cambios en el tratamiento."
+
+
+def _registro(pacientes=60, dias=20, semilla=3):
+    aleatorio = random.Random(semilla)
+    reg = registro()
+    for cedula in range(1, pacientes + 1):
+        p = paciente(cedula, aleatorio.choice(NOMBRES), aleatorio.choice(NOMBRES))
+        for dia in aleatorio.sample(range(dias), aleatorio.randint(0, 5)):
+            fecha = INICIO + timedelta(days=dia)
+            p.evoluciones.append(evolucion.guardada(fecha, time(9), _contenido(cedula, dia),
+                                                    aleatorio.choice([0, 0, 90, 1500])))
+        reg.agregar_paciente(p)
+    return reg
+
+
+def _por_fecha_lineal(reg):
+    """{fecha: {cedulas}} recorriendo todas las evoluciones."""
+    por_fecha = {}
+    for p in reg.pacientes.values():
+        for ev in p.evoluciones:
+            por_fecha.setdefault(ev.fecha, set()).add(p.cedula)
+    return por_fecha
+
+
+def _tarde_lineal(reg):
+    return sorted((ev.fecha, p.cedula) for p in reg.pacientes.values() for ev in p.evoluciones if ev.es_tarde())
+
+
+def _nombres_lineal(reg, prefijo):
+    prefijo = normalizar_nombre(prefijo)
+    return {p.cedula for p in reg.pacientes.values()
+            if any(clave.startswith(prefijo) for clave in (normalizar_nombre(p.nombre),
+                                                           normalizar_nombre(p.apellido),
+                                                           normalizar_nombre(f"{p.nombre} {p.apellido}")))}
+
+
+def _verificar(reg):
+    fechas = obtener_indice_fechas(reg)
+    esperado = _por_fecha_lineal(reg)
+    for dia in range(-1, 40):
+        fecha = INICIO + timedelta(days=dia)
+        assert fechas.cedulas_en_fecha(fecha) == esperado.get(fecha, set())
+        assert [(p.cedula, ev.fecha) for p, ev in fechas.evoluciones_en_fecha(fecha)] == \
+            [(cedula, fecha) for cedula in sorted(esperado.get(fecha, ()))]
+    tarde = _tarde_lineal(reg)
+    assert fechas.total_tarde() == len(tarde)
+    assert [(ev.fecha, p.cedula) for p, ev in fechas.evoluciones_tarde()] == tarde
+    nombres = obtener_indice_nombres(reg)
+    for prefijo in ["", "a", "AN", "jose", "José M", "ma", "ñ", "o", "zzz"]:
+        assert set(nombres.cedulas(prefijo)) == _nombres_lineal(reg, prefijo)
+
+
+def test_coinciden_con_recorrido_al_crear():
+    _verificar(_registro())
+
+
+def test_coinciden_con_recorrido_tras_cambios():
+    reg = _registro()
+    obtener_indice_fechas(reg)
+    obtener_indice_nombres(reg)
+    aleatorio = random.Random(7)
+    siguiente = 1000
+    for _ in range(300):
+        operacion = aleatorio.choice(["agregar", "editar", "eliminar", "datos", "paciente", "baja"])
+        p = reg.pacientes[aleatorio.choice(list(reg.pacientes))]
+        if operacion == "agregar":
+            dia = aleatorio.randrange(30)
+            fecha = INICIO + timedelta(days=dia)
+            if p.evolucion_en_fecha(fecha) is None:
+                p.agregar_evolucion(evolucion(fecha, time(10), _contenido(p.cedula, dia)))
+        elif operacion == "editar" and p.evoluciones:
+            dia = aleatorio.randrange(30)
+            fecha = INICIO + timedelta(days=dia)
+            if p.evolucion_en_fecha(fecha) is None:
+                p.editar_evolucion(aleatorio.randrange(len(p.evoluciones)), fecha, time(11),
+                                   _contenido(p.cedula, dia))
+        elif operacion == "eliminar" and p.evoluciones:
+            p.eliminar_evolucion(aleatorio.randrange(len(p.evoluciones)))
+        elif operacion == "datos":
+            p.editar_datos(aleatorio.choice(NOMBRES), aleatorio.choice(NOMBRES))
+        elif operacion == "paciente":
+            siguiente += 1
+            nuevo = paciente(siguiente, aleatorio.choice(NOMBRES), aleatorio.choice(NOMBRES))
+            nuevo.evoluciones.append(evolucion.guardada(INICIO, time(8), _contenido(siguiente, 0), 45))
+            reg.agregar_paciente(nuevo)
+        elif operacion == "baja" and len(reg.pacientes) > 10:
+            reg.eliminar_paciente(p.cedula)
+    _verificar(reg)
+
+
+class _lista_contada(list):
+    """Lista que cuenta los accesos por posición (los que hace bisect)."""
+    accesos = 0
+
+    def __getitem__(self, posicion):
+        _lista_contada.accesos += 1
+        return super().__getitem__(posicion)
+
+
+@pytest.fixture
+def registro_grande():
+    return _registro(pacientes=5000, dias=200, semilla=11)
+
+
+def test_buscar_nombre_no_recorre_todas_las_claves(registro_grande):
+    indice = obtener_indice_nombres(registro_grande)
+    indice._claves = _lista_contada(indice._claves)
+    total = len(indice._claves)
+    _lista_contada.accesos = 0
+    encontradas = indice.cedulas("zzz")
+    assert encontradas == []
+    # O(log n): bisect más la comprobación del primer elemento
+    assert _lista_contada.accesos <= math.ceil(math.log2(total)) + 2
+    _lista_contada.accesos = 0
+    encontradas = indice.cedulas("ñusta ó")
+    assert encontradas
+    # O(log n + k): cada clave que coincide se lee una vez más la que corta
+    assert _lista_contada.accesos <= math.ceil(math.log2(total)) + 2 * len(encontradas) + 2
+    assert _lista_contada.accesos < total // 10
+
+
+def test_consultas_por_fecha_solo_tocan_los_resultados(registro_grande, monkeypatch):
+    fechas = obtener_indice_fechas(registro_grande)
+    consultados = []
+    obtener = registro.obtener_paciente
+    monkeypatch.setattr(registro, "obtener_paciente",
+                        lambda self, cedula: consultados.append(cedula) or obtener(self, cedula))
+    fecha = INICIO + timedelta(days=17)
+    resultado = fechas.evoluciones_en_fecha(fecha)
+    assert resultado
+    assert len(consultados) == len(resultado)
+    assert len(consultados) < len(registro_grande.pacientes) // 10
+    consultados.clear()
+    assert fechas.total_tarde() == len(_tarde_lineal(registro_grande))
+    assert consultados == []
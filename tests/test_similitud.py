@@ -0,0 +1,71 @@
+"""
+Pruebas de paridad de la similitud: las rutas con caché, cotas e índices
+dan los mismos valores que comparar los textos en minúsculas con
+SequenceMatcher, también con espacios repetidos y saltos de línea.
+"""
+
+from datetime import date, time, timedelta
+from difflib import SequenceMatcher
+
+import pytest
+
+from modelos import registro, paciente, evolucion
+from analisis import (CACHE_SIMILITUDES, calcular_similitud, encontrar_similitudes_paciente,
+                      verificar_similitud_al_subir)
+
+BASE = "Paciente estable, afebril, tolera la vía oral. Se mantiene el tratamiento indicado."
+TEXTOS = [
+    BASE,
+    BASE.replace(" ", "  "),
+    BASE.replace(". ", ".\n\n"),
+    "  " + BASE.upper() + "   ",
+    BASE.replace("estable", "inestable").replace(" ", "\t "),
+    "Dolor abdominal   difuso,\nse solicita ecografía y control en 24 horas.",
+]
+
+
+def _referencia(texto1, texto2):
+    """La similitud original: SequenceMatcher sobre los textos en minúsculas."""
+    return SequenceMatcher(None, texto1.lower(), texto2.lower()).ratio()
+
+
+@pytest.fixture(autouse=True)
+def cache_vacia():
+    CACHE_SIMILITUDES.limpiar()
+    yield
+    CACHE_SIMILITUDES.limpiar()
+
+
+def test_calcular_similitud_respeta_los_espacios():
+    for texto1 in TEXTOS:
+        for texto2 in TEXTOS:
+            assert calcular_similitud(texto1, texto2) == _referencia(texto1, texto2)
+    assert calcular_similitud(TEXTOS[0], TEXTOS[1]) < 1
+
+
+def test_pares_del_paciente_coinciden_con_la_referencia():
+    reg = registro()
+    p = paciente(1, "Ana", "Pérez")
+    for i, texto in enumerate(TEXTOS):
+        p.evoluciones.append(evolucion.guardada(date(2025, 1, 1) + timedelta(days=i), time(9), texto))
+    reg.agregar_paciente(p)
+    esperado = [
+        {"fecha 1": p.evoluciones[i].fecha, "fecha 2": p.evoluciones[j].fecha,
+         "similitud": round(_referencia(TEXTOS[i], TEXTOS[j]) * 100, 2)}
+        for i in range(len(TEXTOS)) for j in range(i + 1, len(TEXTOS))
+        if _referencia(TEXTOS[i], TEXTOS[j]) >= 0.80
+    ]
+    assert encontrar_similitudes_paciente(reg, 1, 0.80) == esperado
+    # Segunda vez desde la caché
+    assert encontrar_similitudes_paciente(reg, 1, 0.80) == esperado
+
+
+def test_al_subir_coincide_con_la_referencia():
+    existentes = [evolucion.guardada(date(2025, 1, 1) + timedelta(days=i), time(9), texto)
+                  for i, texto in enumerate(TEXTOS[1:])]
+    for umbral in (0.80, 0.95, 0.999):
+        maximo = max(_referencia(TEXTOS[0], ev.contenido) for ev in existentes)
+        hay, porcentaje, _ = verificar_similitud_al_subir(TEXTOS[0], existentes, umbral)
+        assert hay == (maximo >= umbral)
+        if hay:
+            assert porcentaje == round(maximo * 100, 2)
@@ -0,0 +1,61 @@
+"""
+Pruebas del índice LSH: sobrevive a un reinicio con el snapshot JSON y,
+con la base de datos, se construye con una sola consulta en lugar de
+cargar paciente por paciente.
+"""
+
+from datetime import date, time, timedelta
+
+from sqlalchemy import event
+
+from modelos import registro, paciente, evolucion
+from similitud_lsh import indice_lsh, obtener_indice
+
+
+def _registro(pacientes=40):
+    reg = registro()
+    for cedula in range(1, pacientes + 1):
+        p = paciente(cedula, "Ana", "Pérez")
+        for dia in range(3):
+            p.evoluciones.append(evolucion.guardada(
+                date(2025, 1, 1) + timedelta(days=dia), time(9),
+                f"Paciente {cedula % 5} estable, día {dia}: se mantiene el tratamiento indicado.", 0))
+        reg.agregar_paciente(p)
+    return reg
+
+
+def test_snapshot_json_evita_recalcular_firmas(tmp_path, monkeypatch):
+    from diario_json import almacen_json
+    archivo = str(tmp_path / "datos.json")
+    almacen = almacen_json(archivo, max_entradas_diario=0)
+    almacen.vincular(_registro(), compactar=False)
+    original = obtener_indice(almacen.reg)
+    almacen.compactar()
+    almacen.cerrar()
+
+    firmas = []
+    calcular = indice_lsh.firma
+    monkeypatch.setattr(indice_lsh, "firma", lambda self, texto: firmas.append(texto) or calcular(self, texto))
+    recuperado = almacen_json(archivo, max_entradas_diario=0).recuperar()
+    assert recuperado.indice_lsh is not None
+    assert firmas == []
+    assert recuperado.indice_lsh._cubetas == original._cubetas
+    texto = "Paciente 3 estable, día 1: se mantiene el tratamiento indicado."
+    assert recuperado.indice_lsh.candidatos(texto, 0) == original.candidatos(texto, 0)
+
+
+def test_base_de_datos_una_consulta_sin_cargar_pacientes(db_sqlite):
+    from persistencia_db import guardar_registro_db, cargar_directorio_db
+    completo = _registro()
+    guardar_registro_db(completo)
+    reg = cargar_directorio_db()
+
+    consultas = []
+    event.listen(db_sqlite, "before_cursor_execute", lambda *args: consultas.append(args[2]))
+    indice = obtener_indice(reg)
+    assert len(consultas) == 1
+    assert reg.evoluciones_cargadas == 0
+    assert len(indice) == completo.total_evoluciones()
+    texto = "Paciente 3 estable, día 1: se mantiene el tratamiento indicado."
+    esperado = obtener_indice(completo).candidatos(texto, 0)
+    assert indice.candidatos(texto, 0) == esperado
@@ -18,8 +18,9 @@ def index():
     reg = current_app.reg
     logger.info("Usuario accedió a página principal")
     total_pacientes = len(reg.pacientes)
-    total_evoluciones = reg.total_evoluciones()
-    total_strikes = reg.total_strikes
+    agregados = reg.obtener_agregados()
+    total_evoluciones = agregados.evoluciones
+    total_strikes = agregados.strikes
     
     return render_template('index.html', 
                          pacientes=total_pacientes,
@@ -28,10 +29,17 @@ def index():
 
 @routes_bp.route('/pacientes')
 def listar_pacientes():
-    """Lista todos los pacientes."""
+    """Lista todos los pacientes, o los que coinciden con la búsqueda."""
+    from indices_registro import obtener_indice_nombres
     reg = current_app.reg
-    logger.info("Usuario consultó lista de pacientes")
-    return render_template('pacientes.html', pacientes=reg.pacientes.values())
+    buscar = request.args.get('buscar', '').strip()
+    if buscar:
+        logger.info(f"Usuario buscó pacientes: {buscar}")
+        pacientes = obtener_indice_nombres(reg).buscar(buscar)
+    else:
+        logger.info("Usuario consultó lista de pacientes")
+        pacientes = reg.pacientes.values()
+    return render_template('pacientes.html', pacientes=pacientes, buscar=buscar)
 
 @routes_bp.route('/paciente/<int:cedula>')
 def ver_paciente(cedula):
@@ -41,6 +49,8 @@ def ver_paciente(cedula):
     if p is None:
         return "Paciente no encontrado", 404
     
+    # Los enlaces de editar y eliminar usan el id de cada evolución
+    reg.indexar_evoluciones(p)
     logger.info(f"Usuario consultó paciente: {cedula}")
     return render_template('paciente_detalle.html', paciente=p)
 
@@ -49,8 +59,14 @@ def api_estadisticas():
     """API que retorna estadísticas en JSON."""
     from analisis import obtener_estadisticas_generales
     reg = current_app.reg
+    # Los totales se mantienen en memoria con cada cambio (registro.obtener_agregados)
     stats = obtener_estadisticas_generales(reg)
     return jsonify(stats)
+
+@routes_bp.route('/api/persistencia')
+def api_persistencia():
+    """API que retorna el estado del guardado diferido (cola y retraso)."""
+    return jsonify(current_app.escritor.estado())
 @routes_bp.route('/crear-paciente', methods=['GET', 'POST'])
 def crear_paciente():
     """Crear un nuevo paciente"""
@@ -139,11 +155,11 @@ def subir_evolucion():
             )
             
             if hay_similitud:
-                reg.total_strikes += 1
-                reg.strikes.append({
-                    "razon": f"Evolución similar ({porcentaje}% con fecha {ev_similar.fecha})",
-                    "fecha": str(fecha)
-                })
+                reg.agregar_strike(
+                    f"Evolución similar ({porcentaje}% con fecha {ev_similar.fecha})",
+                    str(fecha),
+                    cedula
+                )
                 logger.warning(f"Strike agregado por similitud local: {porcentaje}%")
             
             # VERIFICAR SIMILITUD GLOBAL
@@ -155,11 +171,11 @@ def subir_evolucion():
             )
             
             if hay_similitud_global:
-                reg.total_strikes += 1
-                reg.strikes.append({
-                    "razon": f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
-                    "fecha": str(fecha)
-                })
+                reg.agregar_strike(
+                    f"Similitud crítica con paciente {paciente_similar.nombre} ({porcentaje_global}%)",
+                    str(fecha),
+                    cedula
+                )
                 logger.warning(f"Strike crítico: similitud global {porcentaje_global}%")
             
             # CREAR Y GUARDAR EVOLUCIÓN
@@ -168,11 +184,11 @@ def subir_evolucion():
             
             # VERIFICAR RETRASO
             if ev.es_tarde():
-                reg.total_strikes += 1
-                reg.strikes.append({
-                    "razon": "Evolución subida después de las 24 horas",
-                    "fecha": str(fecha)
-                })
+                reg.agregar_strike(
+                    "Evolución subida después de las 24 horas",
+                    str(fecha),
+                    cedula
+                )
                 logger.warning("Strike por retraso en evolución")
             
             logger.info(f"Evolución subida para paciente {cedula}")
@@ -185,17 +201,18 @@ def subir_evolucion():
             return render_template('subir_evolucion.html',
                                  pacientes=reg.pacientes,
                                  error=str(e))
-@routes_bp.route('/eliminar-evolucion/<int:cedula>/<int:indice>')
-def eliminar_evolucion(cedula, indice):
+@routes_bp.route('/eliminar-evolucion/<int:cedula>/<int:id_evolucion>')
+def eliminar_evolucion(cedula, id_evolucion):
     """Elimina una evolución"""
     reg = current_app.reg
     
     try:
-            p = reg.obtener_paciente(cedula)
-            if p is None:
-                return "Paciente no encontrado", 404
+            encontrada = reg.obtener_evolucion(id_evolucion, cedula)
+            if encontrada is None:
+                return "Evolución no encontrada", 404
+            p, ev = encontrada
             
-            p.eliminar_evolucion(indice)
+            p.eliminar_evolucion(p.posicion_de_fecha(ev.fecha))
             
             logger.info(f"Evolución eliminada para paciente {cedula}")
             guardar_automatico()
@@ -224,13 +241,14 @@ def eliminar_paciente(cedula):
         return f"Error: {e}", 400
     
 def guardar_automatico():
-    """Guarda automáticamente en PostgreSQL después de operaciones"""
-    from persistencia_db import guardar_registro_db
+    """
+    Programa el guardado en la base de datos de los cambios de la operación.
+    El escritor diferido los guarda en segundo plano, agrupados en lotes.
+    """
     try:
-        guardar_registro_db(current_app.reg)
-        logger.info("Guardado automático en PostgreSQL exitoso")
+        current_app.escritor.notificar(request.path)
     except Exception as e:
-        logger.error(f"Error en guardado automático PostgreSQL: {e}")
+        logger.error(f"Error en guardado automático: {e}")
 @routes_bp.route('/editar-paciente/<int:cedula>', methods=['GET', 'POST'])
 def editar_paciente(cedula):
     """Editar un paciente"""
@@ -260,8 +278,7 @@ def editar_paciente(cedula):
                 return render_template('editar_paciente.html', paciente=p, error=error)
             
             # Actualizar datos
-            p.nombre = nombre
-            p.apellido = apellido
+            p.editar_datos(nombre, apellido)
             
             logger.info(f"Paciente editado: {cedula}")
             guardar_automatico()
@@ -271,26 +288,26 @@ def editar_paciente(cedula):
         except Exception as e:
             logger.error(f"Error al editar paciente: {e}")
             return render_template('editar_paciente.html', paciente=p, error=str(e))
-@routes_bp.route('/editar-evolucion/<int:cedula>/<int:indice>', methods=['GET', 'POST'])
-def editar_evolucion(cedula, indice):
+@routes_bp.route('/editar-evolucion/<int:cedula>/<int:id_evolucion>', methods=['GET', 'POST'])
+def editar_evolucion(cedula, id_evolucion):
     """Editar una evolución"""
     from utils import validar_fecha_evolucion, validar_contenido_evolucion
     from analisis import verificar_similitud_al_subir, verificar_similitud_global
     
     reg = current_app.reg
     
-    p = reg.obtener_paciente(cedula)
-    if p is None or indice < 0 or indice >= len(p.evoluciones):
+    encontrada = reg.obtener_evolucion(id_evolucion, cedula)
+    if encontrada is None:
         return "No encontrado", 404
     
-    ev = p.evoluciones[indice]
+    p, ev = encontrada
     
     if request.method == 'GET':
         return render_template('editar_evolucion.html', 
                              paciente=p, 
                              evolucion=ev, 
                              cedula=cedula, 
-                             indice=indice)
+                             id_evolucion=id_evolucion)
     
     elif request.method == 'POST':
         try:
@@ -306,17 +323,25 @@ def editar_evolucion(cedula, indice):
             if not valido:
                 return render_template('editar_evolucion.html', 
                                      paciente=p, evolucion=ev, 
-                                     cedula=cedula, indice=indice, error=error)
+                                     cedula=cedula, id_evolucion=id_evolucion, error=error)
             
             # Validar contenido
             valido, error = validar_contenido_evolucion(contenido)
             if not valido:
                 return render_template('editar_evolucion.html', 
                                      paciente=p, evolucion=ev, 
-                                     cedula=cedula, indice=indice, error=error)
+                                     cedula=cedula, id_evolucion=id_evolucion, error=error)
+            
+            # Una sola evolución por fecha
+            otra = p.evolucion_en_fecha(fecha)
+            if otra is not None and otra is not ev:
+                return render_template('editar_evolucion.html', 
+                                     paciente=p, evolucion=ev, 
+                                     cedula=cedula, id_evolucion=id_evolucion,
+                                     error="Ya existe una evolucion con esa fecha")
             
             # Verificar similitud con otras evoluciones (excluyendo la actual)
-            otras_evoluciones = [e for i, e in enumerate(p.evoluciones) if i != indice]
+            otras_evoluciones = [e for e in p.evoluciones if e is not ev]
             hay_similitud, porcentaje, ev_similar = verificar_similitud_al_subir(
                 contenido,
                 otras_evoluciones,
@@ -324,26 +349,23 @@ def editar_evolucion(cedula, indice):
             )
             
             if hay_similitud:
-                reg.total_strikes += 1
-                reg.strikes.append({
-                    "razon": f"Evolución modificada - Similar ({porcentaje}%)",
-                    "fecha": str(fecha)
-                })
+                reg.agregar_strike(
+                    f"Evolución modificada - Similar ({porcentaje}%)",
+                    str(fecha),
+                    cedula
+                )
                 logger.warning(f"Strike por modificación similar: {porcentaje}%")
             
             # Actualizar evolución
-            ev.fecha = fecha
-            ev.hora = hora
-            ev.contenido = contenido
-            ev.retraso = ev.verificar_retraso()
+            p.editar_evolucion(p.posicion_de_fecha(ev.fecha), fecha, hora, contenido)
             
             # Verificar retraso
             if ev.es_tarde():
-                reg.total_strikes += 1
-                reg.strikes.append({
-                    "razon": "Evolución modificada fuera de tiempo",
-                    "fecha": str(fecha)
-                })
+                reg.agregar_strike(
+                    "Evolución modificada fuera de tiempo",
+                    str(fecha),
+                    cedula
+                )
                 logger.warning("Strike por modificación fuera de tiempo")
             
             logger.info(f"Evolución editada para paciente {cedula}")
@@ -355,4 +377,4 @@ def editar_evolucion(cedula, indice):
             logger.error(f"Error al editar evolución: {e}")
             return render_template('editar_evolucion.html', 
                                  paciente=p, evolucion=ev, 
-                                 cedula=cedula, indice=indice, error=str(e))
\ No newline at end of file
+                                 cedula=cedula, id_evolucion=id_evolucion, error=str(e))
\ No newline at end of file